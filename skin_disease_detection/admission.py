@@ -0,0 +1,112 @@
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from inference_engine import histogram_bucket
+
+logger = logging.getLogger(__name__)
+
+LATENCY_MS_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Overloaded(Exception):
+    """Raised instead of queueing work when the executor is over its depth or wait budget"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class BoundedInferenceExecutor:
+    """Thread pool for inference calls with admission control.
+
+    A submission is rejected with ``Overloaded`` when more than
+    ``max_queue_depth`` calls are already waiting, or when the estimated wait
+    (queued calls / workers x average service time) exceeds
+    ``max_estimated_wait`` seconds. Queue wait and service time are tracked
+    separately so saturation and slow models can be told apart.
+    """
+
+    def __init__(self, workers=8, max_queue_depth=32, max_estimated_wait=10.0, ewma_alpha=0.2):
+        self.workers = workers
+        self.max_queue_depth = max_queue_depth
+        self.max_estimated_wait = max_estimated_wait
+        self.ewma_alpha = ewma_alpha
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='inference')
+        self._lock = threading.Lock()
+
+        self._queued = 0
+        self._running = 0
+        self._service_ewma = None
+        self._completed = 0
+        self._rejected = 0
+        self._queue_wait_ms = Counter()
+        self._service_ms = Counter()
+
+    def estimated_wait(self):
+        """Seconds a new submission would probably wait before starting"""
+        with self._lock:
+            return self._estimated_wait_locked()
+
+    def _estimated_wait_locked(self):
+        if self._running + self._queued < self.workers:
+            return 0.0
+        return (self._queued + 1) / self.workers * (self._service_ewma or 0.0)
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            wait = self._estimated_wait_locked()
+            if self._queued >= self.max_queue_depth or wait > self.max_estimated_wait:
+                self._rejected += 1
+                retry_after = max(1, math.ceil(wait or self._service_ewma or 1))
+                raise Overloaded(f"Inference queue is full ({self._queued} waiting, "
+                                 f"~{wait:.1f}s estimated wait)", retry_after)
+            self._queued += 1
+        # Run in the submitter's context so the request's trace sees the stages recorded on the worker thread
+        return self._executor.submit(metrics.run_in_context(self._call), time.perf_counter(), fn, args, kwargs)
+
+    def run(self, fn, *args, **kwargs):
+        """Submit and block until the result is ready (raises Overloaded without waiting)"""
+        return self.submit(fn, *args, **kwargs).result()
+
+    def _call(self, enqueued, fn, args, kwargs):
+        started = time.perf_counter()
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._queue_wait_ms[histogram_bucket((started - enqueued) * 1000, LATENCY_MS_BUCKETS)] += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            service = time.perf_counter() - started
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+                self._service_ms[histogram_bucket(service * 1000, LATENCY_MS_BUCKETS)] += 1
+                if self._service_ewma is None:
+                    self._service_ewma = service
+                else:
+                    self._service_ewma += self.ewma_alpha * (service - self._service_ewma)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_queue_depth': self.max_queue_depth,
+                'max_estimated_wait_seconds': self.max_estimated_wait,
+                'queued': self._queued,
+                'running': self._running,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'estimated_wait_seconds': round(self._estimated_wait_locked(), 3),
+                'service_time_ewma_seconds': self._service_ewma,
+                'queue_wait_ms_histogram': dict(self._queue_wait_ms),
+                'service_time_ms_histogram': dict(self._service_ms),
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,26 +1,50 @@
+# Reference point for the cold-start metric, taken before any (heavy) import
+import time
+IMPORT_STARTED = time.perf_counter()
+
 import os
+import io
+import random
+import json
+import base64
+import binascii
+import threading
+import contextlib
 import numpy as np
-import cv2
 import pickle
-from tensorflow.keras.models import load_model
-from tensorflow.keras.applications.resnet50 import preprocess_input
-from PIL import Image
 import logging
-from flask import Flask, render_template, request, redirect, url_for
-import tensorflow as tf
+from flask import Flask, render_template, request, redirect, url_for, jsonify, Response, stream_with_context, g
+import metrics
+from backends import load_backend, default_model_path
+from inference_engine import MicroBatcher
+from svm_scorer import FastSVMScorer
+from feature_reduction import load_reducer, check_reducer_matches
+from feature_cache import FeatureCache, ModelFingerprint
+from preprocessing import IMG_SIZE, preprocess_image
+from preprocess_pool import PreprocessPool
+from admission import BoundedInferenceExecutor, Overloaded
+from job_queue import JobQueue, FINISHED
+from static_pages import PageCache
+from disease_catalog import CatalogStore, CatalogError, DEFAULT_DATA_PATH
+from tta import make_views, average_probabilities, needs_tta, MAX_VIEWS
+from cascade import CascadeStats, load_cascade
+from uploads import upload_source, spool_uploads
+from batch_predict import iter_zip_images, score_stream, format_records, DEFAULT_BATCH_SIZE
 
 # CRITICAL FIX: Force CPU mode to avoid GPU memory issues
+# (set before anything imports TensorFlow; the heavy ML libraries are only
+# imported when the models are loaded)
 os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
-print("INFO: Forcing TensorFlow to use CPU only (to prevent GPU memory errors)")
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+logger.info("Forcing TensorFlow to use CPU only (to prevent GPU memory errors)")
 
 # Get the directory where app.py is located
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-print(f"Current working directory: {os.getcwd()}")
-print(f"BASE_DIR (app.py location): {BASE_DIR}")
+logger.debug(f"Current working directory: {os.getcwd()}")
+logger.debug(f"BASE_DIR (app.py location): {BASE_DIR}")
 
 # Define the template directory - THIS IS CRITICAL FOR TEMPLATE NOT FOUND ERROR
 # Try multiple possible locations for templates
@@ -135,10 +159,7 @@ if template_dir is None:
             ''')
 
 # Verify template directory
-print(f"Using template directory: {template_dir}")
-print("Files in template directory:")
-for f in os.listdir(template_dir):
-    print(f"  - {f}")
+logger.debug(f"Using template directory: {template_dir}")
 
 # Initialize Flask app with the correct template folder
 app = Flask(__name__,
@@ -146,486 +167,615 @@ app = Flask(__name__,
             static_folder=os.path.join(BASE_DIR, 'static'))
 
 # Configure upload settings
-app.config['UPLOAD_FOLDER'] = os.path.join(BASE_DIR, 'uploads')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload
+# Uploads above this size are spilled to a unique temp file in UPLOAD_SPILL_DIR (default: the system temp dir)
+app.config['UPLOAD_SPILL_THRESHOLD'] = int(os.environ.get('UPLOAD_SPILL_THRESHOLD', 4 * 1024 * 1024))
+app.config['UPLOAD_SPILL_DIR'] = os.environ.get('UPLOAD_SPILL_DIR') or None
+
+# Micro-batching settings: concurrent /predict calls arriving within the wait
+# window share one ResNet forward pass and one SVM call
+app.config['INFERENCE_MAX_BATCH_SIZE'] = int(os.environ.get('INFERENCE_MAX_BATCH_SIZE', 8))
+app.config['INFERENCE_MAX_WAIT_MS'] = float(os.environ.get('INFERENCE_MAX_WAIT_MS', 10))
+
+# Admission control: bounded number of concurrent inferences, with fast 503s
+# when the queue is too deep or the estimated wait is too long
+app.config['INFERENCE_WORKERS'] = int(os.environ.get('INFERENCE_WORKERS', app.config['INFERENCE_MAX_BATCH_SIZE']))
+app.config['INFERENCE_MAX_QUEUE_DEPTH'] = int(os.environ.get('INFERENCE_MAX_QUEUE_DEPTH', 32))
+app.config['INFERENCE_MAX_ESTIMATED_WAIT'] = float(os.environ.get('INFERENCE_MAX_ESTIMATED_WAIT', 10.0))
+
+# Preprocessing (decode, resize, CLAHE) runs in this many worker processes; 0 = inline
+app.config['PREPROCESS_WORKERS'] = int(os.environ.get('PREPROCESS_WORKERS', 2))
+
+# Feature/prediction cache: in-memory LRU plus an optional on-disk tier
+app.config['FEATURE_CACHE_MAX_ENTRIES'] = int(os.environ.get('FEATURE_CACHE_MAX_ENTRIES', 256))
+app.config['FEATURE_CACHE_DIR'] = os.environ.get('FEATURE_CACHE_DIR') or None
+app.config['FEATURE_CACHE_DISK_MAX_BYTES'] = int(os.environ.get('FEATURE_CACHE_DISK_MAX_BYTES', 512 * 1024 * 1024))
 
-# Create upload folder if it doesn't exist
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# Background prediction jobs: SQLite-backed queue, results kept for JOB_TTL_SECONDS
+app.config['JOB_DB_PATH'] = os.environ.get('JOB_DB_PATH', os.path.join(BASE_DIR, 'jobs', 'jobs.sqlite3'))
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+app.config['JOB_TTL_SECONDS'] = float(os.environ.get('JOB_TTL_SECONDS', 3600))
+app.config['JOB_LEASE_SECONDS'] = float(os.environ.get('JOB_LEASE_SECONDS', 600))
+
+# Test-time augmentation: 'off', 'adaptive' (extra views only when the single-view
+# confidence is below TTA_THRESHOLD) or 'always'; TTA_VIEWS extra views at most
+app.config['TTA_MODE'] = os.environ.get('TTA_MODE', 'off')
+app.config['TTA_THRESHOLD'] = float(os.environ.get('TTA_THRESHOLD', 60.0))
+app.config['TTA_VIEWS'] = min(int(os.environ.get('TTA_VIEWS', 4)), MAX_VIEWS)
+
+# Early-exit cascade: a cheap colour/texture classifier (train_cascade.py) answers
+# confident images without ResNet50. Thresholds default to the calibrated ones
+# stored with the model; CASCADE_AUDIT_RATE of early exits also run the full
+# path to measure agreement.
+app.config['CASCADE_ENABLED'] = os.environ.get('CASCADE_ENABLED', '1') != '0'
+app.config['CASCADE_THRESHOLD'] = float(os.environ['CASCADE_THRESHOLD']) if os.environ.get('CASCADE_THRESHOLD') else None
+app.config['CASCADE_MIN_MARGIN'] = float(os.environ['CASCADE_MIN_MARGIN']) if os.environ.get('CASCADE_MIN_MARGIN') else None
+app.config['CASCADE_AUDIT_RATE'] = float(os.environ.get('CASCADE_AUDIT_RATE', 0.05))
+
+# Browser/proxy cache lifetime for the pre-rendered index and report pages
+app.config['PAGE_CACHE_MAX_AGE'] = int(os.environ.get('PAGE_CACHE_MAX_AGE', 86400))
 
 # Your local model paths
 MODEL_DIR = r"C:\Users\A JAGADEESH\Documents\machine learning\Advance Skin Disease project\Advanced-Skin-Diseases-Diagnosis-Leveraging-Image-Processing-main\skin_disease_detection\skin_disease_detection\models"
-SVM_MODEL_PATH = os.path.join(MODEL_DIR, "svm_model_optimized.pkl")
+# The classifier head: the kernel SVM, or a linear/approximate-kernel head from train_linear_head.py
+SVM_MODEL_PATH = os.environ.get('CLASSIFIER_MODEL_PATH') or os.path.join(MODEL_DIR, "svm_model_optimized.pkl")
 RESNET_MODEL_PATH = os.path.join(MODEL_DIR, "resnet50_base_model.h5")
 
-# Disease information
-DISEASE_INFO = {
-    'VI-chickenpox': {
-        'name': 'Chickenpox',
-        'description': 'Chickenpox is a highly contagious viral infection caused by the varicella-zoster virus (VZV). It is characterized by an itchy, blister-like rash that appears first on the chest, back, and face, then spreads over the entire body.',
-        'causes': [
-            'Caused by the varicella-zoster virus (VZV)',
-            'Spreads through direct contact with the rash',
-            'Airborne transmission through coughing or sneezing',
-            'Can be transmitted from shingles to someone who has never had chickenpox'
-        ],
-        'symptoms': [
-            'Itchy, red blisters all over the body',
-            'Fever',
-            'Fatigue',
-            'Loss of appetite',
-            'Headache',
-            'Flu-like symptoms 1-2 days before rash appears'
-        ],
-        'complications': [
-            'Skin infections from scratching',
-            'Pneumonia',
-            'Encephalitis (brain inflammation)',
-            'Bleeding problems',
-            'Dehydration',
-            'Complications in pregnancy affecting the fetus'
-        ],
-        'treatment': [
-            'Antiviral medications (acyclovir) for high-risk patients',
-            'Calamine lotion for itching',
-            'Antihistamines to reduce itching',
-            'Oatmeal baths to soothe skin',
-            'Acetaminophen for fever (never use aspirin)',
-            'Keeping fingernails short to prevent infection from scratching'
-        ],
-        'prevention': [
-            'Varicella vaccine (90% effective)',
-            'Avoiding contact with infected individuals',
-            'Isolation of infected persons until all blisters have crusted over',
-            'Good hand hygiene'
-        ],
-        'duration': '7-10 days from first symptom to complete healing',
-        'when_to_see_doctor': [
-            'If rash spreads to eyes',
-            'If fever lasts more than 4 days',
-            'If rash becomes very red, warm, or tender (signs of infection)',
-            'If difficulty walking (possible neurological complication)',
-            'If dehydration symptoms (urinating less, dry mouth)'
-        ]
-    },
-    'BA- cellulitis': {
-        'name': 'Cellulitis',
-        'description': 'Cellulitis is a common, potentially serious bacterial skin infection that affects the deeper layers of skin (dermis and subcutaneous tissue). It appears as a swollen, red area of skin that feels hot and tender, and it may spread rapidly.',
-        'causes': [
-            'Most commonly caused by Streptococcus and Staphylococcus bacteria',
-            'Enters through breaks in the skin (cuts, ulcers, insect bites)',
-            'Can develop after surgery',
-            'More common in people with weakened immune systems',
-            'Associated with conditions like athlete\'s foot or eczema that cause skin breaks'
-        ],
-        'symptoms': [
-            'Red, inflamed skin that appears swollen',
-            'Skin that feels warm or hot to the touch',
-            'Tenderness or pain in the affected area',
-            'Fever or chills',
-            'Red streaks extending from the affected area',
-            'Pus or drainage from the skin'
-        ],
-        'complications': [
-            'Blood infection (sepsis)',
-            'Bone infection (osteomyelitis)',
-            'Lymphangitis (infection of lymph vessels)',
-            'Recurrent cellulitis',
-            'Tissue death (gangrene)',
-            'Chronic swelling (lymphedema)'
-        ],
-        'treatment': [
-            'Oral antibiotics (typically for 5-14 days)',
-            'Intravenous antibiotics for severe cases',
-            'Elevation of affected limb to reduce swelling',
-            'Pain medication as needed',
-            'Wound care for any breaks in the skin',
-            'Compression stockings for leg cellulitis'
-        ],
-        'prevention': [
-            'Prompt cleaning of cuts and scrapes',
-            'Moisturizing dry skin to prevent cracking',
-            'Wearing protective footwear',
-            'Managing underlying conditions like diabetes',
-            'Treating fungal infections like athlete\'s foot'
-        ],
-        'duration': 'Improvement typically seen within 3 days of starting antibiotics; full recovery in 7-10 days',
-        'when_to_see_doctor': [
-            'If redness or pain worsens',
-            'If fever develops',
-            'If you have diabetes or a weakened immune system',
-            'If symptoms don\'t improve after 2-3 days of antibiotics',
-            'If the affected area is near the eyes'
-        ]
-    },
-    'FU-athlete-foot': {
-        'name': 'Athlete\'s Foot',
-        'description': 'Athlete\'s foot (tinea pedis) is a common fungal infection that affects the skin on the feet, particularly between the toes. It thrives in warm, moist environments like shoes and socks.',
-        'causes': [
-            'Caused by various types of fungi (dermatophytes)',
-            'Spreads in damp communal areas (locker rooms, showers, pools)',
-            'Wearing tight, closed shoes for long periods',
-            'Sharing towels, socks, or shoes with an infected person',
-            'Having sweaty feet or minor foot injuries'
-        ],
-        'symptoms': [
-            'Itching, stinging, and burning between toes or on soles',
-            'Cracking and peeling skin',
-            'Redness and scaling',
-            'Blisters that itch',
-            'Toenail discoloration if infection spreads'
-        ],
-        'complications': [
-            'Spread to other parts of the body (hands, groin, scalp)',
-            'Bacterial infection from excessive scratching',
-            'Chronic fungal nail infection (onychomycosis)',
-            'Cellulitis from skin breakdown',
-            'Recurrent infections'
-        ],
-        'treatment': [
-            'Over-the-counter antifungal creams, sprays, or powders',
-            'Prescription-strength topical medications for severe cases',
-            'Oral antifungal medications for persistent infections',
-            'Keeping feet clean and dry',
-            'Changing socks frequently',
-            'Using antifungal powder in shoes'
-        ],
-        'prevention': [
-            'Wearing shower sandals in public showers',
-            'Wearing breathable shoes and moisture-wicking socks',
-            'Washing feet daily and drying thoroughly',
-            'Alternating shoes to allow them to dry completely',
-            'Not sharing shoes, socks, or towels'
-        ],
-        'duration': '2-4 weeks with proper treatment; can become chronic if untreated',
-        'when_to_see_doctor': [
-            'If symptoms don\'t improve after 2 weeks of OTC treatment',
-            'If you have diabetes',
-            'If signs of bacterial infection (increased redness, warmth, pus)',
-            'If the infection spreads to nails',
-            'If you have a weakened immune system'
-        ]
-    },
-    'BA-impetigo': {
-        'name': 'Impetigo',
-        'description': 'Impetigo is a common, highly contagious bacterial skin infection that mainly affects infants and children. It usually appears as red sores on the face, especially around the nose and mouth, and on hands and feet. The sores burst and develop a yellow-brown crust.',
-        'causes': [
-            'Caused by Staphylococcus aureus or Streptococcus pyogenes bacteria',
-            'Spreads through direct contact with sores or contaminated objects',
-            'More common in warm, humid weather',
-            'Often develops on skin that\'s already irritated by other conditions',
-            'More common in crowded environments like schools'
-        ],
-        'symptoms': [
-            'Red sores that quickly burst and form honey-colored crusts',
-            'Itchy rash',
-            'Sores that increase in size and number',
-            'Swollen lymph nodes near the infection',
-            'Pain around the sores',
-            'Fluid-filled blisters that may be clear or yellow'
-        ],
-        'complications': [
-            'Cellulitis',
-            'Kidney problems (poststreptococcal glomerulonephritis)',
-            'Scarring (rare)',
-            'Staphylococcal scalded skin syndrome',
-            'Spread to other parts of the body',
-            'Methicillin-resistant Staphylococcus aureus (MRSA) infection'
-        ],
-        'treatment': [
-            'Topical antibiotic ointments (mupirocin)',
-            'Oral antibiotics for more severe cases',
-            'Gentle cleansing of affected areas',
-            'Trimming nails to prevent spread from scratching',
-            'Covering lesions with gauze',
-            'Antiseptic soap washes'
-        ],
-        'prevention': [
-            'Good hand hygiene',
-            'Keeping skin clean and dry',
-            'Covering cuts and scrapes',
-            'Not sharing personal items like towels or clothing',
-            'Washing contaminated items in hot water'
-        ],
-        'duration': '2-3 weeks without treatment; 7-10 days with treatment',
-        'when_to_see_doctor': [
-            'If rash is widespread or painful',
-            'If fever develops',
-            'If symptoms don\'t improve after 3 days of treatment',
-            'If signs of cellulitis (increasing redness, warmth)',
-            'If the person has a weakened immune system'
-        ]
-    },
-    'FU-nail-fungus': {
-        'name': 'Nail Fungus',
-        'description': 'Nail fungus (onychomycosis) is a common condition that begins as a white or yellow spot under the tip of your fingernail or toenail. As the fungal infection goes deeper, it may cause your nail to discolor, thicken and develop crumbling edges.',
-        'causes': [
-            'Caused by various fungi including dermatophytes, yeasts, and molds',
-            'More common in toenails than fingernails',
-            'Risk increases with age',
-            'Spreads in warm, moist environments like pools and showers',
-            'Associated with athlete\'s foot infection'
-        ],
-        'symptoms': [
-            'Thickened nails',
-            'Whitish to yellow-brown discoloration',
-            'Brittleness, crumbling or ragged nails',
-            'Distorted nail shape',
-            'Dark color due to debris buildup under nail',
-            'Slight odor'
-        ],
-        'complications': [
-            'Pain and discomfort',
-            'Permanent nail damage',
-            'Spread to other nails',
-            'Secondary bacterial infections',
-            'Difficulty walking or wearing shoes',
-            'Cellulitis in severe cases'
-        ],
-        'treatment': [
-            'Oral antifungal medications (terbinafine, itraconazole)',
-            'Medicated nail polish (ciclopirox)',
-            'Medicated nail cream',
-            'Nail removal in severe cases',
-            'Laser therapy (emerging treatment)',
-            'Tea tree oil as complementary treatment'
-        ],
-        'prevention': [
-            'Wearing shower shoes in public areas',
-            'Keeping nails clean and dry',
-            'Trimming nails straight across',
-            'Wearing breathable shoes',
-            'Changing socks daily',
-            'Not sharing nail clippers'
-        ],
-        'duration': 'Treatment typically takes 6-12 months for toenails due to slow growth',
-        'when_to_see_doctor': [
-            'If you have diabetes',
-            'If you notice signs of infection',
-            'If pain affects daily activities',
-            'If the condition worsens despite home treatment',
-            'If you have circulation problems'
-        ]
-    },
-    'FU-ringworm': {
-        'name': 'Ringworm',
-        'description': 'Ringworm (tinea corporis) is a common fungal skin infection that causes a ring-shaped rash on the skin. Despite its name, it\'s not caused by a worm. It\'s highly contagious and can spread through direct contact with an infected person or animal, or from contact with contaminated surfaces.',
-        'causes': [
-            'Caused by dermatophyte fungi',
-            'Spreads through direct skin-to-skin contact',
-            'Contact with contaminated surfaces (towels, clothing, bedding)',
-            'Contact with infected animals (especially cats)',
-            'Warm, moist environments increase risk'
-        ],
-        'symptoms': [
-            'Ring-shaped, red, itchy rash with raised edges',
-            'Clearing in the center of the ring',
-            'Scaly, cracked skin',
-            'Blisters in some cases',
-            'Multiple rings that may overlap',
-            'Hair loss in affected areas of the scalp'
-        ],
-        'complications': [
-            'Spread to other body areas',
-            'Secondary bacterial infection from scratching',
-            'Permanent hair loss (with scalp ringworm)',
-            'Nail deformities (if spreads to nails)',
-            'Kerion (inflamed, pus-filled areas on scalp)',
-            'Chronic, recurring infections'
-        ],
-        'treatment': [
-            'Over-the-counter antifungal creams, ointments, or sprays',
-            'Prescription-strength topical medications for severe cases',
-            'Oral antifungal medications for widespread infections',
-            'Antifungal shampoo for scalp ringworm',
-            'Keeping the area clean and dry',
-            'Washing contaminated clothing in hot water'
-        ],
-        'prevention': [
-            'Avoiding contact with infected people or animals',
-            'Not sharing personal items like towels or clothing',
-            'Wearing loose-fitting clothing',
-            'Keeping skin clean and dry',
-            'Washing hands after contact with pets',
-            'Using antifungal powder in shoes'
-        ],
-        'duration': '2-4 weeks with proper treatment; may take longer for scalp infections',
-        'when_to_see_doctor': [
-            'If the rash doesn\'t improve after 2 weeks of OTC treatment',
-            'If the rash is painful or shows signs of infection',
-            'If the rash is on your scalp',
-            'If you have a weakened immune system',
-            'If the rash spreads rapidly'
-        ]
-    },
-    'PA-cutaneous-larva-migrans': {
-        'name': 'Cutaneous Larva Migrans',
-        'description': 'Cutaneous larva migrans (CLM), also known as "creeping eruption," is a skin disease caused by hookworm larvae that have penetrated the skin. It\'s characterized by an itchy, winding rash that moves or "migrates" across the skin.',
-        'causes': [
-            'Caused by hookworm larvae (usually from dog or cat feces)',
-            'Larvae penetrate skin through direct contact with contaminated soil/sand',
-            'Common in tropical and subtropical regions',
-            'More likely when walking barefoot on contaminated beaches',
-            'Not spread from person to person'
-        ],
-        'symptoms': [
-            'Intensely itchy, winding red tracks on the skin',
-            'Raised, snake-like lines that grow longer each day',
-            'Small blisters at the start of the tracks',
-            'Redness and swelling around the tracks',
-            'Burning sensation in affected areas',
-            'Tracks typically appear 1-5 days after exposure'
-        ],
-        'complications': [
-            'Secondary bacterial infection from scratching',
-            'Persistent itching for weeks or months',
-            'Scarring from scratching',
-            'Sleep disturbances due to itching',
-            'Superinfection with other organisms',
-            'Rarely, larvae may migrate to other organs'
-        ],
-        'treatment': [
-            'Antiparasitic medications (ivermectin, albendazole)',
-            'Topical thiabendazole (less effective than oral)',
-            'Antihistamines for itching',
-            'Topical corticosteroids for inflammation',
-            'Cool compresses for symptom relief',
-            'Keeping nails short to prevent skin damage from scratching'
-        ],
-        'prevention': [
-            'Wearing shoes on beaches in tropical areas',
-            'Using a barrier (towel, mat) when sitting on sand',
-            'Avoiding areas where animals defecate',
-            'Proper disposal of pet feces',
-            'Good hand hygiene after outdoor activities'
-        ],
-        'duration': 'Without treatment: 4-8 weeks; With treatment: symptoms improve within days',
-        'when_to_see_doctor': [
-            'If you suspect CLM after traveling to tropical areas',
-            'If itching is severe and disrupting sleep',
-            'If signs of secondary infection (pus, increased redness)',
-            'If the rash spreads rapidly',
-            'If you\'re pregnant or immunocompromised'
-        ]
-    }
-}
+# Feature extractor runtime: 'keras' (the .h5 model), or 'tflite' / 'onnx'
+# models produced by export_backbone.py. The lighter runtimes do not need
+# TensorFlow to be imported in the serving process.
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'keras')
+BACKBONE_MODEL_PATH = os.environ.get('BACKBONE_MODEL_PATH') or default_model_path(INFERENCE_BACKEND, RESNET_MODEL_PATH)
+INFERENCE_THREADS = int(os.environ.get('INFERENCE_THREADS', 0)) or None
 
-# Categories must match your training
-CATEGORIES = ['VI-chickenpox', 'BA- cellulitis', 'FU-athlete-foot', 
-              'BA-impetigo', 'FU-nail-fungus', 'FU-ringworm', 'PA-cutaneous-larva-migrans']
+# Optional pooling/PCA stage between ResNet and the SVM (written by retrain_svm.py)
+FEATURE_REDUCER_PATH = os.environ.get('FEATURE_REDUCER_PATH') or os.path.join(MODEL_DIR, "feature_reducer.pkl")
 
-# Image size must match your training
-IMG_SIZE = (192, 192)
+# Optional early-exit classifier (written by train_cascade.py)
+CASCADE_MODEL_PATH = os.path.join(MODEL_DIR, "cascade_model.pkl")
+
+# Disease metadata (names, descriptions, report content), ordered by model class index.
+# Edits to the data file are picked up without restarting the workers.
+DISEASE_DATA_PATH = os.environ.get('DISEASE_DATA_PATH', DEFAULT_DATA_PATH)
+disease_catalog = CatalogStore(DISEASE_DATA_PATH)
 
 # Global variables to store models
 svm_model = None
 resnet_model = None
+feature_reducer = None
+svm_scorer = None
+cascade_model = None
+cascade_stats = CascadeStats()
 
-def load_models():
-    """Load the models once at startup with memory considerations"""
-    global svm_model, resnet_model
+def load_classifier():
+    """Load the SVM (and its feature reducer); these are safe to share with forked workers"""
+    global svm_model, feature_reducer, svm_scorer, cascade_model
+    
+    # Load SVM model
+    started = time.perf_counter()
+    try:
+        with open(SVM_MODEL_PATH, 'rb') as f:
+            svm_model = pickle.load(f)
+        logger.info("SVM model loaded successfully")
+    except Exception as e:
+        logger.error(f"Error loading SVM model: {str(e)}")
+        return False
+    
+    # Refuse to serve if the model's classes do not line up with the disease data
+    try:
+        disease_catalog.set_model_classes(svm_model.classes_)
+    except (AttributeError, CatalogError) as e:
+        logger.error(f"SVM classes do not match {DISEASE_DATA_PATH}: {str(e)}")
+        svm_model = None
+        return False
     
+    # Extract the SVM into contiguous arrays for the fast scoring path
     try:
-        # Load SVM model
+        if hasattr(svm_model, 'scorer'):
+            # Linear/approximate-kernel heads already score with plain NumPy matmuls
+            svm_scorer = svm_model.scorer()
+            logger.info(f"Linear classifier head ready ({svm_model.describe()})")
+        else:
+            svm_scorer = FastSVMScorer.from_model(svm_model)
+            logger.info(f"Fast SVM scorer ready ({len(svm_scorer.support_vectors)} support vectors, "
+                        f"probabilities: {svm_scorer.has_probabilities})")
+    except Exception as e:
+        svm_scorer = None
+        logger.warning(f"Fast SVM scorer unavailable, using sklearn predict/predict_proba: {str(e)}")
+    
+    # Load the feature reducer the SVM was trained with, if any
+    try:
+        feature_reducer = load_reducer(FEATURE_REDUCER_PATH) if os.path.exists(FEATURE_REDUCER_PATH) else None
+        check_reducer_matches(svm_model, feature_reducer)
+        if feature_reducer is not None:
+            logger.info(f"Feature reducer loaded: {feature_reducer.describe()}")
+    except Exception as e:
+        logger.error(f"Error loading feature reducer: {str(e)}")
+        return False
+    
+    # The early-exit stage is optional; without it every image takes the full path
+    cascade_model = None
+    if app.config['CASCADE_ENABLED'] and os.path.exists(CASCADE_MODEL_PATH):
         try:
-            with open(SVM_MODEL_PATH, 'rb') as f:
-                svm_model = pickle.load(f)
-            logger.info("SVM model loaded successfully")
+            candidate = load_cascade(CASCADE_MODEL_PATH)
+            if list(candidate.classes) != list(svm_model.classes_):
+                raise ValueError("its classes differ from the SVM's")
+            cascade_model = candidate
+            logger.info(f"Early-exit cascade loaded (threshold {cascade_model.threshold:.3f})")
         except Exception as e:
-            logger.error(f"Error loading SVM model: {str(e)}")
+            logger.warning(f"Early-exit cascade disabled: {str(e)}")
+    metrics.MODEL_LOAD_SECONDS.set(time.perf_counter() - started, model='classifier')
+    return True
+
+def load_backbone():
+    """Load the ResNet50 feature extractor with the configured runtime"""
+    global resnet_model
+    
+    # Load ResNet50 base model
+    try:
+        # Verify the model file exists
+        if not os.path.exists(BACKBONE_MODEL_PATH):
+            logger.error(f"ResNet model file not found at {BACKBONE_MODEL_PATH}")
             return False
             
-        # Load ResNet50 base model
-        try:
-            # Verify the model file exists
-            if not os.path.exists(RESNET_MODEL_PATH):
-                logger.error(f"ResNet model file not found at {RESNET_MODEL_PATH}")
-                return False
-                
-            resnet_model = load_model(RESNET_MODEL_PATH)
-            logger.info("ResNet50 model loaded successfully on CPU")
-            return True
-        except Exception as e:
-            logger.error(f"Error loading ResNet model: {str(e)}")
+        started = time.perf_counter()
+        resnet_model = load_backend(INFERENCE_BACKEND, BACKBONE_MODEL_PATH, num_threads=INFERENCE_THREADS)
+        metrics.MODEL_LOAD_SECONDS.set(time.perf_counter() - started, model='backbone')
+        logger.info(f"ResNet50 model loaded successfully on CPU ({INFERENCE_BACKEND} backend)")
+        return True
+    except Exception as e:
+        logger.error(f"Error loading ResNet model: {str(e)}")
+        return False
+
+def load_models():
+    """Load the models once at startup with memory considerations"""
+    try:
+        # Parts already loaded (e.g. preloaded by a serve.py master process) are kept
+        if svm_model is None and not load_classifier():
             return False
-            
+        if resnet_model is None and not load_backbone():
+            return False
+        return True
     except Exception as e:
         logger.error(f"Error loading models: {str(e)}")
         return False
 
-def preprocess_image(image_path):
-    """Preprocess the image for prediction"""
-    try:
-        # Open and convert image
-        image = Image.open(image_path)
-        img = np.array(image)
-        
-        # Handle RGBA images
-        if img.shape[2] == 4:
-            img = cv2.cvtColor(img, cv2.COLOR_RGBA2RGB)
-            
-        # Resize
-        img = cv2.resize(img, IMG_SIZE)
+def _stage(name, record):
+    return metrics.stage(name) if record else contextlib.nullcontext()
+
+def extract_features(processed_imgs, record=True):
+    """Run the ResNet backbone on a stacked batch and return flattened float16 features"""
+    # Extract features for the whole batch in a single ResNet call
+    with _stage('forward', record):
+        features = resnet_model.predict(processed_imgs)
+    
+    # Optional pooling/projection to a much narrower vector
+    if feature_reducer is not None:
+        with _stage('reduce', record):
+            features = feature_reducer.transform(features)
+    features_flat = np.asarray(features).reshape(len(processed_imgs), -1)
+    
+    # Convert to float16 as in your training script
+    return features_flat.astype(np.float16)
+
+def classify_features(features_flat, record=True):
+    """Run the SVM on flattened features and return (label, confidence, probabilities) per row.
+
+    With ``record=False`` nothing goes to the stage histograms or counters
+    (used for TTA views, which are accounted for as part of their request).
+    """
+    svm_started = time.perf_counter()
+    if svm_scorer is not None:
+        # One kernel evaluation gives both the label and the calibrated probabilities
+        prediction_idx, probabilities = svm_scorer.predict(features_flat)
+    else:
+        # Make predictions using SVM
+        prediction_idx = svm_model.predict(features_flat)
         
-        # Contrast Enhancement (CLAHE)
+        # Get probability scores with validation
         try:
-            lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
-            l, a, b = cv2.split(lab)
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-            l = clahe.apply(l)
-            lab = cv2.merge([l, a, b])
-            img = cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+            probabilities = svm_model.predict_proba(features_flat)
         except Exception as e:
-            logger.warning(f"CLAHE enhancement failed, using original image. Error: {str(e)}")
-        
-        # Convert to float32 and preprocess for ResNet50
-        img = img.astype(np.float32)
-        img = preprocess_input(img)
+            logger.error(f"Probability error: {str(e)}")
+            probabilities = None  # Default confidence used below
+    if record:
+        metrics.observe_stage('svm', time.perf_counter() - svm_started)
+    
+    catalog = disease_catalog.current()
+    results = []
+    for i, idx in enumerate(prediction_idx):
+        predicted_label = catalog.label_for(idx)
+        row = probabilities[i] if probabilities is not None else None
+        fallback = None
+        if row is None:
+            confidence = 90.0
+            fallback = 'no_probabilities'
+        elif not np.isclose(row.sum(), 1.0, atol=0.01):
+            logger.warning(f"Invalid probabilities sum: {row.sum()}")
+            confidence = 90.0
+            fallback = 'invalid_sum'
+        else:
+            confidence = round(float(np.max(row)) * 100, 2)
+        if record:
+            if fallback:
+                metrics.FALLBACK_CONFIDENCE.inc(reason=fallback)
+            logger.info(f"Prediction: {predicted_label} ({confidence}%) | Probabilities: {row}")
+        results.append((predicted_label, confidence, row))
+    return results
+
+def predict_batch(processed_imgs):
+    """Predict diseases for a stacked batch of preprocessed images"""
+    results = [(label, confidence) for label, confidence, _ in classify_features(extract_features(processed_imgs))]
+    for label, _ in results:
+        metrics.PREDICTIONS.inc(label=label)
+    return results
+
+def _predict_batch_with_features(processed_imgs):
+    """Like predict_batch, but also hand back each row's features and probabilities for caching"""
+    features_flat = extract_features(processed_imgs)
+    return [result + (features,) for result, features in zip(classify_features(features_flat), features_flat)]
+
+# Shared scheduler for single-image requests
+inference_engine = None
+
+def get_inference_engine():
+    """Return the micro-batching scheduler, creating it on first use"""
+    global inference_engine
+    if inference_engine is None:
+        inference_engine = MicroBatcher(_predict_batch_with_features,
+                                        max_batch_size=app.config['INFERENCE_MAX_BATCH_SIZE'],
+                                        max_wait_ms=app.config['INFERENCE_MAX_WAIT_MS'])
+    return inference_engine
+
+# Cache of features and predictions for images we have already scored.
+# Keys include a hash of the model files and of the settings that change the
+# cached answer (backend, TTA), so changing any of them invalidates it.
+model_fingerprint = ModelFingerprint([SVM_MODEL_PATH, BACKBONE_MODEL_PATH, FEATURE_REDUCER_PATH, CASCADE_MODEL_PATH],
+                                     settings=f"backend={INFERENCE_BACKEND}|tta={app.config['TTA_MODE']},"
+                                              f"{app.config['TTA_THRESHOLD']},{app.config['TTA_VIEWS']}|"
+                                              f"cascade={app.config['CASCADE_ENABLED']}")
+feature_cache = FeatureCache(model_fingerprint.current,
+                             max_entries=app.config['FEATURE_CACHE_MAX_ENTRIES'],
+                             disk_dir=app.config['FEATURE_CACHE_DIR'],
+                             disk_max_bytes=app.config['FEATURE_CACHE_DISK_MAX_BYTES'])
+
+# Bounded executor that every interactive prediction goes through
+inference_executor = BoundedInferenceExecutor(workers=app.config['INFERENCE_WORKERS'],
+                                              max_queue_depth=app.config['INFERENCE_MAX_QUEUE_DEPTH'],
+                                              max_estimated_wait=app.config['INFERENCE_MAX_ESTIMATED_WAIT'])
+
+# Worker pool that turns uploads into model inputs off the request/model threads
+preprocess_pool = PreprocessPool(workers=app.config['PREPROCESS_WORKERS'], on_timings=metrics.observe_stages)
+
+def predict_prepared(prepared):
+    """Predict a list of (pixel_hash, model_input) pairs as one batch, serving repeats from the feature cache.
+
+    Images go through the same early-exit cascade and low-confidence ones
+    get the same test-time augmentation as interactive requests, so a cached
+    answer is the same whichever path produced it.
+    """
+    results = [None] * len(prepared)
+    misses = []
+    for i, (digest, processed_img) in enumerate(prepared):
+        key = feature_cache.key_for_digest(digest)
+        entry = feature_cache.get(key)
+        metrics.CACHE_LOOKUPS.inc(result='hit' if entry is not None else 'miss')
+        if entry is not None:
+            results[i] = (entry['label'], entry['confidence'])
+        else:
+            misses.append((i, key, processed_img))
+    
+    if misses and cascade_model is not None:
+        decisions = run_cascade(np.concatenate([processed_img for _, _, processed_img in misses], axis=0))
+        escalated = []
+        for (i, key, processed_img), cascade in zip(misses, decisions):
+            if cascade['exit'] and not cascade['audit']:
+                # Not cached, as in predict_details: there are no backbone features
+                cascade_stats.record(exited=True)
+                metrics.PREDICTIONS.inc(label=cascade['label'])
+                results[i] = (cascade['label'], cascade['confidence'])
+            else:
+                escalated.append((i, key, processed_img, cascade))
+    else:
+        escalated = [(i, key, processed_img, None) for i, key, processed_img in misses]
+    
+    if escalated:
+        batch = np.concatenate([processed_img for _, _, processed_img, _ in escalated], axis=0)
+        for (i, key, processed_img, cascade), (label, confidence, probabilities, features) in zip(
+                escalated, _predict_batch_with_features(batch)):
+            # Same TTA decision as predict_details, since both read and write the same cache entries
+            if needs_tta(app.config['TTA_MODE'], confidence, probabilities, app.config['TTA_THRESHOLD']):
+                label, confidence, probabilities, views = predict_with_tta(processed_img, probabilities)
+            else:
+                views = 1
+            feature_cache.put(key, features, label, confidence, probabilities, views)
+            if cascade is not None:
+                cascade_stats.record(exited=cascade['exit'], kind='audited' if cascade['exit'] else 'escalated',
+                                     agreed=cascade['label'] == label)
+            metrics.PREDICTIONS.inc(label=label)
+            results[i] = (label, confidence)
+    return results
+
+def predict_details(image_path):
+    """Predict one image and return the label, confidence, full probability row and per-stage timings"""
+    timings = {}
+    started = time.perf_counter()
+    step = 'preprocess'
+    views = 1
+    stage = 'full'
+    try:
+        # Decode and preprocess in the worker pool; repeat images are then
+        # answered from the cache without touching the network
+        digest, processed_img = preprocess_pool.run(image_path)
+        timings['preprocess_ms'] = round((time.perf_counter() - started) * 1000, 3)
         
-        return np.expand_dims(img, axis=0)
+        step = 'cache'
+        key = feature_cache.key_for_digest(digest)
+        entry = feature_cache.get(key)
+        cached = entry is not None
+        metrics.CACHE_LOOKUPS.inc(result='hit' if cached else 'miss')
+        if cached:
+            logger.info(f"Cache hit: {entry['label']} ({entry['confidence']}%)")
+            label, confidence, probabilities = entry['label'], entry['confidence'], entry['probabilities']
+            views = entry.get('views', 1)
+        else:
+            step = 'cascade'
+            cascade = run_cascade(processed_img)[0] if cascade_model is not None else None
+            if cascade is not None and cascade['exit'] and not cascade['audit']:
+                # Confident enough to skip ResNet50 + SVM (not cached: there are no backbone features)
+                label, confidence, probabilities = cascade['label'], cascade['confidence'], cascade['probabilities']
+                stage = 'cascade'
+                cascade_stats.record(exited=True)
+            else:
+                # Batched with any other requests in flight
+                step = 'inference'
+                inference_started = time.perf_counter()
+                label, confidence, probabilities, features = get_inference_engine().predict(processed_img)
+                inference_seconds = time.perf_counter() - inference_started
+                metrics.observe_stage('inference', inference_seconds)
+                timings['inference_ms'] = round(inference_seconds * 1000, 3)
+                
+                if needs_tta(app.config['TTA_MODE'], confidence, probabilities, app.config['TTA_THRESHOLD']):
+                    step = 'tta'
+                    tta_started = time.perf_counter()
+                    label, confidence, probabilities, views = predict_with_tta(processed_img, probabilities)
+                    tta_seconds = time.perf_counter() - tta_started
+                    metrics.observe_stage('tta', tta_seconds)
+                    timings['tta_ms'] = round(tta_seconds * 1000, 3)
+                # The cache keeps the final (possibly augmented) answer with the single-view features
+                feature_cache.put(key, features, label, confidence, probabilities, views)
+                if cascade is not None:
+                    cascade_stats.record(exited=cascade['exit'], kind='audited' if cascade['exit'] else 'escalated',
+                                         agreed=cascade['label'] == label)
     except Exception as e:
-        logger.error(f"Error in image preprocessing: {str(e)}")
+        metrics.PREDICTION_ERRORS.inc(stage=step)
+        logger.error(f"Prediction error: {str(e)}")
         raise
+    
+    # Counted once per request, with the final (cascade or augmented) label
+    if not cached:
+        metrics.PREDICTIONS.inc(label=label)
+    timings['total_ms'] = round((time.perf_counter() - started) * 1000, 3)
+    return {'label': label, 'confidence': confidence, 'probabilities': probabilities,
+            'cached': cached, 'stage': stage, 'views': views, 'timings': timings}
+
+def run_cascade(processed_imgs):
+    """Score a batch with the cheap classifier and decide, per image, whether it may exit early"""
+    started = time.perf_counter()
+    classes, probabilities, exits = cascade_model.decide(processed_imgs,
+                                                         threshold=app.config['CASCADE_THRESHOLD'],
+                                                         min_margin=app.config['CASCADE_MIN_MARGIN'])
+    metrics.observe_stage('cascade', time.perf_counter() - started)
+    catalog = disease_catalog.current()
+    decisions = []
+    for cls, row, exit_ in zip(classes, probabilities, exits):
+        exited = bool(exit_)
+        # Audit a sample of early exits against the full model
+        audit = exited and random.random() < app.config['CASCADE_AUDIT_RATE']
+        metrics.CASCADE_DECISIONS.inc(outcome='audit' if audit else 'exit' if exited else 'escalate')
+        decisions.append({
+            'label': catalog.label_for(cls),
+            'confidence': round(float(np.max(row)) * 100, 2),
+            'probabilities': row,
+            'exit': exited,
+            'audit': audit,
+        })
+    return decisions
+
+def predict_with_tta(processed_img, probabilities):
+    """Score extra augmented views of an image and average their probabilities with the original.
+
+    The views are scored as one ResNet batch, outside the micro-batcher and
+    the stage histograms: the caller times the whole step as the 'tta' stage
+    and counts the request once. Returns (label, confidence, probabilities,
+    number of views).
+    """
+    views = make_views(processed_img, app.config['TTA_VIEWS'])
+    scored = classify_features(extract_features(views, record=False), record=False) if len(views) else []
+    rows = [probabilities] + [row for _, _, row in scored]
+    averaged = average_probabilities(rows)
+    best = int(np.argmax(averaged))
+    label, confidence = class_labels()[best], round(float(averaged[best]) * 100, 2)
+    metrics.TTA_PREDICTIONS.inc()
+    logger.info(f"TTA over {len(rows)} views: {label} ({confidence}%)")
+    return label, confidence, averaged, len(rows)
 
 def predict_disease(image_path):
     """Predict the disease from an image"""
-    try:
-        # Preprocess image
-        processed_img = preprocess_image(image_path)
-        
-        # Extract features using ResNet
-        features = resnet_model.predict(processed_img)
-        features_flat = features.reshape(1, -1)
-        
-        # Convert to float16 as in your training script
-        features_flat = features_flat.astype(np.float16)
-        
-        # Make prediction using SVM
-        prediction_idx = svm_model.predict(features_flat)[0]
-        predicted_label = CATEGORIES[prediction_idx]
+    details = predict_details(image_path)
+    return details['label'], details['confidence']
+
+def class_labels():
+    """Disease labels in the order of the SVM's probability columns"""
+    catalog = disease_catalog.current()
+    return [catalog.label_for(idx) for idx in getattr(svm_model, 'classes_', range(len(catalog)))]
+
+def model_version():
+    return {'backend': INFERENCE_BACKEND, 'fingerprint': model_fingerprint.current()}
+
+def iter_uploads(files):
+    """Yield (name, stream) for (filename, stream) uploads, expanding zip archives member by member"""
+    for filename, stream in files:
+        if filename.lower().endswith('.zip'):
+            yield from iter_zip_images(stream)
+        else:
+            yield filename, stream
+
+def run_prediction_job(items):
+    """Job handler: score the saved (name, path) pairs in batches and return one record per image"""
+    if not warm_up_models():
+        raise RuntimeError("Models could not be loaded")
+    records = []
+    prepared = preprocess_pool.imap(items)
+    for batch in score_stream(prepared, preprocess_pool.result, predict_prepared, DEFAULT_BATCH_SIZE):
+        records.extend(batch)
+    return records
+
+# Created on first use, so tools that import this module get no database or worker threads
+job_queue = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """Return the background job queue, opening its database on first use"""
+    global job_queue
+    with _job_queue_lock:
+        if job_queue is None:
+            job_queue = JobQueue(app.config['JOB_DB_PATH'], run_prediction_job,
+                                 workers=app.config['JOB_WORKERS'],
+                                 ttl=app.config['JOB_TTL_SECONDS'],
+                                 lease=app.config['JOB_LEASE_SECONDS'])
+    return job_queue
+
+def start_job_workers():
+    """Server start-up: resume jobs queued or interrupted before this process started"""
+    get_job_queue().start()
+
+def render_page(key):
+    """Render one of the static pages: 'index' or 'report/<disease label>'"""
+    with app.app_context():
+        if key == 'index':
+            return render_template('index.html')
+        disease = disease_catalog.current()[key.split('/', 1)[1]]
+        return render_template('report.html', disease=disease, disease_id=disease.label)
+
+# The index and report pages only depend on the disease data, so they are rendered
+# and compressed once and then served from memory with strong ETags
+static_pages = PageCache(render_page,
+                         keys_fn=lambda: ['index'] + [f'report/{label}' for label in disease_catalog.current().labels],
+                         max_age=app.config['PAGE_CACHE_MAX_AGE'])
+disease_catalog.on_reload(lambda catalog: static_pages.clear())
+
+# Startup state reported by /readyz
+model_state = {
+    'status': 'not_loaded',
+    'error': None,
+    'load_seconds': None,
+    'warmup_seconds': None,
+    'cold_start_seconds': None,
+}
+_warmup_lock = threading.Lock()
+_warmup_thread = None
+
+def models_ready():
+    return model_state['status'] == 'ready'
+
+def warm_up_pass():
+    """Push a dummy image through the backbone and the classifier, bypassing the metered prediction path"""
+    # The first forward pass triggers graph tracing / kernel selection
+    dummy = np.zeros((1, IMG_SIZE[1], IMG_SIZE[0], 3), dtype=np.float32)
+    features = resnet_model.predict(dummy)
+    if feature_reducer is not None:
+        features = feature_reducer.transform(features)
+    features_flat = np.asarray(features).reshape(1, -1).astype(np.float16)
+    if svm_scorer is not None:
+        svm_scorer.predict(features_flat)
+    else:
+        svm_model.predict(features_flat)
+
+def warm_up_models():
+    """Load both models and push a dummy batch through them so the first request is not slow"""
+    with _warmup_lock:
+        if models_ready():
+            return True
+        model_state.update(status='loading', error=None)
+        started = time.perf_counter()
+        if not load_models():
+            model_state.update(status='failed', error="Failed to load models (see log)")
+            return False
+        loaded = time.perf_counter()
         
-        # Get probability scores with validation
         try:
-            probabilities = svm_model.predict_proba(features_flat)[0]
-            # Validate probabilities
-            if not np.isclose(probabilities.sum(), 1.0, atol=0.01):
-                logger.warning(f"Invalid probabilities sum: {probabilities.sum()}")
-                confidence = 90.0
-            else:
-                confidence = round(float(np.max(probabilities)) * 100, 2)
+            warm_up_pass()
         except Exception as e:
-            logger.error(f"Probability error: {str(e)}")
-            confidence = 90.0  # Default if probabilities fail
+            logger.error(f"Model warm-up failed: {str(e)}")
+            model_state.update(status='failed', error=f"Warm-up failed: {str(e)}")
+            return False
         
-        logger.info(f"Prediction: {predicted_label} ({confidence}%) | Probabilities: {probabilities}")
-        return predicted_label, confidence
-    except Exception as e:
-        logger.error(f"Prediction error: {str(e)}")
-        raise
+        ready = time.perf_counter()
+        metrics.MODEL_LOAD_SECONDS.set(ready - loaded, model='warmup')
+        model_state.update(status='ready',
+                           load_seconds=round(loaded - started, 3),
+                           warmup_seconds=round(ready - loaded, 3),
+                           cold_start_seconds=round(ready - IMPORT_STARTED, 3))
+        logger.info(f"Models ready: cold start {model_state['cold_start_seconds']}s "
+                    f"(load {model_state['load_seconds']}s, warm-up {model_state['warmup_seconds']}s)")
+        try:
+            static_pages.build()
+        except Exception as e:
+            logger.warning(f"Could not pre-render pages: {str(e)}")
+        return True
+
+def start_background_warmup():
+    """Load and warm the models on a background thread so the server can accept connections immediately"""
+    global _warmup_thread
+    if _warmup_thread is None or not (_warmup_thread.is_alive() or models_ready()):
+        _warmup_thread = threading.Thread(target=warm_up_models, name='model-warmup', daemon=True)
+        _warmup_thread.start()
+    return _warmup_thread
+
+# Scrape-time gauges for the queues in front of the models
+metrics.Gauge('skin_models_ready', "1 once the models are loaded and warmed up", fn=lambda: int(models_ready()))
+metrics.Gauge('skin_inference_queue_depth', "Images waiting for the micro-batcher",
+              fn=lambda: get_inference_engine().queue_depth())
+metrics.Gauge('skin_executor_queued', "Predictions waiting for an inference worker",
+              fn=lambda: inference_executor.stats()['queued'])
+metrics.Gauge('skin_executor_rejected', "Predictions shed since start-up",
+              fn=lambda: inference_executor.stats()['rejected'])
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    metrics.start_trace(f"{request.method} {request.path}")
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    endpoint = request.endpoint or 'unknown'
+    if started is not None and endpoint != 'metrics_endpoint':
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+        metrics.REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    metrics.finish_trace(status=response.status_code)
+    return response
 
 # Routes
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text-format metrics"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving HTTP"""
+    return jsonify(status='ok', uptime_seconds=round(time.perf_counter() - IMPORT_STARTED, 3))
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: models are loaded and warmed up"""
+    return jsonify(model_state), (200 if models_ready() else 503)
+
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return static_pages.respond('index', request, Response)
 
 @app.route('/predict', methods=['POST'])
 def predict():
@@ -636,51 +786,219 @@ def predict():
     if file.filename == '':
         return render_template('error.html', message="No file selected")
     
+    if not models_ready():
+        return render_template('error.html', message="The models are still loading, please try again shortly"), 503
+    
     if file:
-        # Save the uploaded file
-        filename = file.filename
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
         try:
-            # Make prediction
-            predicted_label, confidence = predict_disease(filepath)
+            # Decode from the request stream; only large uploads touch the disk
+            with upload_source(file, app.config['UPLOAD_SPILL_THRESHOLD'], app.config['UPLOAD_SPILL_DIR']) as source:
+                predicted_label, confidence = inference_executor.run(predict_disease, source)
             
             # Get disease name for display
-            if '-' in predicted_label:
-                disease_name = predicted_label.split('-')[1].replace('-', ' ').title()
-            else:
-                disease_name = predicted_label
-            
-            # Clean up the uploaded file
-            os.remove(filepath)
+            disease = disease_catalog.current().get(predicted_label)
+            disease_name = disease.name if disease is not None else predicted_label
             
-            return render_template('result.html', 
-                                  prediction=disease_name,
-                                  confidence=confidence,
-                                  disease_id=predicted_label)
+            with metrics.stage('render'):
+                return render_template('result.html', 
+                                      prediction=disease_name,
+                                      confidence=confidence,
+                                      disease_id=predicted_label)
+        except Overloaded as e:
+            logger.warning(f"Shedding /predict request: {str(e)}")
+            response = app.make_response((render_template('error.html', message="The server is busy, please try again shortly"), 503))
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
         except Exception as e:
-            # Clean up the uploaded file in case of error
-            if os.path.exists(filepath):
-                os.remove(filepath)
             return render_template('error.html', message=f"Error processing image: {str(e)}")
     
     return render_template('error.html', message="Unknown error occurred")
 
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch_route():
+    """Score a multipart list of images (or a single zip) and stream results as JSONL/CSV"""
+    files = [f for f in request.files.getlist('files') + request.files.getlist('file') if f.filename]
+    if not files:
+        return jsonify(error="No files in the request"), 400
+    if not models_ready():
+        return jsonify(error="Models are still loading"), 503
+    
+    fmt = request.args.get('format', request.form.get('format', 'jsonl'))
+    if fmt not in ('jsonl', 'csv'):
+        return jsonify(error=f"Unsupported format: {fmt}"), 400
+    batch_size = request.args.get('batch_size', DEFAULT_BATCH_SIZE, type=int)
+    # The request's file streams are closed before the response body is generated
+    uploads = spool_uploads(files, app.config['UPLOAD_SPILL_THRESHOLD'])
+    
+    def generate():
+        try:
+            if fmt == 'csv':
+                yield format_records([], fmt, header=True)
+            prepared = preprocess_pool.imap(iter_uploads(uploads))
+            for records in score_stream(prepared, preprocess_pool.result, predict_prepared, batch_size):
+                yield format_records(records, fmt)
+        finally:
+            for _, stream in uploads:
+                stream.close()
+    
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue uploaded images (or zips of images) for background prediction and return the job id at once"""
+    files = [f for f in request.files.getlist('files') + request.files.getlist('file') if f.filename]
+    if not files:
+        return jsonify(error="No files in the request"), 400
+    try:
+        job_id = get_job_queue().submit(iter_uploads((f.filename, f.stream) for f in files))
+    except Exception as e:
+        logger.error(f"Could not queue job: {str(e)}")
+        return jsonify(error=f"Could not queue job: {str(e)}"), 500
+    
+    response = jsonify(job_id=job_id, status='queued',
+                       status_url=url_for('job_status', job_id=job_id),
+                       events_url=url_for('job_events', job_id=job_id))
+    response.status_code = 202
+    response.headers['Location'] = url_for('job_status', job_id=job_id)
+    return response
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Poll a job: status while it is queued/running, records once it is done"""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify(error="Unknown or expired job"), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-sent events with the job's status until it finishes"""
+    jobs = get_job_queue()
+    if jobs.get(job_id) is None:
+        return jsonify(error="Unknown or expired job"), 404
+    
+    def generate():
+        last_status = None
+        while True:
+            job = jobs.get(job_id)
+            if job is None:
+                yield 'event: expired\ndata: {}\n\n'
+                return
+            if job['status'] != last_status:
+                last_status = job['status']
+                yield f"event: {job['status']}\ndata: {json.dumps(job)}\n\n"
+            else:
+                yield ': keep-alive\n\n'
+            if job['status'] in FINISHED:
+                return
+            time.sleep(jobs.poll_interval * 2)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
+def _api_image_source():
+    """Image bytes from a multipart 'file', a JSON/multipart base64 'image' field, or the raw request body"""
+    if request.mimetype == 'multipart/form-data':
+        if 'file' in request.files and request.files['file'].filename:
+            return request.files['file'].stream
+        payload = request.form
+    elif request.is_json:
+        payload = request.get_json(silent=True)
+    else:
+        # Raw uploads often arrive labelled as urlencoded forms (curl --data-binary's default),
+        # so the body is read as-is and never handed to the form parser
+        body = request.get_data(cache=True)
+        return io.BytesIO(body) if body else None
+    # request.form is a MultiDict (a dict subclass); a JSON body may be any JSON value
+    encoded = payload.get('image') if isinstance(payload, dict) else None
+    if not encoded:
+        return None
+    if not isinstance(encoded, str):
+        raise ValueError("the 'image' field must be a base64 string")
+    # Accept data URLs as well as bare base64
+    if encoded.startswith('data:') and ',' in encoded:
+        encoded = encoded.split(',', 1)[1]
+    return io.BytesIO(base64.b64decode(encoded, validate=True))
+
+def _api_response(payload, status=200):
+    """JSON by default; msgpack when asked for with ?format=msgpack or an Accept header"""
+    wants_msgpack = (request.args.get('format') == 'msgpack' or
+                     request.accept_mimetypes.best_match(['application/json', 'application/x-msgpack'])
+                     == 'application/x-msgpack')
+    if wants_msgpack:
+        try:
+            import msgpack
+        except ImportError:
+            return jsonify(error="msgpack is not installed on this server"), 406
+        return Response(msgpack.packb(payload, use_bin_type=True), status=status, mimetype='application/x-msgpack')
+    response = jsonify(payload)
+    response.status_code = status
+    return response
+
+@app.route('/api/v1/predict', methods=['POST'])
+def api_predict():
+    """Machine-facing prediction: label, all class probabilities, model version and timings (no HTML)"""
+    received = time.perf_counter()
+    if not models_ready():
+        return _api_response({'error': "Models are still loading"}, 503)
+    try:
+        source = _api_image_source()
+    except (binascii.Error, ValueError) as e:
+        return _api_response({'error': f"Invalid base64 image: {str(e)}"}, 400)
+    if source is None:
+        return _api_response({'error': "No image in the request"}, 400)
+    
+    try:
+        details = inference_executor.run(predict_details, source)
+    except Overloaded as e:
+        response = _api_response({'error': str(e), 'retry_after': e.retry_after}, 503)
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+    except Exception as e:
+        return _api_response({'error': f"Error processing image: {str(e)}"}, 422)
+    
+    probabilities = details['probabilities']
+    timings = details['timings']
+    timings['request_ms'] = round((time.perf_counter() - received) * 1000, 3)
+    return _api_response({
+        'label': details['label'],
+        'confidence': details['confidence'],
+        'probabilities': None if probabilities is None else
+            {label: float(p) for label, p in zip(class_labels(), probabilities)},
+        'cached': details['cached'],
+        'stage': details['stage'],
+        'views': details['views'],
+        'model': model_version(),
+        'timings': timings,
+    })
+
 @app.route('/report/<disease_id>')
 def report(disease_id):
-    if disease_id not in DISEASE_INFO:
+    # Accepts the model label, the slug or the class index
+    disease = disease_catalog.current().get(disease_id)
+    if disease is None:
         return render_template('error.html', message="Invalid disease ID")
     
-    disease = DISEASE_INFO[disease_id]
-    return render_template('report.html', disease=disease, disease_id=disease_id)
+    return static_pages.respond(f'report/{disease.label}', request, Response)
+
+@app.route('/inference/stats')
+def inference_stats():
+    stats = get_inference_engine().stats()
+    stats['feature_cache'] = feature_cache.stats()
+    stats['startup'] = model_state
+    stats['executor'] = inference_executor.stats()
+    stats['jobs'] = get_job_queue().stats()
+    stats['cascade'] = dict(cascade_stats.stats(), enabled=cascade_model is not None)
+    return jsonify(stats)
 
 @app.route('/error')
 def error():
     message = request.args.get('message', 'An error occurred')
     return render_template('error.html', message=message)
 
-if __name__ == '__main__':
+def run_dev_server():
+    """Flask development server; started from run.py so preprocessing workers do not re-import this module"""
     # Verify model files exist before trying to load
     if not os.path.exists(SVM_MODEL_PATH):
         logger.error(f"SVM model file not found at {SVM_MODEL_PATH}")
@@ -690,16 +1008,16 @@ if __name__ == '__main__':
         logger.error("MODEL_DIR: " + MODEL_DIR)
         exit(1)
         
-    if not os.path.exists(RESNET_MODEL_PATH):
-        logger.error(f"ResNet model file not found at {RESNET_MODEL_PATH}")
+    if not os.path.exists(BACKBONE_MODEL_PATH):
+        logger.error(f"ResNet model file not found at {BACKBONE_MODEL_PATH}")
         logger.error("Please check your model path and ensure the file exists")
         logger.error("Current working directory: " + os.getcwd())
         logger.error("BASE_DIR: " + BASE_DIR)
         logger.error("MODEL_DIR: " + MODEL_DIR)
         exit(1)
     
-    # Load models before starting the server
-    if not load_models():
+    # Load and warm up models before starting the server
+    if not warm_up_models():
         logger.error("Failed to load models. Application cannot start.")
         logger.error("Possible solutions:")
         logger.error("1. Verify model files exist at the specified paths")
@@ -708,6 +1026,18 @@ if __name__ == '__main__':
         logger.error("4. Reduce model size or use a smaller model")
         exit(1)
     
+    # With the reloader on, only the child process that serves requests runs jobs
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_job_workers()
+    
     # Run the Flask app
     logger.info("Starting Flask application on http://127.0.0.1:5000")
     app.run(debug=True, port=5000)
+
+if __name__ == '__main__':
+    # Pool workers re-import the __main__ script, which here would be this whole module
+    if preprocess_pool.workers > 0:
+        logger.warning("Preprocessing inline: started as app.py, every pool worker would re-import the app. "
+                       "Use python run.py to keep the worker pool.")
+        preprocess_pool.workers = 0
+    run_dev_server()
@@ -0,0 +1,182 @@
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from feature_cache import file_digest
+
+logger = logging.getLogger(__name__)
+
+# File extension used by each runtime for the exported ResNet50 feature extractor
+BACKEND_EXTENSIONS = {
+    'keras': '.h5',
+    'tflite': '.tflite',
+    'onnx': '.onnx',
+}
+
+
+def default_model_path(name, keras_path):
+    """Path of the exported model for a backend, next to the Keras .h5 file"""
+    if name not in BACKEND_EXTENSIONS:
+        raise ValueError(f"Unknown inference backend: {name}")
+    return os.path.splitext(keras_path)[0] + BACKEND_EXTENSIONS[name]
+
+
+def quantization_report_path(model_path):
+    """Sidecar JSON written next to a TFLite model by quantize_backbone.py or export_backbone.py"""
+    return model_path + '.json'
+
+
+def write_quantization_report(model_path, report):
+    """Write the accuracy report for a TFLite model, tied to the exact file by its digest"""
+    report = dict(report, model_digest=file_digest(model_path))
+    with open(quantization_report_path(model_path), 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def check_quantization_approval(model_path):
+    """Refuse to serve a TFLite model unless an approved report for this exact file sits next to it.
+
+    Quantized models are checked by quantize_backbone.py and float exports
+    by export_backbone.py's parity check. A file copied without its report,
+    produced by another tool or changed after it was checked is not served.
+    """
+    if os.path.splitext(model_path)[1] != BACKEND_EXTENSIONS['tflite']:
+        return
+    report_path = quantization_report_path(model_path)
+    if not os.path.exists(report_path):
+        raise RuntimeError(f"TFLite model {model_path} has no accuracy report ({report_path}); check it against "
+                           f"the Keras model with quantize_backbone.py or export_backbone.py before serving it")
+    with open(report_path) as f:
+        report = json.load(f)
+    if report.get('model_digest') != file_digest(model_path):
+        raise RuntimeError(f"{report_path} was written for a different file than {model_path}; "
+                           f"re-run the accuracy check before serving it")
+    if not report.get('approved', False):
+        raise RuntimeError(f"TFLite model {model_path} failed its accuracy gate "
+                           f"(top-1 agreement {report.get('top1_agreement')}, "
+                           f"max confidence drift {report.get('max_confidence_drift')}); refusing to activate it")
+    logger.info(f"Using approved {report.get('mode')} TFLite model "
+                f"(top-1 agreement {report.get('top1_agreement', 'n/a')})")
+
+
+class KerasBackend:
+    """The original full TensorFlow/Keras model"""
+
+    name = 'keras'
+
+    def __init__(self, path, num_threads=None):
+        import tensorflow as tf
+        from tensorflow.keras.models import load_model
+
+        if num_threads:
+            try:
+                tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+                tf.config.threading.set_inter_op_parallelism_threads(1)
+            except RuntimeError as e:
+                # TensorFlow only accepts this before its runtime is initialized
+                logger.warning(f"Could not set TensorFlow thread counts: {str(e)}")
+        self.model = load_model(path, compile=False)
+
+    def predict(self, batch):
+        return np.asarray(self.model.predict_on_batch(batch))
+
+
+class TFLiteBackend:
+    """TensorFlow Lite interpreter; uses tflite_runtime when installed so TensorFlow is not imported"""
+
+    name = 'tflite'
+
+    def __init__(self, path, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+
+        self.interpreter = Interpreter(model_path=path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+        # The interpreter holds per-call state and is not thread-safe
+        self._lock = threading.Lock()
+
+    def _quantize(self, batch):
+        scale, zero_point = self._input['quantization']
+        if self._input['dtype'] == np.float32 or not scale:
+            return batch.astype(self._input['dtype'], copy=False)
+        info = np.iinfo(self._input['dtype'])
+        return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(self._input['dtype'])
+
+    def _dequantize(self, output):
+        scale, zero_point = self._output['quantization']
+        if self._output['dtype'] == np.float32 or not scale:
+            return output.astype(np.float32, copy=False)
+        return (output.astype(np.float32) - zero_point) * scale
+
+    def predict(self, batch):
+        with self._lock:
+            if len(batch) != self._batch_size:
+                self.interpreter.resize_tensor_input(self._input['index'], [len(batch), *batch.shape[1:]])
+                self.interpreter.allocate_tensors()
+                self._input = self.interpreter.get_input_details()[0]
+                self._output = self.interpreter.get_output_details()[0]
+                self._batch_size = len(batch)
+            self.interpreter.set_tensor(self._input['index'], self._quantize(batch))
+            self.interpreter.invoke()
+            return self._dequantize(self.interpreter.get_tensor(self._output['index']).copy())
+
+
+class OnnxBackend:
+    """ONNX Runtime on the CPU execution provider"""
+
+    name = 'onnx'
+
+    def __init__(self, path, num_threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
+        self._input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        return self.session.run(None, {self._input_name: batch.astype(np.float32, copy=False)})[0]
+
+
+BACKENDS = {
+    'keras': KerasBackend,
+    'tflite': TFLiteBackend,
+    'onnx': OnnxBackend,
+}
+
+
+def load_backend(name, path, num_threads=None):
+    """Instantiate the feature-extractor runtime registered under name"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {name} (choose from {', '.join(BACKENDS)})")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{name} model file not found at {path}")
+    check_quantization_approval(path)
+    backend = BACKENDS[name](path, num_threads=num_threads)
+    logger.info(f"Loaded {name} feature extractor from {path}")
+    return backend
+
+
+def compare_features(reference, candidate, batch):
+    """Run both backends on the same batch and summarize how far the candidate's features drift"""
+    ref = reference.predict(batch).reshape(len(batch), -1).astype(np.float32)
+    out = candidate.predict(batch).reshape(len(batch), -1).astype(np.float32)
+    if ref.shape != out.shape:
+        raise ValueError(f"Feature shape mismatch: {ref.shape} vs {out.shape}")
+    cosine = np.sum(ref * out, axis=1) / (np.linalg.norm(ref, axis=1) * np.linalg.norm(out, axis=1) + 1e-12)
+    return {
+        'max_abs_diff': float(np.max(np.abs(ref - out))),
+        'mean_abs_diff': float(np.mean(np.abs(ref - out))),
+        'min_cosine': float(np.min(cosine)),
+    }
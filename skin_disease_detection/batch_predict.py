@@ -0,0 +1,193 @@
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import sys
+import time
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tif', '.tiff', '.webp')
+RESULT_FIELDS = ['image', 'label', 'confidence', 'error']
+DEFAULT_BATCH_SIZE = 32
+
+
+def is_image_name(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def iter_image_files(root):
+    """Walk a directory tree and yield (relative_name, path) for every image, in a stable order"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if is_image_name(filename):
+                path = os.path.join(dirpath, filename)
+                yield os.path.relpath(path, root), path
+
+
+def iter_labeled_images(dataset_dir, categories):
+    """Yield (path, class_index) for a dataset laid out as one sub-directory per category"""
+    for class_index, category in enumerate(categories):
+        category_dir = os.path.join(dataset_dir, category)
+        if not os.path.isdir(category_dir):
+            logger.warning(f"No directory for category {category} in {dataset_dir}")
+            continue
+        for _, path in iter_image_files(category_dir):
+            yield path, class_index
+
+
+def iter_zip_images(fileobj):
+    """Yield (member_name, file-like) for every image inside a zip archive, one member at a time"""
+    with zipfile.ZipFile(fileobj) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or not is_image_name(info.filename):
+                continue
+            yield info.filename, io.BytesIO(archive.read(info))
+
+
+def iter_chunks(items, size):
+    """Split an iterable into lists of at most size items without materializing it"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def score_stream(items, prepare_fn, predict_fn, batch_size=DEFAULT_BATCH_SIZE):
+    """Score (name, source) pairs in fixed-size batches and yield one result record per image.
+
+    ``prepare_fn`` turns one source into a model-ready item (for example by
+    waiting on a preprocessing pool future) and ``predict_fn`` scores a list of
+    those items. Only one batch is alive at a time, so memory stays flat
+    regardless of how many items the iterable produces. Images that fail to
+    decode are reported with an error instead of aborting the run.
+    """
+    for chunk in iter_chunks(items, batch_size):
+        # One record per input, filled in place so the output keeps the input order
+        records = [{'image': name, 'label': None, 'confidence': None, 'error': None} for name, _ in chunk]
+        slots, images = [], []
+        for record, (_, source) in zip(records, chunk):
+            try:
+                images.append(prepare_fn(source))
+                slots.append(record)
+            except Exception as e:
+                record['error'] = str(e)
+
+        if images:
+            try:
+                results = predict_fn(images)
+                for record, (label, confidence) in zip(slots, results):
+                    record.update(label=label, confidence=confidence)
+            except Exception as e:
+                logger.error(f"Batch prediction failed: {str(e)}")
+                for record in slots:
+                    record['error'] = str(e)
+        yield records
+
+
+def format_records(records, fmt, header=False):
+    """Render result records as JSONL or CSV text"""
+    if fmt == 'jsonl':
+        return ''.join(json.dumps(record) + '\n' for record in records)
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=RESULT_FIELDS)
+        if header:
+            writer.writeheader()
+        writer.writerows(records)
+        return buffer.getvalue()
+    raise ValueError(f"Unsupported output format: {fmt}")
+
+
+def read_completed(path, fmt):
+    """Return the image names already present in an existing results file"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, newline='') as f:
+        if fmt == 'jsonl':
+            for line in f:
+                try:
+                    done.add(json.loads(line)['image'])
+                except (ValueError, KeyError):
+                    # A crash can leave a truncated last line behind
+                    continue
+        else:
+            for row in csv.DictReader(f):
+                if row.get('image'):
+                    done.add(row['image'])
+    return done
+
+
+class ResultWriter:
+    """Append result records to a JSONL/CSV file, flushing after every batch"""
+
+    def __init__(self, path, fmt):
+        self.fmt = fmt
+        needs_header = fmt == 'csv' and (not os.path.exists(path) or os.path.getsize(path) == 0)
+        self._file = open(path, 'a', newline='')
+        if needs_header:
+            self._file.write(format_records([], fmt, header=True))
+
+    def write(self, records):
+        self._file.write(format_records(records, self.fmt))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score every image in a directory tree")
+    parser.add_argument('input_dir', help="Directory to scan recursively for images")
+    parser.add_argument('-o', '--output', required=True, help="Results file (.jsonl or .csv)")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help="Output format (default: from extension)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--no-resume', action='store_true',
+                        help="Rescore images that already appear in the output file")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ('csv' if args.output.lower().endswith('.csv') else 'jsonl')
+
+    # Imported here so --help works without loading TensorFlow
+    import app as skin_app
+    if not skin_app.load_models():
+        logger.error("Failed to load models")
+        return 1
+
+    done = set() if args.no_resume else read_completed(args.output, fmt)
+    if done:
+        logger.info(f"Resuming: skipping {len(done)} images already in {args.output}")
+    items = ((name, path) for name, path in iter_image_files(args.input_dir) if name not in done)
+
+    scored = 0
+    started = time.time()
+    prepared = skin_app.preprocess_pool.imap(items)
+    with ResultWriter(args.output, fmt) as writer:
+        for records in score_stream(prepared, skin_app.preprocess_pool.result, skin_app.predict_prepared,
+                                    args.batch_size):
+            writer.write(records)
+            scored += len(records)
+            logger.info(f"Scored {scored} images ({scored / max(time.time() - started, 1e-6):.1f} img/s)")
+    logger.info(f"Done: {scored} images written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,303 @@
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# A result slower (or less throughput) than the baseline by more than this fraction is a regression
+DEFAULT_TOLERANCE = 0.10
+
+DEFAULT_BATCH_SIZES = (1, 4, 8, 16)
+
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+                   'TF_NUM_INTRAOP_THREADS', 'INFERENCE_THREADS')
+
+
+def set_thread_env(env, threads):
+    for name in THREAD_ENV_VARS:
+        env[name] = str(threads)
+
+
+def synthetic_images(count, size=(1024, 768), seed=0, quality=90):
+    """Deterministic JPEG-encoded test images: smooth colour fields with skin-like tones and noise"""
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    width, height = size
+    images = []
+    for _ in range(count):
+        # Upsample a coarse random grid so the JPEG compresses like a photo rather than pure noise
+        coarse = rng.uniform(0, 1, size=(8, 8, 3))
+        base = np.array(Image.fromarray((coarse * 255).astype(np.uint8)).resize((width, height), Image.BICUBIC),
+                        dtype=np.float32)
+        tone = np.array([200, 150, 130], dtype=np.float32)
+        pixels = 0.6 * tone + 0.4 * base + rng.normal(0, 8, size=(height, width, 3))
+        buffer = io.BytesIO()
+        Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, format='JPEG', quality=quality)
+        images.append(buffer.getvalue())
+    return images
+
+
+def rss_mb():
+    """(current, peak) resident set size of this process in MB.
+
+    On Linux both come from /proc/self/status, and the peak (VmHWM) is the
+    high-water mark since the last reset_peak_rss(), so each stage gets its
+    own peak. Elsewhere only ru_maxrss is available: no current value, and
+    a peak that covers the whole process lifetime.
+    """
+    usage = {}
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name in ('VmRSS', 'VmHWM'):
+                    usage[name] = int(value.split()[0]) / 1024
+    except OSError:
+        pass
+    if 'VmHWM' in usage:
+        return usage.get('VmRSS'), usage['VmHWM']
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return None, peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def reset_peak_rss():
+    """Restart VmHWM at the current RSS (Linux only; a no-op where /proc/self/clear_refs is missing)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _latency_summary(samples):
+    ms = np.asarray(samples) * 1000
+    return {'p50_ms': float(np.percentile(ms, 50)), 'p95_ms': float(np.percentile(ms, 95)),
+            'mean_ms': float(ms.mean())}
+
+
+def time_calls(fn, args_list, warmup=1, setup=None):
+    """Call fn(*args) for every entry (after ``warmup`` untimed calls) and return per-call seconds.
+
+    ``setup()``, if given, runs before every call outside the timed region.
+    """
+    for args in args_list[:warmup]:
+        if setup:
+            setup()
+        fn(*args)
+    samples = []
+    for args in args_list:
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+class Results:
+    """Flat list of measurements, each identified by (name, threads, batch_size)"""
+
+    def __init__(self, threads):
+        self.threads = threads
+        self.records = []
+
+    def add(self, name, value, unit, better, batch_size=None):
+        self.records.append({'name': name, 'threads': self.threads, 'batch_size': batch_size,
+                             'value': round(float(value), 4), 'unit': unit, 'better': better})
+
+    def add_latency(self, name, samples, batch_size=None):
+        for stat, value in _latency_summary(samples).items():
+            self.add(f'{name}.{stat}', value, 'ms', 'lower', batch_size)
+
+    def add_rss(self, name, batch_size=None):
+        """Record RSS now and the peak since the previous checkpoint, then start a new peak"""
+        current, peak = rss_mb()
+        if current is not None:
+            self.add(f'{name}.rss', current, 'MB', 'lower', batch_size)
+        self.add(f'{name}.peak_rss', peak, 'MB', 'lower', batch_size)
+        reset_peak_rss()
+
+
+def run_suite(threads, num_images, batch_sizes, repeats, image_size, seed):
+    """Benchmark every stage in this process (thread settings must already be in the environment)"""
+    # Measure model work, not cache hits; keep the persistent cache out of it
+    os.environ['FEATURE_CACHE_DIR'] = ''
+    import app as skin_app
+
+    results = Results(threads)
+    images = synthetic_images(num_images, image_size, seed)
+    results.add_rss('startup')
+
+    # Preprocessing on the calling thread (decode, resize, CLAHE, normalization)
+    samples = time_calls(skin_app.preprocess_image, [(io.BytesIO(data),) for data in images])
+    results.add_latency('preprocess', samples)
+    prepared = [skin_app.preprocess_image(io.BytesIO(data)) for data in images]
+
+    # Batched preprocessing straight into one reused input buffer
+    from preprocessing import preprocess_batch
+    for batch_size in batch_sizes:
+        buffer = np.empty((batch_size,) + prepared[0].shape[1:], dtype=np.float32)
+        chunks = [[io.BytesIO(images[(i + j) % len(images)]) for j in range(batch_size)] for i in range(repeats)]
+        samples = time_calls(lambda chunk: preprocess_batch(chunk, out=buffer), [(chunk,) for chunk in chunks])
+        results.add('preprocess_batch.throughput', batch_size / np.median(samples), 'img/s', 'higher', batch_size)
+
+    started = time.perf_counter()
+    if not skin_app.warm_up_models():
+        raise RuntimeError("Models could not be loaded")
+    results.add('model_load', time.perf_counter() - started, 's', 'lower')
+    results.add_rss('models_loaded')
+
+    for batch_size in batch_sizes:
+        batches = [np.concatenate([prepared[(i + j) % len(prepared)] for j in range(batch_size)], axis=0)
+                   for i in range(repeats)]
+        samples = time_calls(skin_app.extract_features, [(batch,) for batch in batches])
+        results.add_latency('backbone', samples, batch_size)
+        results.add('backbone.throughput', batch_size / np.median(samples), 'img/s', 'higher', batch_size)
+
+        features = skin_app.extract_features(batches[0])
+        samples = time_calls(skin_app.classify_features, [(features,)] * repeats)
+        results.add_latency('svm', samples, batch_size)
+
+        samples = time_calls(skin_app.predict_batch, [(batch,) for batch in batches])
+        results.add('predict_batch.throughput', batch_size / np.median(samples), 'img/s', 'higher', batch_size)
+        results.add_rss('batched', batch_size)
+
+    # The full /predict route, including upload handling and template rendering
+    client = skin_app.app.test_client()
+
+    def post(data):
+        response = client.post('/predict', data={'file': (io.BytesIO(data), 'bench.jpg')},
+                               content_type='multipart/form-data')
+        if response.status_code != 200:
+            raise RuntimeError(f"/predict returned {response.status_code}")
+
+    # Every request should miss the feature cache; clearing it is not part of the measurement
+    samples = time_calls(post, [(data,) for data in images], setup=skin_app.feature_cache.clear)
+    results.add_latency('route.predict', samples)
+    results.add_rss('route')
+    return results.records
+
+
+def environment_info():
+    info = {'python': platform.python_version(), 'platform': platform.platform(),
+            'cpu_count': os.cpu_count(), 'numpy': np.__version__,
+            'backend': os.environ.get('INFERENCE_BACKEND', 'keras')}
+    try:
+        info['commit'] = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                        cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        info['commit'] = None
+    return info
+
+
+def _run_in_subprocess(args, threads):
+    """Run the suite for one thread count in a fresh interpreter, so BLAS/TF pick up the setting"""
+    env = dict(os.environ)
+    set_thread_env(env, threads)
+    fd, path = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        command = [sys.executable, os.path.abspath(__file__), 'run', '--threads', str(threads),
+                   '--images', str(args.images), '--repeats', str(args.repeats), '--seed', str(args.seed),
+                   '--image-size', str(args.image_size[0]), str(args.image_size[1]),
+                   '--batch-sizes', *map(str, args.batch_sizes), '-o', path]
+        subprocess.run(command, env=env, check=True)
+        with open(path) as f:
+            return json.load(f)['results']
+    finally:
+        os.remove(path)
+
+
+def compare(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    """Match measurements by (name, threads, batch_size); returns (rows, regressions)"""
+    def key(record):
+        return record['name'], record['threads'], record['batch_size']
+
+    base = {key(r): r for r in baseline['results']}
+    rows, regressions = [], []
+    for record in current['results']:
+        old = base.get(key(record))
+        if old is None or not old['value']:
+            continue
+        change = (record['value'] - old['value']) / old['value']
+        worse = change > tolerance if record['better'] == 'lower' else change < -tolerance
+        row = {'name': record['name'], 'threads': record['threads'], 'batch_size': record['batch_size'],
+               'baseline': old['value'], 'current': record['value'], 'unit': record['unit'],
+               'change': round(change, 4), 'regression': worse}
+        rows.append(row)
+        if worse:
+            regressions.append(row)
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the inference pipeline")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help="Measure latency, throughput and memory on synthetic images")
+    run.add_argument('-o', '--output', help="Write JSON results here (default: stdout)")
+    run.add_argument('--threads', type=int, nargs='+', default=[os.cpu_count() or 1],
+                     help="Intra-op thread counts to compare (each runs in its own process)")
+    run.add_argument('--batch-sizes', type=int, nargs='+', default=list(DEFAULT_BATCH_SIZES))
+    run.add_argument('--images', type=int, default=16, help="Number of synthetic images")
+    run.add_argument('--image-size', type=int, nargs=2, default=[1024, 768], metavar=('WIDTH', 'HEIGHT'))
+    run.add_argument('--repeats', type=int, default=10, help="Timed calls per batch size")
+    run.add_argument('--seed', type=int, default=0)
+
+    cmp = sub.add_parser('compare', help="Flag regressions against a saved baseline")
+    cmp.add_argument('baseline')
+    cmp.add_argument('current')
+    cmp.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                     help="Allowed relative slowdown before a result counts as a regression")
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        rows, regressions = compare(baseline, current, args.tolerance)
+        for row in rows:
+            flag = 'REGRESSION' if row['regression'] else 'ok'
+            logger.info(f"{flag:>10}  {row['name']} threads={row['threads']} batch={row['batch_size']}: "
+                        f"{row['baseline']} -> {row['current']} {row['unit']} ({row['change']:+.1%})")
+        logger.info(f"{len(regressions)} regressions out of {len(rows)} comparable results")
+        return 1 if regressions else 0
+
+    if len(args.threads) == 1:
+        # TensorFlow and the app read these when they are imported by run_suite
+        set_thread_env(os.environ, args.threads[0])
+        results = run_suite(args.threads[0], args.images, args.batch_sizes, args.repeats,
+                            tuple(args.image_size), args.seed)
+    else:
+        results = [record for threads in args.threads for record in _run_in_subprocess(args, threads)]
+
+    report = {'environment': environment_info(),
+              'config': {'images': args.images, 'image_size': args.image_size, 'repeats': args.repeats,
+                         'batch_sizes': args.batch_sizes, 'seed': args.seed},
+              'results': results}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+        logger.info(f"Wrote {len(results)} results to {args.output}")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,155 @@
+import logging
+import pickle
+import threading
+
+import numpy as np
+
+from preprocessing import RESNET_MEAN_BGR
+
+logger = logging.getLogger(__name__)
+
+COLOUR_BINS = 16
+GRADIENT_BINS = 8
+# Gradient magnitudes above this (in 0-255 grey levels) share the last bin
+GRADIENT_RANGE = 64.0
+
+
+def _batch_histograms(values, bins, upper):
+    """Normalized per-image histograms of an (N, P) array over [0, upper), via one bincount"""
+    n = values.shape[0]
+    idx = np.clip((values * (bins / upper)).astype(np.int64), 0, bins - 1)
+    idx += (np.arange(n) * bins)[:, None]
+    counts = np.bincount(idx.ravel(), minlength=n * bins).reshape(n, bins)
+    return counts / values.shape[1]
+
+
+def colour_texture_features(batch):
+    """Cheap descriptors from a preprocessed (N, H, W, 3) ResNet input batch.
+
+    Per-channel colour histograms, means and standard deviations, plus a
+    histogram of grey-level gradient magnitudes for texture. Everything is
+    computed from the tensor the backbone would get, so no second decode.
+    """
+    pixels = np.asarray(batch, dtype=np.float32) + RESNET_MEAN_BGR
+    n = pixels.shape[0]
+    flat = pixels.reshape(n, -1, 3)
+
+    colour = [_batch_histograms(flat[:, :, c], COLOUR_BINS, 256.0) for c in range(3)]
+    moments = [flat.mean(axis=1) / 255.0, flat.std(axis=1) / 255.0]
+
+    grey = pixels.mean(axis=3)
+    gx = np.abs(np.diff(grey, axis=2))[:, :-1, :]
+    gy = np.abs(np.diff(grey, axis=1))[:, :, :-1]
+    magnitude = np.sqrt(gx * gx + gy * gy).reshape(n, -1)
+    texture = [_batch_histograms(magnitude, GRADIENT_BINS, GRADIENT_RANGE), magnitude.mean(axis=1, keepdims=True) / 255.0]
+
+    return np.concatenate(colour + moments + texture, axis=1).astype(np.float32)
+
+
+class EarlyExitClassifier:
+    """Multinomial logistic regression on colour/texture features, scored with NumPy.
+
+    An image exits early when the top probability is at least ``threshold``
+    and beats the runner-up by ``min_margin``; everything else is escalated
+    to ResNet50 + SVM. ``classes`` are the same class indices the SVM uses.
+    """
+
+    def __init__(self, coef, intercept, classes, mean, scale, threshold=0.9, min_margin=0.0):
+        self.coef = np.asarray(coef, dtype=np.float32)
+        self.intercept = np.asarray(intercept, dtype=np.float32)
+        self.classes = np.asarray(classes)
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.scale = np.asarray(scale, dtype=np.float32)
+        self.threshold = float(threshold)
+        self.min_margin = float(min_margin)
+
+    @classmethod
+    def fit(cls, features, labels, C=1.0):
+        from sklearn.linear_model import LogisticRegression
+
+        mean = features.mean(axis=0)
+        scale = features.std(axis=0)
+        scale[scale == 0] = 1.0
+        model = LogisticRegression(C=C, max_iter=2000)
+        model.fit((features - mean) / scale, labels)
+        return cls(model.coef_, model.intercept_, model.classes_, mean, scale)
+
+    def predict_proba_features(self, features):
+        logits = ((features - self.mean) / self.scale) @ self.coef.T + self.intercept
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict_proba(self, batch):
+        return self.predict_proba_features(colour_texture_features(batch))
+
+    def decide(self, batch, threshold=None, min_margin=None):
+        """Return (classes, probabilities, exits) for a preprocessed batch"""
+        threshold = self.threshold if threshold is None else threshold
+        min_margin = self.min_margin if min_margin is None else min_margin
+        probabilities = self.predict_proba(batch)
+        top2 = np.sort(probabilities, axis=1)[:, -2:]
+        exits = (top2[:, 1] >= threshold) & (top2[:, 1] - top2[:, 0] >= min_margin)
+        return self.classes[np.argmax(probabilities, axis=1)], probabilities, exits
+
+
+def calibrate_threshold(probabilities, labels, classes, target_precision=0.97):
+    """Lowest confidence threshold whose early exits are at least target_precision correct.
+
+    Returns (threshold, exit_rate, precision); the threshold is 1.0 (never
+    exit) when no threshold reaches the target.
+    """
+    confidence = probabilities.max(axis=1)
+    correct = classes[np.argmax(probabilities, axis=1)] == labels
+    order = np.argsort(-confidence)
+    precision = np.cumsum(correct[order]) / np.arange(1, len(order) + 1)
+    passing = np.nonzero(precision >= target_precision)[0]
+    if len(passing) == 0:
+        return 1.0, 0.0, None
+    last = passing[-1]
+    return float(confidence[order][last]), float((last + 1) / len(order)), float(precision[last])
+
+
+def save_cascade(model, path):
+    with open(path, 'wb') as f:
+        pickle.dump(model, f)
+
+
+def load_cascade(path):
+    with open(path, 'rb') as f:
+        model = pickle.load(f)
+    if not isinstance(model, EarlyExitClassifier):
+        raise TypeError(f"{path} does not contain an EarlyExitClassifier")
+    return model
+
+
+class CascadeStats:
+    """Counts of early exits and of how often the cheap stage agreed with ResNet50 + SVM.
+
+    Agreement is known for escalated images (both stages ran) and for the
+    audited sample of early exits that were also sent through the full path.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.images = 0
+        self.exits = 0
+        self.agreement = {'audited': [0, 0], 'escalated': [0, 0]}
+
+    def record(self, exited, kind=None, agreed=None):
+        with self._lock:
+            self.images += 1
+            self.exits += int(exited)
+            if kind is not None:
+                self.agreement[kind][0] += int(agreed)
+                self.agreement[kind][1] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'images': self.images,
+                'early_exits': self.exits,
+                'exit_rate': self.exits / self.images if self.images else 0.0,
+                'agreement': {kind: {'compared': total, 'rate': agreed / total if total else None}
+                              for kind, (agreed, total) in self.agreement.items()},
+            }
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'diseases.json')
+
+REQUIRED_FIELDS = ('index', 'label', 'slug', 'name', 'description')
+LIST_FIELDS = ('causes', 'symptoms', 'complications', 'treatment', 'prevention', 'when_to_see_doctor')
+
+
+class CatalogError(ValueError):
+    """The disease data file is malformed or does not match the model"""
+
+
+@dataclass(frozen=True)
+class Disease:
+    index: int
+    label: str
+    slug: str
+    name: str
+    description: str
+    duration: str = ''
+    causes: tuple = ()
+    symptoms: tuple = ()
+    complications: tuple = ()
+    treatment: tuple = ()
+    prevention: tuple = ()
+    when_to_see_doctor: tuple = ()
+
+
+@dataclass(frozen=True)
+class DiseaseCatalog:
+    """Immutable, indexed view of the disease data.
+
+    ``diseases`` is ordered by model class index, so ``labels`` is the list
+    the SVM's integer classes refer to. Lookups accept a label, a slug or an
+    index (int or digit string).
+    """
+    diseases: tuple
+    version: str
+    by_label: MappingProxyType = field(repr=False, compare=False)
+    by_slug: MappingProxyType = field(repr=False, compare=False)
+
+    @classmethod
+    def from_records(cls, records, version=''):
+        diseases = []
+        for position, record in enumerate(records):
+            missing = [name for name in REQUIRED_FIELDS if name not in record]
+            if missing:
+                raise CatalogError(f"Disease #{position} is missing {', '.join(missing)}")
+            if record['index'] != position:
+                raise CatalogError(f"Disease {record['label']!r} has index {record['index']}, expected {position}")
+            unknown = set(record) - set(Disease.__dataclass_fields__)
+            if unknown:
+                raise CatalogError(f"Disease {record['label']!r} has unknown fields: {', '.join(sorted(unknown))}")
+            values = {name: tuple(value) if name in LIST_FIELDS else value for name, value in record.items()}
+            diseases.append(Disease(**values))
+
+        by_label = {disease.label: disease for disease in diseases}
+        by_slug = {disease.slug: disease for disease in diseases}
+        if len(by_label) != len(diseases) or len(by_slug) != len(diseases):
+            raise CatalogError("Disease labels and slugs must be unique")
+        return cls(tuple(diseases), version, MappingProxyType(by_label), MappingProxyType(by_slug))
+
+    @property
+    def labels(self):
+        return [disease.label for disease in self.diseases]
+
+    def __len__(self):
+        return len(self.diseases)
+
+    def __iter__(self):
+        return iter(self.diseases)
+
+    def get(self, key):
+        """Find a disease by label, slug or index; returns None if there is no match"""
+        if isinstance(key, str):
+            disease = self.by_label.get(key) or self.by_slug.get(key)
+            if disease is not None or not key.isdigit():
+                return disease
+            key = int(key)
+        try:
+            index = int(key)
+        except (TypeError, ValueError):
+            return None
+        return self.diseases[index] if 0 <= index < len(self.diseases) else None
+
+    def __getitem__(self, key):
+        disease = self.get(key)
+        if disease is None:
+            raise KeyError(key)
+        return disease
+
+    def label_for(self, model_class):
+        """Map one of the SVM's classes (an index or a label) to a disease label"""
+        return self[model_class.item() if hasattr(model_class, 'item') else model_class].label
+
+    def validate(self, model_classes):
+        """Raise CatalogError unless every model class maps to exactly one disease"""
+        classes = [c.item() if hasattr(c, 'item') else c for c in model_classes]
+        if len(classes) != len(self.diseases):
+            raise CatalogError(f"Model has {len(classes)} classes but the catalog has {len(self.diseases)} diseases")
+        for model_class in classes:
+            if isinstance(model_class, str):
+                if model_class not in self.by_label:
+                    raise CatalogError(f"Model class {model_class!r} is not a known disease label")
+            elif not 0 <= int(model_class) < len(self.diseases):
+                raise CatalogError(f"Model class {model_class} has no disease at that index")
+
+
+def load_catalog(path=DEFAULT_DATA_PATH):
+    with open(path, 'rb') as f:
+        raw = f.read()
+    try:
+        records = json.loads(raw)['diseases']
+    except (ValueError, KeyError, TypeError) as e:
+        raise CatalogError(f"Could not parse {path}: {str(e)}") from e
+    return DiseaseCatalog.from_records(records, version=hashlib.blake2b(raw, digest_size=8).hexdigest())
+
+
+class CatalogStore:
+    """Holds the current catalog and reloads it when the data file changes.
+
+    The file's mtime is checked at most every ``check_interval`` seconds. A
+    reload that fails to parse, or that no longer matches ``model_classes``,
+    is logged and the previous catalog stays in use. ``on_reload`` callbacks
+    run after each successful reload (e.g. to drop pre-rendered pages).
+    """
+
+    def __init__(self, path=DEFAULT_DATA_PATH, check_interval=5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.model_classes = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._mtime = os.path.getmtime(path)
+        self._catalog = load_catalog(path)
+        self._checked = time.monotonic()
+
+    def on_reload(self, callback):
+        self._callbacks.append(callback)
+        return callback
+
+    def set_model_classes(self, model_classes):
+        """Validate the current catalog against the model's classes and keep them for later reloads"""
+        self._catalog.validate(model_classes)
+        self.model_classes = list(model_classes)
+
+    def current(self):
+        if time.monotonic() - self._checked >= self.check_interval:
+            self._maybe_reload()
+        return self._catalog
+
+    def _maybe_reload(self):
+        with self._lock:
+            self._checked = time.monotonic()
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError as e:
+                logger.warning(f"Cannot stat disease data {self.path}: {str(e)}")
+                return
+            if mtime == self._mtime:
+                return
+            self._mtime = mtime
+            try:
+                catalog = load_catalog(self.path)
+                if self.model_classes is not None:
+                    catalog.validate(self.model_classes)
+            except (OSError, CatalogError) as e:
+                logger.error(f"Keeping the previous disease data; reload failed: {str(e)}")
+                return
+            if catalog.version == self._catalog.version:
+                return
+            self._catalog = catalog
+        logger.info(f"Reloaded disease data {self.path} (version {catalog.version})")
+        for callback in self._callbacks:
+            callback(catalog)
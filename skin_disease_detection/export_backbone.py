@@ -0,0 +1,91 @@
+import argparse
+import logging
+import sys
+
+import numpy as np
+
+from backends import BACKENDS, KerasBackend, compare_features, default_model_path, write_quantization_report
+from batch_predict import iter_image_files
+from preprocessing import IMG_SIZE, preprocess_batch, preprocess_input
+
+logger = logging.getLogger(__name__)
+
+# Exported features must match Keras closely enough that the SVM decision does not change
+PARITY_MIN_COSINE = 0.999
+
+
+def export_tflite(model, output_path):
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    with open(output_path, 'wb') as f:
+        f.write(converter.convert())
+    logger.info(f"Wrote TFLite model to {output_path}")
+
+
+def export_onnx(model, output_path):
+    import tensorflow as tf
+    try:
+        import tf2onnx
+    except ImportError:
+        logger.error("tf2onnx is not installed; skipping ONNX export (pip install tf2onnx onnxruntime)")
+        return False
+
+    spec = (tf.TensorSpec((None, IMG_SIZE[1], IMG_SIZE[0], 3), tf.float32, name='input'),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, output_path=output_path)
+    logger.info(f"Wrote ONNX model to {output_path}")
+    return True
+
+
+def parity_batch(sample_dir=None, count=8, seed=0):
+    """Sample images from sample_dir (or random pixels) run through the normal preprocessing"""
+    if sample_dir:
+        paths = [path for _, path in iter_image_files(sample_dir)][:count]
+        if paths:
+            return preprocess_batch(paths)
+        logger.warning(f"No images found in {sample_dir}, using random inputs")
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, size=(count, IMG_SIZE[1], IMG_SIZE[0], 3), dtype=np.uint8)
+    return preprocess_input(pixels.astype(np.float32))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the ResNet50 feature extractor to lighter CPU runtimes")
+    parser.add_argument('keras_model', help="Path to resnet50_base_model.h5")
+    parser.add_argument('--format', choices=['tflite', 'onnx', 'all'], default='all')
+    parser.add_argument('--samples', help="Directory of sample images for the parity check")
+    parser.add_argument('--min-cosine', type=float, default=PARITY_MIN_COSINE)
+    args = parser.parse_args(argv)
+
+    reference = KerasBackend(args.keras_model)
+    batch = parity_batch(args.samples)
+    formats = ['tflite', 'onnx'] if args.format == 'all' else [args.format]
+
+    failed = False
+    for fmt in formats:
+        output_path = default_model_path(fmt, args.keras_model)
+        if fmt == 'tflite':
+            export_tflite(reference.model, output_path)
+        elif not export_onnx(reference.model, output_path):
+            continue
+
+        try:
+            # Loaded directly: load_backend only serves TFLite files that already passed this check
+            report = compare_features(reference, BACKENDS[fmt](output_path), batch)
+        except ImportError as e:
+            logger.warning(f"Cannot load {fmt} runtime for the parity check: {str(e)}")
+            continue
+        ok = report['min_cosine'] >= args.min_cosine
+        failed = failed or not ok
+        logger.info(f"{fmt} parity vs Keras: {report} -> {'OK' if ok else 'FAILED'}")
+        if fmt == 'tflite':
+            write_quantization_report(output_path, {'mode': 'float32', 'source_model': args.keras_model,
+                                                    'min_cosine_required': args.min_cosine, 'approved': ok,
+                                                    **report})
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
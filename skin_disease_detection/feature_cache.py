@@ -0,0 +1,303 @@
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Everything the disk tier writes lives below <disk_dir>/CACHE_SUBDIR; version
+# directories are only pruned when they contain MARKER_FILE
+CACHE_SUBDIR = 'feature-cache'
+MARKER_FILE = '.feature-cache-version'
+
+
+def pixel_hash(pixels):
+    """Content hash of a decoded image (shape, dtype and raw pixel bytes)"""
+    pixels = np.ascontiguousarray(pixels)
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f"{pixels.shape}|{pixels.dtype.str}|".encode())
+    h.update(memoryview(pixels).cast('B'))
+    return h.hexdigest()
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ModelFingerprint:
+    """Version string derived from the contents of the model files and any settings that change predictions.
+
+    The files are only re-hashed when their size or mtime changes, and the
+    stat check itself runs at most once every ``check_interval`` seconds.
+    ``settings`` is a string (e.g. the TTA configuration) mixed into the hash.
+    """
+
+    def __init__(self, paths, check_interval=5.0, settings=''):
+        self.paths = list(paths)
+        self.check_interval = check_interval
+        self.settings = settings
+        self._lock = threading.Lock()
+        self._stats = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def _stat(self):
+        stats = []
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+                stats.append((path, st.st_size, st.st_mtime_ns))
+            except OSError:
+                stats.append((path, None, None))
+        return stats
+
+    def current(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and now - self._checked_at < self.check_interval:
+                return self._version
+            self._checked_at = now
+            stats = self._stat()
+            if stats != self._stats:
+                h = hashlib.blake2b(digest_size=8)
+                h.update(self.settings.encode())
+                for path, size, _ in stats:
+                    h.update((file_digest(path) if size is not None else 'missing').encode())
+                self._stats = stats
+                self._version = h.hexdigest()
+                logger.info(f"Model version is now {self._version}")
+            return self._version
+
+
+class FeatureCache:
+    """Two-tier cache of ResNet features and SVM outputs keyed by image content and model version.
+
+    The memory tier is an LRU bounded by entry count. The optional disk tier
+    stores one ``.npz`` per entry in ``<disk_dir>/feature-cache/<version>/``
+    and is trimmed (least recently used first) when it grows past
+    ``disk_max_bytes``. Each version directory holds a marker file that its
+    users touch while they write to it. Only marked directories unused for
+    ``stale_after`` seconds are pruned, so instances with other models
+    (e.g. keras and tflite deployments) can share ``disk_dir``.
+    """
+
+    def __init__(self, version_fn, max_entries=256, disk_dir=None, disk_max_bytes=512 * 1024 * 1024,
+                 stale_after=86400.0):
+        self.version_fn = version_fn
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.root = os.path.join(disk_dir, CACHE_SUBDIR) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self.stale_after = stale_after
+        self._marker_touched = 0.0
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._version = None
+        self._disk_bytes = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if disk_dir:
+            os.makedirs(self.root, exist_ok=True)
+
+    def key(self, pixels):
+        """Cache key for a decoded image under the current model version"""
+        return self.key_for_digest(pixel_hash(pixels))
+
+    def key_for_digest(self, digest):
+        """Cache key for an image whose pixel_hash was computed elsewhere (e.g. in a worker)"""
+        version = self.version_fn()
+        self._check_version(version)
+        return f"{version}-{digest}"
+
+    def _check_version(self, version):
+        with self._lock:
+            if version == self._version:
+                return
+            previous, self._version = self._version, version
+            self._memory.clear()
+            self._disk_bytes = None
+        if previous is not None:
+            logger.info(f"Model files changed ({previous} -> {version}), feature cache invalidated")
+        if self.disk_dir:
+            self._touch_marker(version, force=True)
+            self._drop_stale_versions(version)
+
+    def _touch_marker(self, version, force=False):
+        """Mark the version directory as in use (at most once a minute unless forced)"""
+        now = time.monotonic()
+        if not force and now - self._marker_touched < 60.0:
+            return
+        self._marker_touched = now
+        version_dir = os.path.join(self.root, version)
+        os.makedirs(version_dir, exist_ok=True)
+        with open(os.path.join(version_dir, MARKER_FILE), 'a'):
+            pass
+        os.utime(os.path.join(version_dir, MARKER_FILE))
+
+    def _drop_stale_versions(self, version):
+        """Remove other versions' directories, but only ours (marked) and only once nobody has used them for a while"""
+        cutoff = time.time() - self.stale_after
+        for name in os.listdir(self.root):
+            marker = os.path.join(self.root, name, MARKER_FILE)
+            try:
+                stale = name != version and os.path.getmtime(marker) < cutoff
+            except OSError:
+                continue
+            if stale:
+                logger.info(f"Removing feature cache for model version {name} (unused for {self.stale_after:.0f}s)")
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    def _disk_path(self, key):
+        version, digest = key.split('-', 1)
+        return os.path.join(self.root, version, digest[:2], digest + '.npz')
+
+    def get(self, key):
+        """Return the cached entry dict for key, or None"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        entry = self._disk_get(key) if self.disk_dir else None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._memory_put(key, entry)
+        return entry
+
+    def put(self, key, features, label, confidence, probabilities=None, views=1):
+        entry = {
+            'features': np.asarray(features, dtype=np.float16),
+            'label': label,
+            'confidence': float(confidence),
+            'probabilities': None if probabilities is None else np.asarray(probabilities, dtype=np.float32),
+            'views': int(views),
+        }
+        self._memory_put(key, entry)
+        if self.disk_dir:
+            self._disk_put(key, entry)
+
+    def _memory_put(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _disk_get(self, key):
+        path = self._disk_path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                entry = {
+                    'features': data['features'],
+                    'label': str(data['label']),
+                    'confidence': float(data['confidence']),
+                    'probabilities': data['probabilities'] if data['probabilities'].size else None,
+                    'views': int(data['views']) if 'views' in data else 1,
+                }
+            # Touch the file so eviction treats it as recently used
+            os.utime(path)
+            return entry
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable cache entry {path}: {str(e)}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+    def _disk_put(self, key, entry):
+        self._touch_marker(key.split('-', 1)[0])
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f,
+                         features=entry['features'],
+                         label=np.array(entry['label']),
+                         confidence=np.array(entry['confidence']),
+                         views=np.array(entry['views']),
+                         probabilities=entry['probabilities'] if entry['probabilities'] is not None
+                         else np.empty(0, dtype=np.float32))
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Could not write cache entry {path}: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        size = os.path.getsize(path)
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += size
+            over_limit = self._disk_bytes is None or self._disk_bytes > self.disk_max_bytes
+        if over_limit:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """Delete least recently used disk entries until the tier is under 90% of its limit"""
+        files = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith('.npz'):
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+        if total > self.disk_max_bytes:
+            target = self.disk_max_bytes * 0.9
+            for _, size, path in sorted(files):
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+        with self._lock:
+            self._disk_bytes = total
+
+    def clear(self):
+        """Drop every entry of the current model version (other versions in a shared disk_dir are left alone)"""
+        with self._lock:
+            self._memory.clear()
+            self._disk_bytes = None
+            version = self._version
+        if self.disk_dir and version is not None:
+            shutil.rmtree(os.path.join(self.root, version), ignore_errors=True)
+            self._touch_marker(version, force=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'version': self._version,
+                'memory_entries': len(self._memory),
+                'max_entries': self.max_entries,
+                'disk_dir': self.disk_dir,
+                'disk_bytes': self._disk_bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import logging
+import pickle
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+POOLING_MODES = (None, 'avg', 'max', 'avgmax')
+PROJECTIONS = (None, 'pca', 'random')
+
+
+class FeatureReducer:
+    """Shrink ResNet feature maps before the SVM: global pooling and/or a fitted linear projection.
+
+    ``version`` identifies the exact fitted transform; the SVM trained on top
+    of it records the same string so mismatched pairs are caught at load time.
+    """
+
+    def __init__(self, pooling='avg', projection=None, n_components=256, random_state=42):
+        if pooling not in POOLING_MODES:
+            raise ValueError(f"Unknown pooling mode: {pooling}")
+        if projection not in PROJECTIONS:
+            raise ValueError(f"Unknown projection: {projection}")
+        self.pooling = pooling
+        self.projection = projection
+        self.n_components = n_components
+        self.random_state = random_state
+        self.transform_ = None
+        self.version = None
+
+    def pool(self, features):
+        """Global pooling over the spatial axes of (N, H, W, C) maps; (N, D) inputs pass through"""
+        features = np.asarray(features, dtype=np.float32)
+        if features.ndim == 4 and self.pooling is not None:
+            if self.pooling == 'avg':
+                return features.mean(axis=(1, 2))
+            if self.pooling == 'max':
+                return features.max(axis=(1, 2))
+            return np.concatenate([features.mean(axis=(1, 2)), features.max(axis=(1, 2))], axis=1)
+        return features.reshape(len(features), -1)
+
+    def fit(self, features):
+        pooled = self.pool(features)
+        if self.projection == 'pca':
+            from sklearn.decomposition import PCA
+            self.transform_ = PCA(n_components=min(self.n_components, *pooled.shape),
+                                  random_state=self.random_state).fit(pooled)
+        elif self.projection == 'random':
+            from sklearn.random_projection import GaussianRandomProjection
+            self.transform_ = GaussianRandomProjection(n_components=self.n_components,
+                                                       random_state=self.random_state).fit(pooled)
+        self.version = self._compute_version(pooled.shape[1])
+        logger.info(f"Fitted feature reducer {self.describe()}")
+        return self
+
+    def transform(self, features):
+        pooled = self.pool(features)
+        if self.transform_ is not None:
+            pooled = self.transform_.transform(pooled)
+        return pooled.astype(np.float32, copy=False)
+
+    def fit_transform(self, features):
+        return self.fit(features).transform(features)
+
+    def _compute_version(self, input_dim):
+        h = hashlib.blake2b(digest_size=8)
+        h.update(json.dumps([self.pooling, self.projection, self.n_components, self.random_state,
+                             input_dim]).encode())
+        if self.transform_ is not None:
+            components = getattr(self.transform_, 'components_', None)
+            if components is not None:
+                if hasattr(components, 'toarray'):
+                    components = components.toarray()
+                h.update(np.ascontiguousarray(components, dtype=np.float32).tobytes())
+        return h.hexdigest()
+
+    def describe(self):
+        return {
+            'pooling': self.pooling,
+            'projection': self.projection,
+            'n_components': self.n_components if self.projection else None,
+            'version': self.version,
+        }
+
+
+def save_reducer(reducer, path):
+    with open(path, 'wb') as f:
+        pickle.dump(reducer, f)
+
+
+def load_reducer(path):
+    with open(path, 'rb') as f:
+        reducer = pickle.load(f)
+    if not isinstance(reducer, FeatureReducer):
+        raise TypeError(f"{path} does not contain a FeatureReducer")
+    return reducer
+
+
+def check_reducer_matches(svm_model, reducer):
+    """Raise if the SVM was trained on a different feature transform than the one loaded"""
+    expected = getattr(svm_model, 'feature_reducer_version_', None)
+    actual = reducer.version if reducer is not None else None
+    if expected != actual:
+        raise ValueError(f"SVM was trained with feature reducer {expected!r} but {actual!r} is loaded; "
+                         f"retrain with retrain_svm.py or remove the reducer file")
@@ -0,0 +1,234 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+from batch_predict import iter_chunks
+from feature_cache import file_digest
+from preprocessing import FAST_DECODE, IMG_SIZE, decode_image, prepare_batch
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_ROWS = 1024
+STORE_FORMAT = 1
+
+
+class FeatureStoreMismatch(ValueError):
+    """The store on disk was built with a different backbone or preprocessing"""
+
+
+def store_version(backend_name, backbone_path):
+    """Identifies everything that changes the stored features: backbone weights, runtime and preprocessing"""
+    spec = f"{STORE_FORMAT}|{backend_name}|{file_digest(backbone_path)}|{IMG_SIZE}|fast_decode={FAST_DECODE}"
+    return hashlib.blake2b(spec.encode(), digest_size=12).hexdigest()
+
+
+def _write_json(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+class FeatureStore:
+    """Backbone features for a training set, extracted once and kept on disk.
+
+    Rows are float16 (the same cast the app applies before the SVM) and live
+    in fixed-size ``.npy`` chunks that are memory-mapped on read, so fitting
+    on tens of thousands of images never loads more than the rows asked for.
+    Rows are keyed by a hash of the image file; a path whose size and mtime
+    are unchanged is not even re-hashed, and renamed or duplicated files
+    reuse the existing row.
+    """
+
+    def __init__(self, root, version, chunk_rows=DEFAULT_CHUNK_ROWS):
+        self.root = root
+        self.version = version
+        self.chunk_rows = chunk_rows
+        self.chunk_dir = os.path.join(root, 'chunks')
+        os.makedirs(self.chunk_dir, exist_ok=True)
+
+        manifest = self._read_json('manifest.json')
+        if manifest and manifest['version'] != version:
+            raise FeatureStoreMismatch(f"{root} was built with a different backbone or preprocessing "
+                                       f"({manifest['version']} != {version}); use a new directory")
+        manifest = manifest or {'version': version, 'feature_shape': None, 'chunks': []}
+        index = self._read_json('index.json') or {'rows': {}, 'files': {}}
+
+        self.feature_shape = manifest['feature_shape']
+        self.chunks = manifest['chunks']
+        self.rows = index['rows']
+        self.files = index['files']
+        self._pending_keys, self._pending = [], []
+        self._pending_set = set()
+        self._mapped = {}
+
+    def _read_json(self, name):
+        path = os.path.join(self.root, name)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, key):
+        return key in self.rows or key in self._pending_set
+
+    def key_for(self, path):
+        """Content key of an image file, re-hashing only when its size or mtime changed"""
+        stat = os.stat(path)
+        known = self.files.get(path)
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known[2]
+        key = file_digest(path)
+        self.files[path] = [stat.st_size, stat.st_mtime_ns, key]
+        return key
+
+    def add(self, keys, features):
+        """Queue rows for (keys, features[i]); a chunk is written whenever chunk_rows are pending"""
+        features = np.asarray(features)
+        shape = list(features.shape[1:])
+        if self.feature_shape is None:
+            self.feature_shape = shape
+        elif shape != self.feature_shape:
+            raise ValueError(f"Feature shape {shape} does not match the store's {self.feature_shape}")
+        for key, row in zip(keys, features.reshape(len(features), -1)):
+            if key not in self:
+                self._pending_keys.append(key)
+                self._pending_set.add(key)
+                self._pending.append(row.astype(np.float16))
+        while len(self._pending) >= self.chunk_rows:
+            self._write_chunk(self.chunk_rows)
+
+    def _write_chunk(self, count):
+        chunk_id = len(self.chunks)
+        name = f'chunk-{chunk_id:05d}.npy'
+        np.save(os.path.join(self.chunk_dir, name), np.stack(self._pending[:count]))
+        for row, key in enumerate(self._pending_keys[:count]):
+            self.rows[key] = [chunk_id, row]
+        self.chunks.append({'file': name, 'rows': count})
+        self._pending_set.difference_update(self._pending_keys[:count])
+        del self._pending[:count], self._pending_keys[:count]
+        # Record the chunk right away, so an interrupted extraction keeps every chunk written so far
+        self._write_index()
+
+    def flush(self):
+        """Write any pending rows and the index (chunks first, so the index never points at missing data)"""
+        if self._pending:
+            self._write_chunk(len(self._pending))
+        else:
+            self._write_index()
+
+    def _write_index(self):
+        # Manifest before index, so no row is ever indexed into a chunk the manifest does not list
+        _write_json(os.path.join(self.root, 'manifest.json'),
+                    {'version': self.version, 'feature_shape': self.feature_shape, 'chunks': self.chunks,
+                     'updated': time.time()})
+        _write_json(os.path.join(self.root, 'index.json'), {'rows': self.rows, 'files': self.files})
+
+    def _chunk(self, chunk_id):
+        mapped = self._mapped.get(chunk_id)
+        if mapped is None:
+            path = os.path.join(self.chunk_dir, self.chunks[chunk_id]['file'])
+            mapped = self._mapped[chunk_id] = np.load(path, mmap_mode='r')
+        return mapped
+
+    def get(self, keys):
+        """Stack the stored rows for keys, in order, reading each chunk once"""
+        keys = list(keys)
+        out = np.empty((len(keys), int(np.prod(self.feature_shape))), dtype=np.float16)
+        by_chunk = {}
+        for i, key in enumerate(keys):
+            chunk_id, row = self.rows[key]
+            by_chunk.setdefault(chunk_id, ([], []))
+            by_chunk[chunk_id][0].append(i)
+            by_chunk[chunk_id][1].append(row)
+        for chunk_id, (positions, rows) in by_chunk.items():
+            order = np.argsort(rows)
+            out[np.asarray(positions)[order]] = self._chunk(chunk_id)[np.asarray(rows)[order]]
+        return out
+
+    def iter_batches(self, keys, batch_size=4096):
+        """Yield stored features for keys in batches, reshaped to the backbone's output shape"""
+        for chunk in iter_chunks(keys, batch_size):
+            yield self.get(chunk).reshape([len(chunk)] + self.feature_shape)
+
+    def stats(self):
+        size = sum(os.path.getsize(os.path.join(self.chunk_dir, c['file'])) for c in self.chunks)
+        return {'images': len(self.rows), 'files': len(self.files), 'chunks': len(self.chunks),
+                'feature_shape': self.feature_shape, 'bytes': size}
+
+
+def update_store(store, load_backend_fn, items, batch_size=32):
+    """Make sure every (path, label) item has features in the store; returns [(key, label)] for the usable ones.
+
+    Only images whose content is not in the store yet go through the
+    backbone, using the same decode/CLAHE/normalization as serving.
+    ``load_backend_fn()`` is only called when there is something to extract.
+    """
+    keyed, missing = [], []
+    queued = set()
+    for path, label in items:
+        try:
+            key = store.key_for(path)
+        except OSError as e:
+            logger.warning(f"Skipping {path}: {str(e)}")
+            continue
+        keyed.append((path, key, label))
+        if key not in store and key not in queued:
+            queued.add(key)
+            missing.append((path, key))
+    logger.info(f"{len(keyed)} images, {len(missing)} need feature extraction")
+
+    failed = set()
+    backend = load_backend_fn() if missing else None
+    buffer = np.empty((batch_size, IMG_SIZE[1], IMG_SIZE[0], 3), dtype=np.float32)
+    started = time.time()
+    for done, chunk in enumerate(iter_chunks(missing, batch_size), 1):
+        images, keys = [], []
+        for path, key in chunk:
+            try:
+                images.append(decode_image(path))
+                keys.append(key)
+            except Exception as e:
+                logger.warning(f"Skipping {path}: {str(e)}")
+                failed.add(key)
+        if images:
+            store.add(keys, backend.predict(prepare_batch(images, out=buffer)))
+        extracted = min(done * batch_size, len(missing))
+        logger.info(f"Extracted {extracted}/{len(missing)} ({extracted / max(time.time() - started, 1e-6):.1f} img/s)")
+    store.flush()
+    return [(key, label) for _, key, label in keyed if key not in failed]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract backbone features for a dataset into an on-disk store")
+    parser.add_argument('dataset_dir', help="Dataset with one sub-directory per category")
+    parser.add_argument('--store', required=True, help="Feature store directory")
+    parser.add_argument('--backbone', required=True, help="Feature extractor model path (.h5/.tflite/.onnx)")
+    parser.add_argument('--backend', default='keras', help="Runtime for the backbone (keras, tflite, onnx)")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    from backends import load_backend
+    from batch_predict import iter_labeled_images
+    from disease_catalog import load_catalog
+
+    store = FeatureStore(args.store, store_version(args.backend, args.backbone), args.chunk_rows)
+    update_store(store, lambda: load_backend(args.backend, args.backbone),
+                 iter_labeled_images(args.dataset_dir, load_catalog().labels), args.batch_size)
+    logger.info(f"Feature store {args.store}: {store.stats()}")
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,184 @@
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+import numpy as np
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (inclusive) for the queue depth and queue wait histograms
+QUEUE_DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+QUEUE_WAIT_MS_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 500, 1000)
+
+_STOP = object()
+
+
+def histogram_bucket(value, bounds):
+    """Return the label of the first histogram bucket that holds value"""
+    for bound in bounds:
+        if value <= bound:
+            return str(bound)
+    return '+Inf'
+
+
+class MicroBatcher:
+    """Collect single-image requests into batches and run them through one model call.
+
+    Requests that arrive within ``max_wait_ms`` of the first queued request are
+    grouped (up to ``max_batch_size``) and handed to ``batch_fn`` as one stacked
+    array. ``batch_fn`` must return one result per input row, in order. If a
+    batch fails, its requests are retried one at a time so only the ones that
+    fail on their own get the exception.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=8, max_wait_ms=10.0, name='inference'):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.batch_fn = batch_fn
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait = max(float(max_wait_ms), 0.0) / 1000.0
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+        self._batch_sizes = Counter()
+        self._queue_depths = Counter()
+        self._queue_waits = Counter()
+        self._requests = 0
+        self._batches = 0
+        self._errors = 0
+
+    def start(self):
+        """Start the scheduler thread (safe to call more than once)"""
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True)
+            self._thread.start()
+            logger.info(f"Micro-batcher started (max_batch_size={self.max_batch_size}, "
+                        f"max_wait_ms={self.max_wait * 1000:.1f})")
+
+    def stop(self, timeout=None):
+        """Stop the scheduler thread after the queued requests are served"""
+        with self._start_lock:
+            if self._thread is None:
+                return
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, processed_img):
+        """Queue one preprocessed image of shape (1, H, W, C) and return a Future"""
+        self.start()
+        future = Future()
+        self._queue.put((processed_img, future, time.monotonic(), metrics.current_traces()))
+        return future
+
+    def predict(self, processed_img, timeout=None):
+        """Blocking helper: submit one image and wait for its result"""
+        return self.submit(processed_img).result(timeout)
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        """Snapshot of the scheduler counters and histograms"""
+        with self._stats_lock:
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'queue_depth': self._queue.qsize(),
+                'requests': self._requests,
+                'batches': self._batches,
+                'errors': self._errors,
+                'mean_batch_size': (self._requests / self._batches) if self._batches else 0.0,
+                'batch_size_histogram': {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                'queue_depth_histogram': dict(self._queue_depths),
+                'queue_wait_ms_histogram': dict(self._queue_waits),
+            }
+
+    def _collect(self, first):
+        """Gather more requests until the batch is full or the wait window closes"""
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Put the sentinel back so the loop exits after this batch
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = self._collect(first)
+            self._process(batch)
+
+    def _process(self, batch):
+        started = time.monotonic()
+        depth = self._queue.qsize()
+        futures = [future for _, future, _, _ in batch]
+
+        with self._stats_lock:
+            self._requests += len(batch)
+            self._batches += 1
+            self._batch_sizes[len(batch)] += 1
+            self._queue_depths[histogram_bucket(depth, QUEUE_DEPTH_BUCKETS)] += 1
+            for _, _, enqueued, _ in batch:
+                wait_ms = (started - enqueued) * 1000
+                self._queue_waits[histogram_bucket(wait_ms, QUEUE_WAIT_MS_BUCKETS)] += 1
+
+        try:
+            results = self._call(batch)
+        except Exception as e:
+            logger.error(f"Batched inference failed: {str(e)}")
+            with self._stats_lock:
+                self._errors += 1
+            if len(batch) == 1:
+                futures[0].set_exception(e)
+                return
+            # Retry one by one so a single bad input only fails its own request
+            for item in batch:
+                self._process_alone(item)
+            return
+
+        for future, result in zip(futures, results):
+            future.set_result(result)
+
+    def _process_alone(self, item):
+        future = item[1]
+        try:
+            result = self._call([item])[0]
+        except Exception as e:
+            logger.error(f"Inference failed: {str(e)}")
+            with self._stats_lock:
+                self._errors += 1
+            future.set_exception(e)
+            return
+        future.set_result(result)
+
+    def _call(self, batch):
+        """Run batch_fn on the stacked inputs; returns one result per item"""
+        inputs = np.concatenate([img for img, _, _, _ in batch], axis=0)
+        # Every sampled request in the batch gets the shared batch stages in its trace
+        with metrics.traces(trace for _, _, _, item_traces in batch for trace in item_traces):
+            results = self.batch_fn(inputs)
+        if len(results) != len(batch):
+            raise RuntimeError(f"Batch function returned {len(results)} results for {len(batch)} inputs")
+        return results
@@ -0,0 +1,296 @@
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+FINISHED = (DONE, FAILED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    inputs TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    expires REAL,
+    attempt TEXT,
+    heartbeat REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+"""
+
+
+class JobQueue:
+    """Prediction jobs kept in a local SQLite file, run by a pool of worker threads.
+
+    ``submit`` copies the uploads into a per-job directory and records a
+    queued row; workers claim rows in submission order with a single UPDATE,
+    so several server processes can share one database without a broker.
+    ``handler(paths)`` is called with the saved file paths and must return
+    something JSON-serialisable. Finished jobs are deleted ``ttl`` seconds
+    after they finished. While a job runs, its worker renews a lease every
+    few seconds. A job whose lease was not renewed for ``lease`` seconds
+    (its worker crashed) is requeued. Every claim gets its own attempt token,
+    and only the attempt holding the current token can finish the job or
+    delete its files.
+    """
+
+    def __init__(self, db_path, handler, workers=2, ttl=3600.0, lease=600.0, poll_interval=0.5):
+        self.db_path = db_path
+        self.files_dir = os.path.join(os.path.dirname(os.path.abspath(db_path)), 'files')
+        self.handler = handler
+        self.workers = workers
+        self.ttl = ttl
+        self.lease = lease
+        self.poll_interval = poll_interval
+
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._pid = None
+        # job_id -> attempt token for the jobs this process is running, renewed by the heartbeat thread
+        self._running = {}
+        self._running_lock = threading.Lock()
+
+        os.makedirs(self.files_dir, exist_ok=True)
+        with self._connect() as conn:
+            self._migrate(conn)
+            conn.executescript(SCHEMA)
+
+    @staticmethod
+    def _migrate(conn):
+        """Rebuild a jobs table from before attempt tokens (its ``expires`` was NOT NULL and set at submit)"""
+        columns = [row['name'] for row in conn.execute('PRAGMA table_info(jobs)')]
+        if not columns or 'attempt' in columns:
+            return
+        conn.executescript("""
+            BEGIN;
+            ALTER TABLE jobs RENAME TO jobs_old;
+            DROP INDEX IF EXISTS jobs_status;
+        """ + SCHEMA + """
+            INSERT INTO jobs (id, status, inputs, result, error, created, started, finished, expires)
+                SELECT id, status, inputs, result, error, created, started, finished,
+                       CASE WHEN status IN ('done', 'failed') THEN expires END FROM jobs_old;
+            DROP TABLE jobs_old;
+            COMMIT;
+        """)
+        logger.info("Migrated the job table to attempt tokens and heartbeats")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @property
+    def _conn(self):
+        # One connection per thread (and per process, since forked workers must not reuse the parent's)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._local.conn = self._connect()
+            self._local.pid = os.getpid()
+        return conn
+
+    def start(self):
+        """Start the worker threads in this process (safe to call more than once)"""
+        with self._start_lock:
+            if self._pid == os.getpid() and any(t.is_alive() for t in self._threads):
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._threads = [threading.Thread(target=self._run, name=f'job-worker-{i}', daemon=True)
+                             for i in range(self.workers)]
+            self._threads.append(threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True))
+            for thread in self._threads:
+                thread.start()
+            logger.info(f"Job queue started with {self.workers} workers ({self.db_path})")
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, files):
+        """Save a list of (filename, readable stream) pairs and queue them as one job; returns the job id"""
+        self.start()
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.files_dir, job_id)
+        os.makedirs(job_dir)
+        inputs = []
+        try:
+            for i, (name, stream) in enumerate(files):
+                path = os.path.join(job_dir, f'{i:05d}.img')
+                with open(path, 'wb') as f:
+                    shutil.copyfileobj(stream, f)
+                inputs.append({'name': name, 'path': path})
+            now = time.time()
+            self._conn.execute('INSERT INTO jobs (id, status, inputs, created) VALUES (?, ?, ?, ?)',
+                               (job_id, QUEUED, json.dumps(inputs), now))
+        except Exception:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        """Return the job as a dict, or None if it does not exist (or has finished and expired)"""
+        row = self._conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None or (row['expires'] is not None and row['expires'] < time.time()):
+            return None
+        job = {
+            'id': row['id'],
+            'status': row['status'],
+            'files': [item['name'] for item in json.loads(row['inputs'])],
+            'created': row['created'],
+            'started': row['started'],
+            'finished': row['finished'],
+            'expires': row['expires'],
+        }
+        if row['status'] == DONE:
+            job['result'] = json.loads(row['result'])
+        elif row['status'] == FAILED:
+            job['error'] = row['error']
+        else:
+            job['position'] = self._position(row)
+        return job
+
+    def _position(self, row):
+        if row['status'] != QUEUED:
+            return 0
+        return self._conn.execute('SELECT COUNT(*) FROM jobs WHERE status = ? AND created < ?',
+                                  (QUEUED, row['created'])).fetchone()[0]
+
+    def wait(self, job_id, timeout=None):
+        """Poll until the job has finished; returns the job dict (or None if it disappeared)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job['status'] in FINISHED:
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return job
+            time.sleep(self.poll_interval)
+
+    def _claim(self):
+        """Atomically move the oldest queued job to running; returns (id, attempt, inputs) or None"""
+        conn = self._conn
+        attempt = uuid.uuid4().hex
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT id, inputs FROM jobs WHERE status = ? ORDER BY created LIMIT 1',
+                               (QUEUED,)).fetchone()
+            if row is not None:
+                now = time.time()
+                conn.execute('UPDATE jobs SET status = ?, started = ?, attempt = ?, heartbeat = ? WHERE id = ?',
+                             (RUNNING, now, attempt, now, row['id']))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return None if row is None else (row['id'], attempt, json.loads(row['inputs']))
+
+    def _finish(self, job_id, attempt, result=None, error=None):
+        """Record the outcome if this attempt still owns the job; returns False if it was requeued meanwhile"""
+        now = time.time()
+        return self._conn.execute(
+            'UPDATE jobs SET status = ?, result = ?, error = ?, finished = ?, expires = ? '
+            'WHERE id = ? AND status = ? AND attempt = ?',
+            (FAILED if error is not None else DONE, None if result is None else json.dumps(result), error,
+             now, now + self.ttl, job_id, RUNNING, attempt)).rowcount == 1
+
+    def _heartbeat(self):
+        """Renew the lease of every job this process is running"""
+        interval = max(0.05, min(self.lease / 3, 30.0))
+        while not self._stop.wait(interval):
+            with self._running_lock:
+                running = list(self._running.items())
+            if not running:
+                continue
+            try:
+                self._conn.executemany('UPDATE jobs SET heartbeat = ? WHERE id = ? AND attempt = ?',
+                                       [(time.time(), job_id, attempt) for job_id, attempt in running])
+            except sqlite3.Error as e:
+                logger.warning(f"Could not renew job leases: {str(e)}")
+
+    def _run(self):
+        last_sweep = 0.0
+        while not self._stop.is_set():
+            if time.monotonic() - last_sweep > self.poll_interval * 20:
+                try:
+                    self.sweep()
+                except sqlite3.Error as e:
+                    logger.warning(f"Job sweep failed: {str(e)}")
+                last_sweep = time.monotonic()
+            try:
+                claimed = self._claim()
+            except sqlite3.Error as e:
+                logger.warning(f"Could not claim a job: {str(e)}")
+                claimed = None
+            if claimed is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            job_id, attempt, inputs = claimed
+            with self._running_lock:
+                self._running[job_id] = attempt
+            started = time.perf_counter()
+            try:
+                try:
+                    result = self.handler([(item['name'], item['path']) for item in inputs])
+                    owned = self._finish(job_id, attempt, result=result)
+                    logger.info(f"Job {job_id} finished in {time.perf_counter() - started:.2f}s")
+                except Exception as e:
+                    logger.error(f"Job {job_id} failed: {str(e)}")
+                    owned = self._finish(job_id, attempt, error=str(e))
+            except sqlite3.Error as e:
+                logger.warning(f"Could not record the result of job {job_id}: {str(e)}")
+                owned = False
+            finally:
+                with self._running_lock:
+                    self._running.pop(job_id, None)
+            if owned:
+                # The uploads are only needed while the job runs
+                shutil.rmtree(os.path.join(self.files_dir, job_id), ignore_errors=True)
+            else:
+                logger.warning(f"Job {job_id} was requeued while this attempt ran; its result was discarded")
+
+    def sweep(self):
+        """Delete finished jobs past their TTL and requeue running jobs whose lease was not renewed"""
+        now = time.time()
+        conn = self._conn
+        expired = [row['id'] for row in conn.execute('SELECT id FROM jobs WHERE status IN (?, ?) AND expires < ?',
+                                                     FINISHED + (now,))]
+        if expired:
+            conn.executemany('DELETE FROM jobs WHERE id = ?', [(job_id,) for job_id in expired])
+            for job_id in expired:
+                shutil.rmtree(os.path.join(self.files_dir, job_id), ignore_errors=True)
+            logger.info(f"Evicted {len(expired)} expired jobs")
+        requeued = conn.execute('UPDATE jobs SET status = ?, started = NULL, attempt = NULL, heartbeat = NULL '
+                                'WHERE status = ? AND heartbeat < ?',
+                                (QUEUED, RUNNING, now - self.lease)).rowcount
+        if requeued:
+            logger.warning(f"Requeued {requeued} jobs whose worker stopped renewing its lease for {self.lease}s")
+
+    def stats(self):
+        counts = dict(self._conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+        return {
+            'workers': self.workers,
+            'ttl_seconds': self.ttl,
+            'jobs': {status: counts.get(status, 0) for status in (QUEUED, RUNNING, DONE, FAILED)},
+        }
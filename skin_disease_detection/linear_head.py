@@ -0,0 +1,117 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+KERNEL_MAPS = (None, 'rff', 'nystroem')
+
+
+class LinearHead:
+    """Multinomial logistic regression on ResNet features, optionally behind an approximate RBF kernel map.
+
+    'rff' uses random Fourier features and 'nystroem' a Nyström embedding
+    on ``n_components`` landmarks. Either way, scoring is a fixed number of
+    matmuls whose cost does not grow with the training set, unlike a kernel
+    SVM's support vectors. The fitted arrays are copied out of sklearn, so
+    scoring only needs NumPy. It exposes ``classes_``, ``predict`` and
+    ``predict_proba`` like the SVC pickle it replaces.
+    """
+
+    def __init__(self, kernel_map=None, n_components=1024, gamma=None, C=1.0, random_state=42):
+        if kernel_map not in KERNEL_MAPS:
+            raise ValueError(f"Unknown kernel map: {kernel_map}")
+        self.kernel_map = kernel_map
+        self.n_components = n_components
+        self.gamma = gamma
+        self.C = C
+        self.random_state = random_state
+
+    def fit(self, features, labels):
+        from sklearn.linear_model import LogisticRegression
+
+        X = np.asarray(features, dtype=np.float32)
+        self.mean_ = X.mean(axis=0)
+        self.scale_ = X.std(axis=0)
+        self.scale_[self.scale_ == 0] = 1.0
+        X = (X - self.mean_) / self.scale_
+        # Standardized features have unit variance, so this matches SVC's gamma='scale'
+        self.gamma_ = float(self.gamma or 1.0 / X.shape[1])
+
+        if self.kernel_map == 'rff':
+            from sklearn.kernel_approximation import RBFSampler
+            sampler = RBFSampler(gamma=self.gamma_, n_components=self.n_components,
+                                 random_state=self.random_state).fit(X)
+            self.weights_ = sampler.random_weights_.astype(np.float32)
+            self.offset_ = sampler.random_offset_.astype(np.float32)
+        elif self.kernel_map == 'nystroem':
+            from sklearn.kernel_approximation import Nystroem
+            nystroem = Nystroem(kernel='rbf', gamma=self.gamma_, n_components=min(self.n_components, len(X)),
+                                random_state=self.random_state).fit(X)
+            self.landmarks_ = nystroem.components_.astype(np.float32)
+            self.landmark_sq_norms_ = np.einsum('ij,ij->i', self.landmarks_, self.landmarks_)
+            self.normalization_ = np.ascontiguousarray(nystroem.normalization_.T, dtype=np.float32)
+
+        model = LogisticRegression(C=self.C, max_iter=2000)
+        model.fit(self._map(X), labels)
+        self.classes_ = model.classes_
+        coef, intercept = model.coef_, model.intercept_
+        if len(self.classes_) == 2:
+            # Binary fits have one row; softmax over [0, z] gives the same sigmoid
+            coef, intercept = np.vstack([np.zeros_like(coef), coef]), np.concatenate([[0.0], intercept])
+        self.coef_ = np.ascontiguousarray(coef.T, dtype=np.float32)
+        self.intercept_ = np.asarray(intercept, dtype=np.float32)
+        return self
+
+    def _map(self, X):
+        if self.kernel_map == 'rff':
+            Z = X @ self.weights_
+            Z += self.offset_
+            np.cos(Z, out=Z)
+            Z *= np.sqrt(2.0 / self.weights_.shape[1])
+            return Z
+        if self.kernel_map == 'nystroem':
+            sq_dist = np.einsum('ij,ij->i', X, X)[:, None] + self.landmark_sq_norms_[None, :] - 2.0 * (X @ self.landmarks_.T)
+            np.maximum(sq_dist, 0.0, out=sq_dist)
+            return np.exp(-self.gamma_ * sq_dist, out=sq_dist) @ self.normalization_
+        return X
+
+    def decision_function(self, features):
+        X = (np.asarray(features, dtype=np.float32).reshape(len(features), -1) - self.mean_) / self.scale_
+        return self._map(X) @ self.coef_ + self.intercept_
+
+    def predict_proba(self, features):
+        logits = self.decision_function(features)
+        logits -= logits.max(axis=1, keepdims=True)
+        np.exp(logits, out=logits)
+        return logits / logits.sum(axis=1, keepdims=True)
+
+    def predict(self, features):
+        return self.classes_[np.argmax(self.decision_function(features), axis=1)]
+
+    def scorer(self):
+        """Scorer for the app's fast path (same contract as FastSVMScorer.predict)"""
+        return HeadScorer(self)
+
+    @property
+    def n_parameters(self):
+        arrays = [self.coef_, getattr(self, 'weights_', None), getattr(self, 'landmarks_', None),
+                  getattr(self, 'normalization_', None)]
+        return int(sum(a.size for a in arrays if a is not None))
+
+    def describe(self):
+        return {'kernel_map': self.kernel_map or 'linear', 'input_dim': len(self.mean_),
+                'mapped_dim': self.coef_.shape[0], 'gamma': self.gamma_, 'C': self.C,
+                'parameters': self.n_parameters}
+
+
+class HeadScorer:
+    """Returns (labels, probabilities) from one pass over the head, like FastSVMScorer"""
+    has_probabilities = True
+
+    def __init__(self, head):
+        self.head = head
+
+    def predict(self, X):
+        probabilities = self.head.predict_proba(X)
+        return self.head.classes_[np.argmax(probabilities, axis=1)], probabilities
@@ -0,0 +1,228 @@
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Bucket upper bounds in seconds, from sub-millisecond decodes up to slow batches
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Fraction of requests that get a detailed per-stage trace in the log (0 disables tracing)
+TRACE_SAMPLE_RATE = float(os.environ.get('METRICS_TRACE_SAMPLE_RATE', 0.0))
+
+_registry = []
+_registry_lock = threading.Lock()
+# Traces of the requests whose work is running in this context. Thread pools that
+# run request work copy the context (see run_in_context); the micro-batcher
+# attaches the traces of every request in a batch while it runs that batch.
+_traces = contextvars.ContextVar('traces', default=())
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for suffix, labels, extra, value in self._samples():
+            lines.append(f'{self.name}{suffix}{_format_labels(self.labelnames, labels, extra)} {_format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            return [('_total', key, (), value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    """Gauge set explicitly, or read from ``fn()`` at scrape time"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), fn=None):
+        super().__init__(name, documentation, labelnames)
+        self.fn = fn
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _samples(self):
+        if self.fn is not None:
+            try:
+                return [('', (), (), self.fn())]
+            except Exception as e:
+                logger.warning(f"Could not read gauge {self.name}: {str(e)}")
+                return []
+        with self._lock:
+            return [('', key, (), value) for key, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    samples.append(('_bucket', key, (('le', _format_value(bound)),), cumulative))
+                samples.append(('_sum', key, (), total))
+                samples.append(('_count', key, (), cumulative))
+        return samples
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format"""
+    with _registry_lock:
+        metrics = list(_registry)
+    return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+STAGE_SECONDS = Histogram('skin_stage_seconds',
+                          "Time spent in each prediction stage", ['stage'])
+REQUEST_SECONDS = Histogram('skin_request_seconds',
+                            "HTTP request latency by endpoint", ['endpoint'])
+REQUESTS = Counter('skin_requests',
+                   "HTTP requests by endpoint and status code", ['endpoint', 'status'])
+CACHE_LOOKUPS = Counter('skin_feature_cache_lookups',
+                        "Feature cache lookups by result", ['result'])
+PREDICTION_ERRORS = Counter('skin_prediction_errors',
+                            "Predictions that raised, by stage", ['stage'])
+FALLBACK_CONFIDENCE = Counter('skin_fallback_confidence',
+                              "Predictions that reported the fixed 90% confidence, by reason", ['reason'])
+PREDICTIONS = Counter('skin_predictions',
+                      "Predicted labels", ['label'])
+TTA_PREDICTIONS = Counter('skin_tta_predictions',
+                          "Predictions that were re-scored with test-time augmentation")
+CASCADE_DECISIONS = Counter('skin_cascade_decisions',
+                            "Early-exit cascade outcomes (exit, audit or escalate)", ['outcome'])
+MODEL_LOAD_SECONDS = Gauge('skin_model_load_seconds',
+                           "Time taken to load each model at startup", ['model'])
+
+
+def observe_stage(stage, seconds):
+    """Record one stage duration in the histogram and in the current traces, if any"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    for trace in _traces.get():
+        trace['stages'].append((stage, seconds))
+
+
+def observe_stages(timings):
+    """Record a {stage: seconds} dict (e.g. returned from a preprocessing worker process)"""
+    for stage, seconds in timings.items():
+        observe_stage(stage, seconds)
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as one prediction stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - started)
+
+
+def current_traces():
+    """The traces active in this context, to hand to work that runs on another thread"""
+    return _traces.get()
+
+
+@contextmanager
+def traces(active):
+    """Attribute the stages observed in the enclosed block to ``active`` traces (e.g. everyone in a batch)"""
+    token = _traces.set(tuple(active))
+    try:
+        yield
+    finally:
+        _traces.reset(token)
+
+
+def run_in_context(fn):
+    """Wrap fn to run in a copy of the caller's context, so a pool thread records into the caller's trace"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def start_trace(name, sample_rate=None):
+    """Begin a per-stage trace in this context for a sampled fraction of calls; returns True if sampled"""
+    rate = TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+    if rate <= 0 or random.random() >= rate:
+        _traces.set(())
+        return False
+    _traces.set(({'name': name, 'started': time.perf_counter(), 'stages': []},))
+    return True
+
+
+def finish_trace(**fields):
+    """Log and clear the current trace; returns it (or None when this call was not sampled)"""
+    active = _traces.get()
+    _traces.set(())
+    if not active:
+        return None
+    trace = active[0]
+    trace['total'] = time.perf_counter() - trace['started']
+    trace.update(fields)
+    stages = ' '.join(f"{stage}={seconds * 1000:.2f}ms" for stage, seconds in trace['stages'])
+    extra = ' '.join(f"{key}={value}" for key, value in fields.items())
+    logger.info(f"Trace {trace['name']} {trace['total'] * 1000:.2f}ms: {stages} {extra}".rstrip())
+    return trace
@@ -0,0 +1,241 @@
+import argparse
+import hashlib
+import itertools
+import json
+import logging
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from disease_catalog import load_catalog
+from feature_reduction import save_reducer
+from retrain_svm import add_dataset_arguments, load_dataset
+from svm_scorer import calibrate_holdout
+
+logger = logging.getLogger(__name__)
+
+# Training split shared by the search workers, set once per process by _init_worker
+_train = {}
+
+
+def _parse_gamma(value):
+    return value if value in ('scale', 'auto') else float(value)
+
+
+def grid_candidates(kernels, Cs, gammas):
+    """Every kernel/C/gamma combination (gamma is irrelevant for the linear kernel)"""
+    candidates = []
+    for kernel, C in itertools.product(kernels, Cs):
+        for gamma in (['scale'] if kernel == 'linear' else gammas):
+            candidates.append({'kernel': kernel, 'C': C, 'gamma': gamma})
+    return candidates
+
+
+def random_candidates(count, kernels, C_range, gamma_range, seed=42):
+    """``count`` configurations with C and gamma drawn log-uniformly from their ranges"""
+    rng = np.random.default_rng(seed)
+    candidates = []
+    for _ in range(count):
+        kernel = str(rng.choice(kernels))
+        gamma = 'scale' if kernel == 'linear' else float(10 ** rng.uniform(*np.log10(gamma_range)))
+        candidates.append({'kernel': kernel, 'C': float(10 ** rng.uniform(*np.log10(C_range))), 'gamma': gamma})
+    return candidates
+
+
+def stratified_folds(labels, folds, seed=42):
+    """(train_idx, val_idx) pairs with every class spread evenly over the folds"""
+    rng = np.random.default_rng(seed)
+    assignment = np.empty(len(labels), dtype=np.int64)
+    for label in np.unique(labels):
+        idx = np.flatnonzero(labels == label)
+        assignment[rng.permutation(idx)] = np.arange(len(idx)) % folds
+    return [(np.flatnonzero(assignment != k), np.flatnonzero(assignment == k)) for k in range(folds)]
+
+
+def stratified_split(labels, fractions, seed=42):
+    """Split indices into len(fractions) + 1 parts, per class; the last part gets the remainder"""
+    rng = np.random.default_rng(seed)
+    parts = [[] for _ in range(len(fractions) + 1)]
+    for label in np.unique(labels):
+        idx = rng.permutation(np.flatnonzero(labels == label))
+        bounds = np.cumsum([int(round(f * len(idx))) for f in fractions])
+        for part, chunk in zip(parts, np.split(idx, bounds)):
+            part.append(chunk)
+    return [np.sort(np.concatenate(part)) for part in parts]
+
+
+def _init_worker(features, labels):
+    _train['features'], _train['labels'] = features, labels
+
+
+def _score(y_true, y_pred, scoring):
+    from sklearn.metrics import accuracy_score, balanced_accuracy_score
+
+    if scoring == 'balanced_accuracy':
+        return float(balanced_accuracy_score(y_true, y_pred))
+    return float(accuracy_score(y_true, y_pred))
+
+
+def _evaluate(candidate_id, params, fold, train_idx, val_idx, scoring):
+    """Fit one candidate on one fold (runs in a worker process)"""
+    from sklearn.svm import SVC
+
+    features, labels = _train['features'], _train['labels']
+    started = time.perf_counter()
+    model = SVC(kernel=params['kernel'], C=params['C'], gamma=params['gamma'], random_state=42)
+    model.fit(features[train_idx], labels[train_idx])
+    score = _score(labels[val_idx], model.predict(features[val_idx]), scoring)
+    return candidate_id, fold, score, len(model.support_), time.perf_counter() - started
+
+
+def search(features, labels, candidates, folds=3, scoring='balanced_accuracy', workers=None):
+    """Cross-validate every candidate, one (candidate, fold) fit per task, across a process pool.
+
+    Returns the candidates sorted best first, each with its mean/std score,
+    mean support-vector count and total fit time.
+    """
+    splits = stratified_folds(labels, folds)
+    workers = workers or os.cpu_count() or 1
+    results = {i: {'params': params, 'scores': [], 'support_vectors': [], 'seconds': 0.0}
+               for i, params in enumerate(candidates)}
+    started = time.time()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(features, labels)) as pool:
+        futures = [pool.submit(_evaluate, i, params, fold, train_idx, val_idx, scoring)
+                   for i, params in enumerate(candidates)
+                   for fold, (train_idx, val_idx) in enumerate(splits)]
+        for done, future in enumerate(as_completed(futures), 1):
+            candidate_id, _, score, n_support, seconds = future.result()
+            result = results[candidate_id]
+            result['scores'].append(score)
+            result['support_vectors'].append(n_support)
+            result['seconds'] += seconds
+            if done % max(1, len(futures) // 10) == 0 or done == len(futures):
+                logger.info(f"Search {done}/{len(futures)} fits done ({time.time() - started:.1f}s, {workers} workers)")
+
+    ranked = []
+    for result in results.values():
+        ranked.append({'params': result['params'], 'score': float(np.mean(result['scores'])),
+                       'score_std': float(np.std(result['scores'])),
+                       'support_vectors': float(np.mean(result['support_vectors'])),
+                       'fit_seconds': round(result['seconds'], 3)})
+    # Ties go to the cheaper model (fewer support vectors means faster scoring)
+    ranked.sort(key=lambda r: (-r['score'], r['support_vectors']))
+    return ranked
+
+
+def dataset_hash(features, labels):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.ascontiguousarray(features).tobytes())
+    h.update(np.ascontiguousarray(labels, dtype=np.int64).tobytes())
+    return h.hexdigest()
+
+
+def evaluate_model(model, features, labels, class_names):
+    """Accuracy, log loss and per-class precision/recall/F1 of calibrated predictions"""
+    from sklearn.metrics import balanced_accuracy_score, log_loss, precision_recall_fscore_support
+
+    probabilities = model.predict_proba(features)
+    predicted = model.classes_[np.argmax(probabilities, axis=1)]
+    precision, recall, f1, support = precision_recall_fscore_support(labels, predicted, labels=model.classes_,
+                                                                     zero_division=0)
+    return {
+        'images': int(len(labels)),
+        'accuracy': float(np.mean(predicted == labels)),
+        'balanced_accuracy': float(balanced_accuracy_score(labels, predicted)),
+        'log_loss': float(log_loss(labels, probabilities, labels=model.classes_)),
+        'per_class': {class_names[i]: {'precision': float(precision[i]), 'recall': float(recall[i]),
+                                       'f1': float(f1[i]), 'support': int(support[i])}
+                      for i in range(len(model.classes_))},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search SVM hyperparameters in parallel and export a calibrated model")
+    add_dataset_arguments(parser)
+    parser.add_argument('--kernels', nargs='+', choices=['rbf', 'linear', 'poly', 'sigmoid'], default=['rbf', 'linear'])
+    parser.add_argument('--C', nargs='+', type=float, default=[0.1, 1.0, 10.0, 100.0])
+    parser.add_argument('--gamma', nargs='+', type=_parse_gamma, default=['scale', 1e-4, 1e-3, 1e-2])
+    parser.add_argument('--random', type=int, default=0,
+                        help="Sample this many configurations from --C-range/--gamma-range instead of the grid")
+    parser.add_argument('--C-range', nargs=2, type=float, default=[0.01, 1000.0], metavar=('LOW', 'HIGH'))
+    parser.add_argument('--gamma-range', nargs=2, type=float, default=[1e-5, 1e-1], metavar=('LOW', 'HIGH'))
+    parser.add_argument('--folds', type=int, default=3)
+    parser.add_argument('--scoring', choices=['accuracy', 'balanced_accuracy'], default='balanced_accuracy')
+    parser.add_argument('--calibration-fraction', type=float, default=0.15,
+                        help="Held-out share used only to fit the probability calibration")
+    parser.add_argument('--test-fraction', type=float, default=0.15)
+    parser.add_argument('--workers', type=int, default=None, help="Search processes (default: all cores)")
+    parser.add_argument('--output-dir', default='models')
+    args = parser.parse_args(argv)
+
+    from sklearn.svm import SVC
+
+    catalog = load_catalog()
+    reducer, pooled, labels = load_dataset(args)
+    calibration_idx, test_idx, train_idx = stratified_split(labels, [args.calibration_fraction, args.test_fraction])
+    if min(len(calibration_idx), len(test_idx), len(train_idx)) == 0:
+        logger.error("Need images in the training, calibration and test splits")
+        return 1
+
+    # Fit the projection on the training split only; float16 matches what the app feeds the SVM
+    reducer.fit(pooled[train_idx])
+    features = reducer.transform(pooled).astype(np.float16)
+    train_features, train_labels = features[train_idx], labels[train_idx]
+
+    if args.random:
+        candidates = random_candidates(args.random, args.kernels, args.C_range, args.gamma_range)
+    else:
+        candidates = grid_candidates(args.kernels, args.C, args.gamma)
+    logger.info(f"Searching {len(candidates)} configurations x {args.folds} folds on {len(train_idx)} images")
+    ranked = search(train_features, train_labels, candidates, args.folds, args.scoring, args.workers)
+    best = ranked[0]
+    logger.info(f"Best {best['params']}: {args.scoring} {best['score']:.4f} ± {best['score_std']:.4f}")
+
+    # Refit the winner on the whole training split, then calibrate once on the held-out split
+    started = time.perf_counter()
+    model = SVC(kernel=best['params']['kernel'], C=best['params']['C'], gamma=best['params']['gamma'], random_state=42)
+    model.fit(train_features, train_labels)
+    calibrate_holdout(model, features[calibration_idx], labels[calibration_idx])
+    model.feature_reducer_version_ = reducer.version
+    fit_seconds = time.perf_counter() - started
+
+    class_names = [catalog.label_for(idx) for idx in model.classes_]
+    test_report = evaluate_model(model, features[test_idx], labels[test_idx], class_names)
+    logger.info(f"Test accuracy {test_report['accuracy']:.4f}, balanced {test_report['balanced_accuracy']:.4f}, "
+                f"log loss {test_report['log_loss']:.4f}")
+
+    metadata = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'params': best['params'],
+        'classes': [int(c) for c in model.classes_],
+        'class_names': class_names,
+        'feature_dim': int(features.shape[1]),
+        'feature_reducer_version': reducer.version,
+        'backbone': os.path.basename(args.backbone),
+        'backend': args.backend,
+        'support_vectors': int(len(model.support_)),
+        'calibration': 'holdout-platt',
+        'splits': {'train': int(len(train_idx)), 'calibration': int(len(calibration_idx)), 'test': int(len(test_idx))},
+        'training_set_hash': dataset_hash(train_features, train_labels),
+        'refit_seconds': round(fit_seconds, 3),
+        'test': test_report,
+        'search': {'scoring': args.scoring, 'folds': args.folds, 'results': ranked},
+    }
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    with open(os.path.join(args.output_dir, 'svm_model_optimized.pkl'), 'wb') as f:
+        pickle.dump(model, f)
+    save_reducer(reducer, os.path.join(args.output_dir, 'feature_reducer.pkl'))
+    with open(os.path.join(args.output_dir, 'svm_model_metadata.json'), 'w') as f:
+        json.dump(metadata, f, indent=2)
+    logger.info(f"Saved svm_model_optimized.pkl, feature_reducer.pkl and svm_model_metadata.json to {args.output_dir}")
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,189 @@
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from preprocessing import load_and_prepare_timed
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+def default_workers():
+    """Leave one core for the model thread"""
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+def default_start_method():
+    """forkserver where the platform has it, spawn otherwise; never fork a process that may hold TensorFlow"""
+    return 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def _picklable(source):
+    """Turn a file-like upload into bytes so it can be shipped to a worker process"""
+    if hasattr(source, 'read'):
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        return source.read()
+    return source
+
+
+class PreprocessPool:
+    """Run decode + resize + CLAHE + normalization in a pool of worker processes.
+
+    Each task returns ``(pixel_hash, model_input)`` (see
+    ``preprocessing.load_and_prepare``). Workers are started with the
+    ``forkserver`` method by default (``spawn`` where it is unavailable) so
+    they never inherit TensorFlow state from the serving process; the fork
+    server preloads ``preprocessing`` so each worker starts with NumPy,
+    OpenCV and PIL already imported. Either way every worker also re-imports
+    the ``__main__`` script, so start the server from a light entry point
+    (run.py, serve.py) rather than ``python app.py``. With ``workers=0`` the
+    work runs inline on the calling thread. If a worker dies the pool is
+    replaced and the image is retried once. Per-stage timings measured in
+    the worker are attached to each future as ``future.timings`` and passed
+    to ``on_timings`` by ``result()``.
+    """
+
+    def __init__(self, workers=None, max_pending=None, start_method=None, on_timings=None):
+        self.workers = default_workers() if workers is None else int(workers)
+        self.max_pending = max_pending or max(2, self.workers * 2)
+        self.on_timings = on_timings
+        self._executor = None
+        self._lock = threading.Lock()
+        self._start_method = start_method or default_start_method()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                context = multiprocessing.get_context(self._start_method)
+                if self._start_method == 'forkserver':
+                    context.set_forkserver_preload(['preprocessing'])
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                logger.info(f"Preprocessing pool started with {self.workers} {self._start_method} workers")
+            return self._executor
+
+    def submit(self, source):
+        """Preprocess one source (path, bytes or file-like) and return a Future"""
+        future = Future()
+        if self.workers <= 0:
+            try:
+                result, future.timings = load_and_prepare_timed(source)
+                future.set_result(result)
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        self._submit_to_pool(future, _picklable(source), retries=1)
+        return future
+
+    def _submit_to_pool(self, future, source, retries):
+        """Hand one source to the worker pool, replacing the pool and retrying if a worker has died"""
+        executor = self._get_executor()
+        try:
+            done = executor.submit(load_and_prepare_timed, source)
+        except BrokenProcessPool:
+            self._reset(executor)
+            if retries <= 0:
+                raise
+            return self._submit_to_pool(future, source, retries - 1)
+
+        def relay(done):
+            try:
+                result, future.timings = done.result()
+            except BrokenProcessPool as e:
+                # A worker died (OOM, decoder crash); the image gets one more try in a fresh pool
+                self._reset(executor)
+                try:
+                    if retries <= 0:
+                        raise
+                    self._submit_to_pool(future, source, retries - 1)
+                except Exception as e:
+                    future.set_exception(e)
+                return
+            except BaseException as e:
+                future.set_exception(e)
+                return
+            future.set_result(result)
+
+        done.add_done_callback(relay)
+
+    def _reset(self, executor):
+        """Drop a broken executor so the next submit starts a new one (once, however many callers notice)"""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        logger.warning("Preprocessing pool broke (a worker died); starting a new one")
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def result(self, future):
+        """Wait for a submitted future and report its stage timings"""
+        result = future.result()
+        timings = getattr(future, 'timings', None)
+        if timings and self.on_timings is not None:
+            self.on_timings(timings)
+        return result
+
+    def run(self, source):
+        return self.result(self.submit(source))
+
+    def imap(self, items):
+        """Yield (name, Future) for (name, source) pairs, in order, keeping at most max_pending in flight.
+
+        A producer thread submits work and feeds futures to the consumer
+        through a bounded queue, so decoding of upcoming images overlaps with
+        inference on the current batch without reading the whole input ahead.
+        """
+        pending = queue.Queue(maxsize=self.max_pending)
+        stop = threading.Event()
+
+        def produce():
+            try:
+                for name, source in items:
+                    if stop.is_set():
+                        return
+                    try:
+                        future = self.submit(source)
+                    except Exception as e:
+                        future = Future()
+                        future.set_exception(e)
+                    pending.put((name, future))
+            except Exception as e:
+                logger.error(f"Preprocessing producer failed: {str(e)}")
+                pending.put(('<input>', _failed(e)))
+            finally:
+                pending.put(_DONE)
+
+        producer = threading.Thread(target=produce, name='preprocess-producer', daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = pending.get()
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            stop.set()
+            # Drain so a blocked producer can finish
+            while producer.is_alive():
+                try:
+                    pending.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+
+def _failed(exc):
+    future = Future()
+    future.set_exception(exc)
+    return future
@@ -0,0 +1,320 @@
+import argparse
+import io
+import logging
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+from feature_cache import pixel_hash
+
+logger = logging.getLogger(__name__)
+
+# Image size must match your training
+IMG_SIZE = (192, 192)
+
+# Decode JPEGs at reduced resolution and shrink other formats early instead of
+# materializing the full-size pixel array (set FAST_DECODE=0 for the old path)
+FAST_DECODE = os.environ.get('FAST_DECODE', '1') != '0'
+
+# Keep at least this many times IMG_SIZE before the final resize
+DECODE_OVERSAMPLE = 2
+
+# Modes PIL cannot reduce() directly; they are converted to RGB first
+_CONVERT_FIRST_MODES = ('1', 'P', 'PA', 'I;16', 'I;16L', 'I;16B', 'I;16N')
+
+# ImageNet channel means used by ResNet50 ("caffe" mode), in BGR order
+RESNET_MEAN_BGR = np.array([103.939, 116.779, 123.68], dtype=np.float32)
+
+# Per-thread CLAHE object and scratch images reused across calls
+_thread_state = threading.local()
+
+
+def _lap(timings, stage, started):
+    """Store the time since ``started`` under ``stage`` (when collecting timings) and return the current time"""
+    now = time.perf_counter()
+    if timings is not None:
+        timings[stage] = now - started
+    return now
+
+
+def preprocess_input(img):
+    """NumPy equivalent of tensorflow.keras.applications.resnet50.preprocess_input.
+
+    Flips RGB to BGR and subtracts the ImageNet channel means, without having
+    to import TensorFlow (so preprocessing workers stay lightweight).
+    """
+    img = img[..., ::-1]
+    return img - RESNET_MEAN_BGR
+
+
+def _to_rgb(image):
+    """Convert any PIL mode (grayscale, palette, 16-bit, CMYK, alpha) to 8-bit RGB"""
+    if image.mode == 'RGB':
+        return image
+    if image.mode.startswith('I') or image.mode == 'F':
+        # 16/32-bit integer or float data: scale down to 8 bits
+        arr = np.asarray(image, dtype=np.float32)
+        peak = float(arr.max()) if arr.size else 0.0
+        if image.mode == 'F' and peak <= 1.0:
+            arr = arr * 255.0
+        elif peak > 255.0:
+            arr = arr / 257.0
+        gray = Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8), mode='L')
+        return gray.convert('RGB')
+    if image.mode == 'P' and 'transparency' in image.info:
+        image = image.convert('RGBA')
+    # Alpha is dropped, matching the previous RGBA -> RGB handling
+    return image.convert('RGB')
+
+
+def _open(image_path):
+    if isinstance(image_path, (bytes, bytearray, memoryview)):
+        image_path = io.BytesIO(image_path)
+    return Image.open(image_path)
+
+
+def decode_image_legacy(image_path):
+    """Full-resolution decode used before FAST_DECODE (kept for parity checks)"""
+    import cv2
+
+    # Open and convert image
+    image = _open(image_path)
+    img = np.array(image)
+
+    # Handle RGBA images
+    if img.shape[2] == 4:
+        img = cv2.cvtColor(img, cv2.COLOR_RGBA2RGB)
+    return img
+
+
+def decode_image(image_path):
+    """Decode an image file (path, file-like or bytes) into an RGB uint8 array.
+
+    JPEGs are decoded with libjpeg's DCT scaling (``Image.draft``) and other
+    formats are box-reduced right after loading, so the array handed to
+    ``prepare_image`` is only a few times larger than IMG_SIZE.
+    """
+    if not FAST_DECODE:
+        return decode_image_legacy(image_path)
+
+    image = _open(image_path)
+    min_size = (IMG_SIZE[0] * DECODE_OVERSAMPLE, IMG_SIZE[1] * DECODE_OVERSAMPLE)
+    if image.format == 'JPEG':
+        # Must happen before the pixel data is loaded
+        image.draft('RGB', min_size)
+
+    if image.mode in _CONVERT_FIRST_MODES:
+        image = _to_rgb(image)
+
+    factor = min(image.width // min_size[0], image.height // min_size[1])
+    if factor >= 2:
+        image = image.reduce(factor)
+
+    return np.asarray(_to_rgb(image))
+
+
+def _scratch():
+    """This thread's CLAHE object and uint8 scratch images, created on first use"""
+    state = getattr(_thread_state, 'scratch', None)
+    if state is None:
+        import cv2
+        shape = (IMG_SIZE[1], IMG_SIZE[0])
+        state = _thread_state.scratch = {
+            'clahe': cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)),
+            'resized': np.empty(shape + (3,), dtype=np.uint8),
+            'lab': np.empty(shape + (3,), dtype=np.uint8),
+            'lightness': np.empty(shape, dtype=np.uint8),
+            'enhanced': np.empty(shape + (3,), dtype=np.uint8),
+        }
+    return state
+
+
+def _add_time(timings, stage, started):
+    """Like _lap, but accumulates so per-image stages add up over a batch"""
+    now = time.perf_counter()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + (now - started)
+    return now
+
+
+def prepare_into(img, out, timings=None):
+    """Resize and CLAHE-enhance one decoded image, writing it into ``out`` as BGR float32.
+
+    ``out`` is an (H, W, 3) float32 view, usually one row of a batch buffer.
+    The ImageNet means are not subtracted here (prepare_batch does that for
+    the whole batch at once).
+    """
+    # OpenCV is imported on first use to keep app start-up fast
+    import cv2
+
+    scratch = _scratch()
+
+    # Resize
+    started = time.perf_counter()
+    resized = cv2.resize(img, IMG_SIZE, dst=scratch['resized'])
+    started = _add_time(timings, 'resize', started)
+
+    # Contrast Enhancement (CLAHE) on the lightness channel, without splitting/merging copies
+    try:
+        lab = cv2.cvtColor(resized, cv2.COLOR_BGR2LAB, dst=scratch['lab'])
+        lightness = cv2.extractChannel(lab, 0, dst=scratch['lightness'])
+        scratch['clahe'].apply(lightness, dst=lightness)
+        cv2.insertChannel(lightness, lab, 0)
+        enhanced = cv2.cvtColor(lab, cv2.COLOR_LAB2BGR, dst=scratch['enhanced'])
+    except Exception as e:
+        logger.warning(f"CLAHE enhancement failed, using original image. Error: {str(e)}")
+        enhanced = resized
+    started = _add_time(timings, 'clahe', started)
+
+    # Channel flip (RGB -> BGR) and float32 conversion in one copy
+    np.copyto(out, enhanced[..., ::-1], casting='unsafe')
+    _add_time(timings, 'preprocess_input', started)
+    return out
+
+
+def prepare_batch(images, out=None, timings=None):
+    """Resize, enhance and normalize decoded images into one (N, H, W, 3) float32 model input.
+
+    Every image is written straight into ``out`` (allocated when not given),
+    and the ResNet mean subtraction runs in place over the whole batch, so
+    the result can go to the model without a concatenate.
+    """
+    out = _batch_buffer(len(images), out)
+    for i, img in enumerate(images):
+        prepare_into(img, out[i], timings)
+    return _subtract_mean(out, timings)
+
+
+def _batch_buffer(count, out=None):
+    if out is None:
+        return np.empty((count, IMG_SIZE[1], IMG_SIZE[0], 3), dtype=np.float32)
+    if out.shape[0] < count or out.shape[1:] != (IMG_SIZE[1], IMG_SIZE[0], 3) or out.dtype != np.float32:
+        raise ValueError(f"Output buffer of shape {out.shape} ({out.dtype}) cannot hold {count} images")
+    return out[:count]
+
+
+def _subtract_mean(batch, timings=None):
+    """ResNet50 "caffe" normalization for a whole BGR batch, in place"""
+    started = time.perf_counter()
+    batch -= RESNET_MEAN_BGR
+    _add_time(timings, 'preprocess_input', started)
+    return batch
+
+
+def prepare_image(img, timings=None):
+    """Resize, enhance and normalize a decoded image into a (1, H, W, 3) model input.
+
+    If ``timings`` is a dict, the seconds spent in each stage are stored in it.
+    """
+    return prepare_batch([img], timings=timings)
+
+
+def preprocess_image(image_path):
+    """Preprocess the image for prediction"""
+    try:
+        return prepare_image(decode_image(image_path))
+    except Exception as e:
+        logger.error(f"Error in image preprocessing: {str(e)}")
+        raise
+
+
+def preprocess_batch(sources, out=None, timings=None):
+    """Decode and preprocess several images (paths, file-likes or bytes) into one model-ready batch.
+
+    Each image is decoded and written into its row before the next one is
+    decoded, so only one full decoded image is alive at a time.
+    """
+    sources = list(sources)
+    out = _batch_buffer(len(sources), out)
+    for i, source in enumerate(sources):
+        started = time.perf_counter()
+        img = decode_image(source)
+        _add_time(timings, 'decode', started)
+        prepare_into(img, out[i], timings)
+    return _subtract_mean(out, timings)
+
+
+def load_and_prepare(source, timings=None):
+    """Decode and preprocess one image, returning (pixel_hash, model_input).
+
+    This is the unit of work run by the preprocessing pool: the hash is taken
+    on the decoded pixels (for the feature cache) so the full-size array never
+    has to travel back to the model thread.
+    """
+    started = time.perf_counter()
+    img = decode_image(source)
+    started = _lap(timings, 'decode', started)
+    digest = pixel_hash(img)
+    _lap(timings, 'hash', started)
+    return digest, prepare_image(img, timings)
+
+
+def load_and_prepare_timed(source):
+    """load_and_prepare for worker processes: returns ((pixel_hash, model_input), stage timings)"""
+    timings = {}
+    return load_and_prepare(source, timings), timings
+
+
+def check_decode_parity(paths, predict_batch_fn, confidence_tolerance=5.0):
+    """Compare predictions from the fast decode path against the legacy full-resolution path.
+
+    Returns a summary dict with the label agreement rate and the largest
+    confidence difference; ``passed`` is False if any label differs or any
+    confidence moves by more than ``confidence_tolerance`` percentage points.
+    """
+    compared, label_mismatches, max_drift, skipped = 0, [], 0.0, []
+    for path in paths:
+        try:
+            legacy = prepare_image(decode_image_legacy(path))
+        except Exception:
+            # The legacy path cannot decode grayscale/palette/16-bit inputs
+            skipped.append(path)
+            continue
+        fast = prepare_image(decode_image(path))
+        (legacy_label, legacy_conf), (fast_label, fast_conf) = predict_batch_fn(
+            np.concatenate([legacy, fast], axis=0))
+        compared += 1
+        max_drift = max(max_drift, abs(legacy_conf - fast_conf))
+        if legacy_label != fast_label:
+            label_mismatches.append((path, legacy_label, fast_label))
+
+    return {
+        'compared': compared,
+        'skipped': len(skipped),
+        'label_agreement': (1 - len(label_mismatches) / compared) if compared else None,
+        'label_mismatches': label_mismatches,
+        'max_confidence_drift': max_drift,
+        'passed': compared > 0 and not label_mismatches and max_drift <= confidence_tolerance,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that FAST_DECODE predictions match the legacy decode path")
+    parser.add_argument('input_dir', help="Directory of sample images")
+    parser.add_argument('--tolerance', type=float, default=5.0,
+                        help="Maximum allowed confidence drift in percentage points")
+    args = parser.parse_args(argv)
+
+    import app as skin_app
+    from batch_predict import iter_image_files
+    if not skin_app.load_models():
+        logger.error("Failed to load models")
+        return 1
+
+    paths = [path for _, path in iter_image_files(args.input_dir)]
+    summary = check_decode_parity(paths, skin_app.predict_batch, args.tolerance)
+    for path, legacy_label, fast_label in summary['label_mismatches']:
+        logger.warning(f"Label changed for {path}: {legacy_label} -> {fast_label}")
+    logger.info(f"Compared {summary['compared']} images (skipped {summary['skipped']}), "
+                f"label agreement {summary['label_agreement']}, "
+                f"max confidence drift {summary['max_confidence_drift']:.2f}")
+    return 0 if summary['passed'] else 1
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
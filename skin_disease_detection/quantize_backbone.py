@@ -0,0 +1,155 @@
+import argparse
+import logging
+import os
+import pickle
+import random
+import sys
+from collections import defaultdict
+
+import numpy as np
+
+from backends import KerasBackend, TFLiteBackend, write_quantization_report
+from batch_predict import iter_chunks, iter_labeled_images
+from disease_catalog import load_catalog
+from feature_reduction import check_reducer_matches, load_reducer
+from preprocessing import IMG_SIZE, preprocess_batch, preprocess_image
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_MODES = ('float16', 'dynamic', 'int8')
+
+# A quantized extractor is only approved if the SVM agrees with the float32
+# model on at least this fraction of the evaluation images...
+DEFAULT_MIN_AGREEMENT = 0.98
+# ...and the top-class confidence never moves by more than this many points
+DEFAULT_MAX_CONFIDENCE_DRIFT = 5.0
+
+
+def split_dataset(dataset_dir, categories, calibration_per_class, eval_per_class, seed=0):
+    """Draw disjoint per-category calibration and evaluation samples"""
+    by_class = defaultdict(list)
+    for path, class_index in iter_labeled_images(dataset_dir, categories):
+        by_class[class_index].append(path)
+
+    rng = random.Random(seed)
+    calibration, evaluation = [], []
+    for class_index in sorted(by_class):
+        paths = by_class[class_index]
+        rng.shuffle(paths)
+        calibration.extend(paths[:calibration_per_class])
+        evaluation.extend(paths[calibration_per_class:calibration_per_class + eval_per_class])
+    return calibration, evaluation
+
+
+def convert(keras_model, mode, calibration_paths=()):
+    """Post-training quantization of the Keras feature extractor; returns TFLite flatbuffer bytes"""
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if mode == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif mode == 'int8':
+        if not calibration_paths:
+            raise ValueError("Full INT8 quantization needs calibration images")
+
+        def representative_dataset():
+            for path in calibration_paths:
+                yield [preprocess_image(path)]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    elif mode != 'dynamic':
+        raise ValueError(f"Unknown quantization mode: {mode}")
+    return converter.convert()
+
+
+def _svm_outputs(svm_model, reducer, features):
+    # Same path as extract_features in app.py: optional pooling/projection, then float16
+    if reducer is not None:
+        features = reducer.transform(features)
+    features_flat = np.asarray(features).reshape(len(features), -1).astype(np.float16)
+    probabilities = svm_model.predict_proba(features_flat)
+    return np.argmax(probabilities, axis=1), np.max(probabilities, axis=1) * 100
+
+
+def evaluate(reference, candidate, svm_model, paths, batch_size=16, reducer=None):
+    """Compare SVM top-1 and confidence on float32 vs quantized features for the same images"""
+    agree, total, drifts = 0, 0, []
+    buffer = np.empty((batch_size, IMG_SIZE[1], IMG_SIZE[0], 3), dtype=np.float32)
+    for chunk in iter_chunks(paths, batch_size):
+        batch = preprocess_batch(chunk, out=buffer)
+        ref_labels, ref_conf = _svm_outputs(svm_model, reducer, reference.predict(batch))
+        q_labels, q_conf = _svm_outputs(svm_model, reducer, candidate.predict(batch))
+        agree += int(np.sum(ref_labels == q_labels))
+        total += len(chunk)
+        drifts.extend(np.abs(ref_conf - q_conf).tolist())
+    return {
+        'images': total,
+        'top1_agreement': agree / total if total else 0.0,
+        'mean_confidence_drift': float(np.mean(drifts)) if drifts else 0.0,
+        'max_confidence_drift': float(np.max(drifts)) if drifts else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quantize the ResNet50 feature extractor and gate it on accuracy")
+    parser.add_argument('keras_model', help="Path to resnet50_base_model.h5")
+    parser.add_argument('svm_model', help="Path to svm_model_optimized.pkl")
+    parser.add_argument('dataset_dir', help="Dataset with one sub-directory per category")
+    parser.add_argument('--mode', choices=QUANTIZATION_MODES, default='int8')
+    parser.add_argument('--calibration-per-class', type=int, default=20)
+    parser.add_argument('--eval-per-class', type=int, default=30)
+    parser.add_argument('--min-agreement', type=float, default=DEFAULT_MIN_AGREEMENT)
+    parser.add_argument('--max-confidence-drift', type=float, default=DEFAULT_MAX_CONFIDENCE_DRIFT)
+    parser.add_argument('--output', help="Output .tflite path (default: next to the Keras model)")
+    parser.add_argument('--reducer', help="Feature reducer the SVM was trained with "
+                                          "(default: feature_reducer.pkl next to the SVM, if present)")
+    args = parser.parse_args(argv)
+
+    output_path = args.output or args.keras_model.rsplit('.', 1)[0] + f".{args.mode}.tflite"
+    calibration, evaluation = split_dataset(args.dataset_dir, load_catalog().labels,
+                                            args.calibration_per_class, args.eval_per_class)
+    if not evaluation:
+        logger.error(f"No evaluation images found in {args.dataset_dir}")
+        return 1
+
+    with open(args.svm_model, 'rb') as f:
+        svm_model = pickle.load(f)
+    reducer_path = args.reducer or os.path.join(os.path.dirname(args.svm_model), 'feature_reducer.pkl')
+    reducer = load_reducer(reducer_path) if os.path.exists(reducer_path) else None
+    # Fail before the slow conversion if the SVM cannot score these features
+    check_reducer_matches(svm_model, reducer)
+
+    reference = KerasBackend(args.keras_model)
+    with open(output_path, 'wb') as f:
+        f.write(convert(reference.model, args.mode, calibration))
+    logger.info(f"Wrote {args.mode} model to {output_path}")
+
+    metrics = evaluate(reference, TFLiteBackend(output_path), svm_model, evaluation, reducer=reducer)
+
+    approved = (metrics['top1_agreement'] >= args.min_agreement
+                and metrics['max_confidence_drift'] <= args.max_confidence_drift)
+    report = {
+        'mode': args.mode,
+        'source_model': args.keras_model,
+        'calibration_images': len(calibration),
+        'min_agreement': args.min_agreement,
+        'max_confidence_drift_allowed': args.max_confidence_drift,
+        'approved': approved,
+        **metrics,
+    }
+    write_quantization_report(output_path, report)
+
+    if approved:
+        logger.info(f"Quantized model approved: {metrics}. "
+                    f"Activate with INFERENCE_BACKEND=tflite BACKBONE_MODEL_PATH={output_path}")
+        return 0
+    logger.error(f"Quantized model rejected (agreement {metrics['top1_agreement']:.3f}, "
+                 f"max drift {metrics['max_confidence_drift']:.2f}); it will refuse to load")
+    return 1
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,111 @@
+import argparse
+import logging
+import os
+import pickle
+import random
+import sys
+
+import numpy as np
+
+from backends import load_backend
+from batch_predict import iter_chunks, iter_labeled_images
+from disease_catalog import load_catalog
+from feature_reduction import FeatureReducer, save_reducer
+from feature_store import FeatureStore, store_version, update_store
+from preprocessing import IMG_SIZE, decode_image, prepare_batch
+
+logger = logging.getLogger(__name__)
+
+
+def extract_dataset(backend, reducer, items, batch_size=16):
+    """Run the backbone over (path, label) items, pooling each batch right away to keep memory small"""
+    features, labels = [], []
+    # One input buffer reused for every batch
+    buffer = np.empty((batch_size, IMG_SIZE[1], IMG_SIZE[0], 3), dtype=np.float32)
+    for chunk in iter_chunks(items, batch_size):
+        images, chunk_labels = [], []
+        for path, label in chunk:
+            try:
+                images.append(decode_image(path))
+                chunk_labels.append(label)
+            except Exception as e:
+                logger.warning(f"Skipping {path}: {str(e)}")
+        if images:
+            features.append(reducer.pool(backend.predict(prepare_batch(images, out=buffer))))
+            labels.extend(chunk_labels)
+        logger.info(f"Extracted features for {len(labels)} images")
+    return np.concatenate(features, axis=0), np.array(labels)
+
+
+def extract_from_store(store, load_backend_fn, reducer, items):
+    """Like extract_dataset, but only images missing from the feature store go through the backbone"""
+    keyed = update_store(store, load_backend_fn, items)
+    keys = [key for key, _ in keyed]
+    pooled = [reducer.pool(batch.astype(np.float32)) for batch in store.iter_batches(keys)]
+    return np.concatenate(pooled, axis=0), np.array([label for _, label in keyed])
+
+
+def add_dataset_arguments(parser):
+    """Arguments shared by the SVM training tools: the dataset, the backbone and the feature reducer"""
+    parser.add_argument('dataset_dir', help="Dataset with one sub-directory per category")
+    parser.add_argument('--backbone', required=True, help="Feature extractor model path (.h5/.tflite/.onnx)")
+    parser.add_argument('--backend', default='keras', help="Runtime for the backbone (keras, tflite, onnx)")
+    parser.add_argument('--pooling', choices=['none', 'avg', 'max', 'avgmax'], default='avg')
+    parser.add_argument('--projection', choices=['none', 'pca', 'random'], default='none')
+    parser.add_argument('--components', type=int, default=256)
+    parser.add_argument('--feature-store', help="Directory of cached backbone features (see feature_store.py); "
+                                                "only new or changed images are extracted")
+
+
+def load_dataset(args):
+    """Return (reducer, pooled features, labels) for the dataset, shuffled with a fixed seed"""
+    items = list(iter_labeled_images(args.dataset_dir, load_catalog().labels))
+    random.Random(42).shuffle(items)
+
+    reducer = FeatureReducer(pooling=None if args.pooling == 'none' else args.pooling,
+                             projection=None if args.projection == 'none' else args.projection,
+                             n_components=args.components)
+    if args.feature_store:
+        store = FeatureStore(args.feature_store, store_version(args.backend, args.backbone))
+        pooled, labels = extract_from_store(store, lambda: load_backend(args.backend, args.backbone), reducer, items)
+    else:
+        pooled, labels = extract_dataset(load_backend(args.backend, args.backbone), reducer, items)
+    return reducer, pooled, labels
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Retrain the SVM on pooled/projected ResNet features")
+    add_dataset_arguments(parser)
+    parser.add_argument('--C', type=float, default=1.0)
+    parser.add_argument('--test-fraction', type=float, default=0.2)
+    parser.add_argument('--output-dir', default='models')
+    args = parser.parse_args(argv)
+
+    from sklearn.svm import SVC
+
+    reducer, pooled, labels = load_dataset(args)
+
+    # Fit the projection on the training split only (counted after unreadable images were dropped)
+    split = int(len(labels) * (1 - args.test_fraction))
+    reducer.fit(pooled[:split])
+    features = reducer.transform(pooled).astype(np.float16)
+
+    svm_model = SVC(kernel='rbf', C=args.C, gamma='scale', probability=True, random_state=42)
+    svm_model.fit(features[:split], labels[:split])
+    svm_model.feature_reducer_version_ = reducer.version
+    if split < len(labels):
+        accuracy = float(np.mean(svm_model.predict(features[split:]) == labels[split:]))
+        logger.info(f"Held-out accuracy: {accuracy:.4f} on {len(labels) - split} images")
+    logger.info(f"Feature dimension {features.shape[1]}, {len(svm_model.support_)} support vectors")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    with open(os.path.join(args.output_dir, 'svm_model_optimized.pkl'), 'wb') as f:
+        pickle.dump(svm_model, f)
+    save_reducer(reducer, os.path.join(args.output_dir, 'feature_reducer.pkl'))
+    logger.info(f"Saved svm_model_optimized.pkl and feature_reducer.pkl to {args.output_dir}")
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,10 @@
+"""Development server entry point: ``python run.py``.
+
+Preprocessing workers re-import the ``__main__`` script when they start, so
+it is kept this small; app.py is only imported in the server process.
+"""
+
+if __name__ == '__main__':
+    from app import run_dev_server
+
+    run_dev_server()
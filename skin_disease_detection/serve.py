@@ -0,0 +1,145 @@
+import argparse
+import gc
+import logging
+import os
+import sys
+import threading
+
+logger = logging.getLogger('serve')
+
+# Environment variables read by the BLAS/OpenMP/TensorFlow thread pools at import time
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+                   'TF_NUM_INTRAOP_THREADS', 'INFERENCE_THREADS')
+
+# TFLite flatbuffers are memory-mapped, so workers share their weights through the
+# page cache; Keras and ONNX Runtime keep a private copy in every worker
+SHARED_WEIGHT_BACKENDS = ('tflite',)
+
+
+def configure_threads(workers, threads=None):
+    """Split the CPU cores between workers so they do not oversubscribe; must run before numpy is imported"""
+    default = max(1, (os.cpu_count() or 1) // workers)
+    for name in THREAD_ENV_VARS:
+        if threads:
+            os.environ[name] = str(threads)
+        else:
+            os.environ.setdefault(name, str(default))
+    os.environ.setdefault('TF_NUM_INTEROP_THREADS', '1')
+    # Parallelism comes from the worker processes; don't add a preprocessing pool per worker
+    os.environ.setdefault('PREPROCESS_WORKERS', '0')
+    return int(os.environ['INFERENCE_THREADS'])
+
+
+def memory_usage_mb():
+    """(RSS, PSS) of this process in MB from /proc; PSS splits shared pages between the processes using them"""
+    usage = {}
+    for path, fields in (('/proc/self/status', ('VmRSS',)), ('/proc/self/smaps_rollup', ('Pss',))):
+        try:
+            with open(path) as f:
+                for line in f:
+                    name, _, value = line.partition(':')
+                    if name in fields:
+                        usage[name] = int(value.split()[0]) / 1024
+        except OSError:
+            pass
+    return usage.get('VmRSS'), usage.get('Pss')
+
+
+def post_fork(server, worker):
+    """gunicorn hook: load the feature extractor in each worker (TensorFlow/ONNX thread pools do not survive fork)"""
+    import app as skin_app
+
+    def warm_up():
+        if skin_app.warm_up_models():
+            rss, pss = memory_usage_mb()
+            logger.info(f"Worker {os.getpid()} ready: RSS {rss or 0:.0f} MB, PSS {pss or 0:.0f} MB "
+                        f"({skin_app.INFERENCE_BACKEND} backend)")
+        else:
+            logger.error(f"Worker {os.getpid()} could not load the models")
+
+    # Warm up off the boot path so gunicorn's worker timeout does not kill slow model loads; /readyz is 503 meanwhile
+    threading.Thread(target=warm_up, name='model-warmup', daemon=True).start()
+    # Each worker opens its own job database connection and threads (the master never opened one)
+    skin_app.start_job_workers()
+
+
+def check_backbone():
+    """Fail before any worker forks if the configured feature extractor can not be served"""
+    import app as skin_app
+    from backends import check_quantization_approval
+
+    path = skin_app.BACKBONE_MODEL_PATH
+    if not os.path.exists(path):
+        hint = (" (export it with export_backbone.py, or set INFERENCE_BACKEND=keras)"
+                if skin_app.INFERENCE_BACKEND == 'tflite' else "")
+        raise RuntimeError(f"No {skin_app.INFERENCE_BACKEND} feature extractor at {path}{hint}")
+    check_quantization_approval(path)
+
+
+def load_app():
+    """Runs once in the gunicorn master (preload_app): import the app and load what workers can share"""
+    import app as skin_app
+
+    backend = skin_app.INFERENCE_BACKEND
+    if backend not in SHARED_WEIGHT_BACKENDS:
+        logger.warning(f"INFERENCE_BACKEND={backend}: every worker loads its own copy of ResNet50 "
+                       f"(about 100 MB of weights plus the runtime), so memory grows with --workers. "
+                       f"Export a TFLite model with export_backbone.py to share the weights.")
+
+    # The SVM, its scorer arrays and the feature reducer end up in copy-on-write pages
+    if not skin_app.load_classifier():
+        raise RuntimeError("Failed to load the SVM model")
+    # Keep the collector from touching (and un-sharing) the preloaded objects
+    gc.collect()
+    gc.freeze()
+    return skin_app.app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Production server: gunicorn with a preloaded SVM and forked workers")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_WORKERS', 2)))
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('WORKER_THREADS', 0)) or None,
+                        help="Intra-op threads per worker (default: cores / workers)")
+    parser.add_argument('--timeout', type=int, default=120, help="Seconds before a stuck worker is restarted")
+    args = parser.parse_args(argv)
+
+    # The memory-mapped TFLite extractor is shared between workers; Keras would be loaded once per worker
+    os.environ.setdefault('INFERENCE_BACKEND', 'tflite')
+    threads = configure_threads(args.workers, args.threads)
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        logger.error("serve.py needs gunicorn (pip install gunicorn)")
+        return 1
+    try:
+        check_backbone()
+    except RuntimeError as e:
+        # Otherwise every worker would log the same error and /readyz would never turn ready
+        logger.error(str(e))
+        return 1
+
+    class SkinServer(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f'{args.host}:{args.port}')
+            self.cfg.set('workers', args.workers)
+            # Request threads per worker; inference itself is bounded by INFERENCE_WORKERS
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('threads', int(os.environ.get('WEB_THREADS', 8)))
+            self.cfg.set('timeout', args.timeout)
+            self.cfg.set('preload_app', True)
+            self.cfg.set('post_fork', post_fork)
+
+        def load(self):
+            return load_app()
+
+    logger.info(f"Starting {args.workers} workers x {threads} threads ({os.environ['INFERENCE_BACKEND']} backend)")
+    SkinServer().run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import gzip
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Encodings we pre-compress into, best first
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+class RenderedPage:
+    """One pre-rendered HTML page with its precompressed variants and strong ETags"""
+
+    def __init__(self, body):
+        self.body = body.encode('utf-8') if isinstance(body, str) else body
+        tag = hashlib.blake2b(self.body, digest_size=12).hexdigest()
+        self.variants = {None: (self.body, tag)}
+        self.variants['gzip'] = (gzip.compress(self.body, compresslevel=9, mtime=0), f'{tag}-gz')
+        if brotli is not None:
+            self.variants['br'] = (brotli.compress(self.body, quality=11), f'{tag}-br')
+
+    def choose(self, accept_encodings):
+        """Pick the smallest variant the client accepts; returns (encoding, body, etag)"""
+        for encoding in ENCODINGS:
+            if accept_encodings[encoding]:
+                body, etag = self.variants[encoding]
+                if len(body) < len(self.body):
+                    return encoding, body, etag
+        body, etag = self.variants[None]
+        return None, body, etag
+
+
+class PageCache:
+    """Pages rendered once by ``render_fn(key)`` and served with ETag/Cache-Control/304 handling.
+
+    ``keys_fn()`` lists the pages to build up front; unknown keys are
+    rendered and cached on first request. ``clear()`` drops everything, for
+    when the underlying data changes.
+    """
+
+    def __init__(self, render_fn, keys_fn=None, max_age=86400):
+        self.render_fn = render_fn
+        self.keys_fn = keys_fn
+        self.max_age = max_age
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def build(self):
+        """Render every page listed by keys_fn (typically at startup)"""
+        keys = list(self.keys_fn()) if self.keys_fn else []
+        for key in keys:
+            self.get(key)
+        logger.info(f"Pre-rendered {len(keys)} pages")
+
+    def get(self, key):
+        page = self._pages.get(key)
+        if page is None:
+            with self._lock:
+                page = self._pages.get(key)
+                if page is None:
+                    page = self._pages[key] = RenderedPage(self.render_fn(key))
+        return page
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+    def respond(self, key, request, response_class):
+        """Build the response for a page, answering 304 when the client already has this variant"""
+        encoding, body, etag = self.get(key).choose(request.accept_encodings)
+        if request.if_none_match.contains(etag):
+            response = response_class(status=304)
+        else:
+            response = response_class(body, mimetype='text/html')
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = f'public, max-age={self.max_age}'
+        response.vary.add('Accept-Encoding')
+        return response
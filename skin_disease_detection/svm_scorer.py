@@ -0,0 +1,240 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Same constants libsvm uses for probability estimates
+MIN_PROB = 1e-7
+
+
+def _get(model, name, default=None):
+    """Read a fitted attribute from an sklearn SVC or from a plain dict of its attributes"""
+    if isinstance(model, dict):
+        return model.get(name, default)
+    return getattr(model, name, default)
+
+
+def pairwise_coupling(r, max_iter=None, eps=None):
+    """Batched version of libsvm's multiclass_probability (Wu, Lin and Weng, method 2).
+
+    ``r`` has shape (N, k, k) with r[:, i, j] the estimated probability that
+    class i beats class j. Returns an (N, k) array of class probabilities.
+    """
+    n, k, _ = r.shape
+    max_iter = max_iter or max(100, k)
+    eps = eps or 0.005 / k
+
+    rt = np.transpose(r, (0, 2, 1))
+    Q = -rt * r
+    diag = np.sum(rt * rt, axis=2)
+    idx = np.arange(k)
+    Q[:, idx, idx] = diag
+
+    p = np.full((n, k), 1.0 / k)
+    done = np.zeros(n, dtype=bool)
+    for _ in range(max_iter):
+        Qp = np.einsum('ntj,nj->nt', Q, p)
+        pQp = np.sum(p * Qp, axis=1)
+        done |= np.max(np.abs(Qp - pQp[:, None]), axis=1) < eps
+        active = ~done
+        if not active.any():
+            break
+        Qa, Qpa, pQpa, pa = Q[active], Qp[active], pQp[active], p[active]
+        for t in range(k):
+            diff = (-Qpa[:, t] + pQpa) / Qa[:, t, t]
+            pa[:, t] += diff
+            scale = 1.0 + diff
+            pQpa = (pQpa + diff * (diff * Qa[:, t, t] + 2 * Qpa[:, t])) / (scale * scale)
+            Qpa = (Qpa + diff[:, None] * Qa[:, t, :]) / scale[:, None]
+            pa /= scale[:, None]
+        p[active] = pa
+    return p
+
+
+class FastSVMScorer:
+    """Score a fitted one-vs-one SVC with one kernel evaluation per batch.
+
+    The support vectors, dual coefficients, intercepts and Platt parameters are
+    copied out of the pickle once into contiguous arrays, and the per-pair
+    dual coefficients are folded into a single (n_SV, n_pairs) matrix, so the
+    decision values for a batch are one kernel computation plus one matmul.
+    Labels and calibrated probabilities are both derived from those decision
+    values. When probabilities are available the label is their argmax (as
+    libsvm's own svm_predict_probability does), so the two always agree.
+    """
+
+    def __init__(self, support_vectors, dual_coef, intercept, n_support, classes, kernel='rbf',
+                 gamma=1.0, coef0=0.0, degree=3, prob_a=None, prob_b=None, dtype=np.float64):
+        self.kernel = kernel
+        self.gamma = float(gamma)
+        self.coef0 = float(coef0)
+        self.degree = int(degree)
+        self.dtype = dtype
+        self.classes = np.asarray(classes)
+        self.n_classes = len(self.classes)
+
+        self.support_vectors = np.ascontiguousarray(support_vectors, dtype=dtype)
+        self.sv_sq_norms = np.einsum('ij,ij->i', self.support_vectors, self.support_vectors)
+        self.intercept = np.ascontiguousarray(intercept, dtype=dtype)
+
+        # Fold libsvm's (n_classes - 1, n_SV) dual_coef layout into one weight column per class pair
+        dual_coef = np.asarray(dual_coef, dtype=dtype)
+        starts = np.concatenate([[0], np.cumsum(n_support)])
+        self.pairs = [(i, j) for i in range(self.n_classes) for j in range(i + 1, self.n_classes)]
+        weights = np.zeros((len(self.support_vectors), len(self.pairs)), dtype=dtype)
+        for p, (i, j) in enumerate(self.pairs):
+            si, sj = slice(starts[i], starts[i + 1]), slice(starts[j], starts[j + 1])
+            weights[si, p] = dual_coef[j - 1, si]
+            weights[sj, p] = dual_coef[i, sj]
+        self.pair_weights = np.ascontiguousarray(weights)
+
+        self.prob_a = None if prob_a is None or len(prob_a) == 0 else np.asarray(prob_a, dtype=dtype)
+        self.prob_b = None if prob_b is None or len(prob_b) == 0 else np.asarray(prob_b, dtype=dtype)
+
+    @classmethod
+    def from_model(cls, model, dtype=np.float64):
+        """Build a scorer from a fitted sklearn SVC (or a dict of its fitted attributes)"""
+        support_vectors = _get(model, 'support_vectors_')
+        if support_vectors is None or len(support_vectors) == 0:
+            raise ValueError("Model has no dense support vectors")
+        kernel = _get(model, 'kernel', 'rbf')
+        if kernel not in ('rbf', 'linear', 'poly', 'sigmoid'):
+            raise ValueError(f"Unsupported kernel: {kernel}")
+        if _get(model, 'decision_function_shape', 'ovr') not in ('ovr', 'ovo'):
+            raise ValueError("Unsupported decision_function_shape")
+
+        gamma = _get(model, '_gamma', _get(model, 'gamma'))
+        if isinstance(gamma, str):
+            raise ValueError(f"gamma={gamma!r} was never resolved to a number")
+
+        classes = _get(model, 'classes_')
+        # sklearn flips the public binary-case coefficients; the private copies keep libsvm's signs
+        dual_coef = _get(model, '_dual_coef_')
+        intercept = _get(model, '_intercept_')
+        if dual_coef is None or intercept is None:
+            dual_coef, intercept = _get(model, 'dual_coef_'), _get(model, 'intercept_')
+            if len(classes) == 2:
+                dual_coef, intercept = -np.asarray(dual_coef), -np.asarray(intercept)
+
+        return cls(support_vectors, dual_coef, intercept, _get(model, 'n_support_'), classes,
+                   kernel=kernel, gamma=gamma, coef0=_get(model, 'coef0', 0.0), degree=_get(model, 'degree', 3),
+                   prob_a=_get(model, 'probA_'), prob_b=_get(model, 'probB_'), dtype=dtype)
+
+    @property
+    def has_probabilities(self):
+        return self.prob_a is not None and self.prob_b is not None
+
+    def _kernel(self, X):
+        dot = X @ self.support_vectors.T
+        if self.kernel == 'linear':
+            return dot
+        if self.kernel == 'poly':
+            return (self.gamma * dot + self.coef0) ** self.degree
+        if self.kernel == 'sigmoid':
+            return np.tanh(self.gamma * dot + self.coef0)
+        sq_dist = np.einsum('ij,ij->i', X, X)[:, None] + self.sv_sq_norms[None, :] - 2.0 * dot
+        np.maximum(sq_dist, 0.0, out=sq_dist)
+        return np.exp(-self.gamma * sq_dist, out=sq_dist)
+
+    def decision_values(self, X):
+        """One-vs-one decision values (N, n_pairs) in libsvm's sign convention"""
+        X = np.ascontiguousarray(X, dtype=self.dtype)
+        return self._kernel(X) @ self.pair_weights + self.intercept
+
+    def _votes(self, dec):
+        votes = np.zeros((len(dec), self.n_classes), dtype=np.int32)
+        for p, (i, j) in enumerate(self.pairs):
+            wins = dec[:, p] > 0
+            votes[:, i] += wins
+            votes[:, j] += ~wins
+        return votes
+
+    def _probabilities(self, dec):
+        with np.errstate(over='ignore'):
+            pairwise = 1.0 / (1.0 + np.exp(dec * self.prob_a + self.prob_b))
+        pairwise = np.clip(pairwise, MIN_PROB, 1 - MIN_PROB)
+        r = np.zeros((len(dec), self.n_classes, self.n_classes), dtype=self.dtype)
+        for p, (i, j) in enumerate(self.pairs):
+            r[:, i, j] = pairwise[:, p]
+            r[:, j, i] = 1 - pairwise[:, p]
+        return pairwise_coupling(r)
+
+    def predict(self, X):
+        """Return (class labels, probabilities or None) from a single decision-function evaluation"""
+        dec = self.decision_values(X)
+        if self.has_probabilities:
+            probabilities = self._probabilities(dec)
+            return self.classes[np.argmax(probabilities, axis=1)], probabilities
+        return self.classes[np.argmax(self._votes(dec), axis=1)], None
+
+
+def _softplus(z):
+    return np.maximum(z, 0.0) + np.log1p(np.exp(-np.abs(z)))
+
+
+def fit_sigmoid(dec, positive, max_iter=100, min_step=1e-10, sigma=1e-12, eps=1e-5):
+    """Platt's sigmoid P(positive) = 1 / (1 + exp(A * dec + B)), fitted as libsvm's sigmoid_train does.
+
+    Newton's method with a backtracking line search on the regularized
+    targets (N+ + 1) / (N+ + 2) and 1 / (N- + 2). Returns (A, B).
+    """
+    dec = np.asarray(dec, dtype=np.float64)
+    positive = np.asarray(positive, dtype=bool)
+    prior1 = float(positive.sum())
+    prior0 = len(positive) - prior1
+    target = np.where(positive, (prior1 + 1.0) / (prior1 + 2.0), 1.0 / (prior0 + 2.0))
+
+    def objective(a, b):
+        z = dec * a + b
+        return float(np.sum(_softplus(z) - (1.0 - target) * z))
+
+    a, b = 0.0, np.log((prior0 + 1.0) / (prior1 + 1.0))
+    fval = objective(a, b)
+    for _ in range(max_iter):
+        p = np.exp(-_softplus(dec * a + b))
+        d2 = p * (1.0 - p)
+        h11, h22, h21 = sigma + np.sum(dec * dec * d2), sigma + np.sum(d2), np.sum(dec * d2)
+        d1 = target - p
+        g1, g2 = np.sum(dec * d1), np.sum(d1)
+        if abs(g1) < eps and abs(g2) < eps:
+            break
+        det = h11 * h22 - h21 * h21
+        da, db = -(h22 * g1 - h21 * g2) / det, -(-h21 * g1 + h11 * g2) / det
+        gd = g1 * da + g2 * db
+        step = 1.0
+        while step >= min_step:
+            new_a, new_b = a + step * da, b + step * db
+            new_f = objective(new_a, new_b)
+            if new_f < fval + 1e-4 * step * gd:
+                a, b, fval = new_a, new_b, new_f
+                break
+            step /= 2.0
+        else:
+            logger.warning("Platt scaling line search failed")
+            break
+    return a, b
+
+
+def calibrate_holdout(model, features, labels):
+    """Fit the SVC's pairwise Platt sigmoids on held-out data instead of libsvm's internal 5-fold CV.
+
+    ``model`` must be fitted with ``probability=False``. The sigmoids are
+    stored where libsvm keeps its own, so both ``predict_proba`` and
+    FastSVMScorer use them. Returns the model.
+    """
+    scorer = FastSVMScorer.from_model(model)
+    dec = scorer.decision_values(features)
+    labels = np.asarray(labels)
+    prob_a, prob_b = [], []
+    for p, (i, j) in enumerate(scorer.pairs):
+        mask = (labels == scorer.classes[i]) | (labels == scorer.classes[j])
+        if not mask.any():
+            raise ValueError(f"No calibration samples for classes {scorer.classes[i]} and {scorer.classes[j]}")
+        a, b = fit_sigmoid(dec[mask, p], labels[mask] == scorer.classes[i])
+        prob_a.append(a)
+        prob_b.append(b)
+    # sklearn exposes these as the read-only probA_/probB_ and passes them to libsvm's predict_proba
+    model._probA, model._probB = np.array(prob_a), np.array(prob_b)
+    model.probability = True
+    return model
@@ -0,0 +1,64 @@
+"""/predict/batch against a real threaded server: the uploads are read after the view has returned."""
+import io
+import json
+import os
+import sys
+import threading
+import urllib.request
+import zipfile
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BOUNDARY = 'skin-test-boundary'
+
+
+def _jpeg():
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.fromarray(np.full((64, 64, 3), 128, dtype=np.uint8)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def _part(filename, data):
+    return (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="files"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n').encode() + data + b'\r\n'
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setenv('PREPROCESS_WORKERS', '0')
+    monkeypatch.setenv('JOB_DB_PATH', str(tmp_path / 'jobs.sqlite3'))
+    skin_app = pytest.importorskip('app')
+    from werkzeug.serving import make_server
+
+    # No model files in the test environment: answer every image with a fixed label
+    monkeypatch.setitem(skin_app.model_state, 'status', 'ready')
+    monkeypatch.setattr(skin_app, 'predict_prepared', lambda prepared: [('test-label', 50.0) for _ in prepared])
+    httpd = make_server('127.0.0.1', 0, skin_app.app, threaded=True)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_port}'
+    httpd.shutdown()
+    thread.join()
+
+
+def test_batch_route_reads_multipart_uploads(server):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as z:
+        z.writestr('inner/c.jpg', _jpeg())
+    body = (_part('a.jpg', _jpeg()) + _part('broken.jpg', b'not an image') + _part('b.jpg', _jpeg())
+            + _part('more.zip', archive.getvalue())
+            + f'--{BOUNDARY}--\r\n'.encode())
+    request = urllib.request.Request(f'{server}/predict/batch', data=body,
+                                     headers={'Content-Type': f'multipart/form-data; boundary={BOUNDARY}'})
+    with urllib.request.urlopen(request) as response:
+        records = [json.loads(line) for line in response.read().decode().splitlines()]
+
+    # Input order is kept, with the undecodable image reported in its place
+    assert [r['image'] for r in records] == ['a.jpg', 'broken.jpg', 'b.jpg', 'inner/c.jpg']
+    assert records[1]['label'] is None and records[1]['error']
+    assert all(r['error'] is None and r['label'] == 'test-label' for r in records[:1] + records[2:])
@@ -0,0 +1,76 @@
+import argparse
+import logging
+import os
+import random
+import sys
+
+import numpy as np
+
+from batch_predict import iter_chunks, iter_labeled_images
+from cascade import EarlyExitClassifier, calibrate_threshold, colour_texture_features, save_cascade
+from disease_catalog import load_catalog
+from preprocessing import IMG_SIZE, decode_image, prepare_batch
+
+logger = logging.getLogger(__name__)
+
+
+def extract_dataset(items, batch_size=32):
+    """Colour/texture features for (path, label) items, using the same preprocessing as serving"""
+    features, labels = [], []
+    buffer = np.empty((batch_size, IMG_SIZE[1], IMG_SIZE[0], 3), dtype=np.float32)
+    for chunk in iter_chunks(items, batch_size):
+        images, chunk_labels = [], []
+        for path, label in chunk:
+            try:
+                images.append(decode_image(path))
+                chunk_labels.append(label)
+            except Exception as e:
+                logger.warning(f"Skipping {path}: {str(e)}")
+        if images:
+            features.append(colour_texture_features(prepare_batch(images, out=buffer)))
+            labels.extend(chunk_labels)
+    if not features:
+        return np.empty((0, 0), dtype=np.float32), np.array(labels)
+    return np.concatenate(features, axis=0), np.array(labels)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the cheap early-exit classifier that runs before ResNet50")
+    parser.add_argument('dataset_dir', help="Dataset with one sub-directory per category")
+    parser.add_argument('--C', type=float, default=1.0)
+    parser.add_argument('--target-precision', type=float, default=0.97,
+                        help="Required accuracy of the images that exit early (sets the threshold)")
+    parser.add_argument('--min-margin', type=float, default=0.0)
+    parser.add_argument('--test-fraction', type=float, default=0.3)
+    parser.add_argument('--output-dir', default='models')
+    args = parser.parse_args(argv)
+
+    items = list(iter_labeled_images(args.dataset_dir, load_catalog().labels))
+    random.Random(42).shuffle(items)
+    features, labels = extract_dataset(items)
+    # Split what could be decoded; skipped images would otherwise shift rows between the splits
+    split = int(len(labels) * (1 - args.test_fraction))
+    if split == 0 or split == len(labels):
+        logger.error("Need images in both the training and the calibration split")
+        return 1
+    model = EarlyExitClassifier.fit(features[:split], labels[:split], C=args.C)
+
+    # Pick the exit threshold on held-out images so early exits meet the precision target
+    probabilities = model.predict_proba_features(features[split:])
+    threshold, exit_rate, precision = calibrate_threshold(probabilities, labels[split:], model.classes,
+                                                          args.target_precision)
+    model.threshold, model.min_margin = threshold, args.min_margin
+    accuracy = float(np.mean(model.classes[np.argmax(probabilities, axis=1)] == labels[split:]))
+    logger.info(f"Held-out accuracy {accuracy:.4f}; threshold {threshold:.3f} exits {exit_rate:.1%} "
+                f"of images with precision {precision if precision is not None else 'n/a'}")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    path = os.path.join(args.output_dir, 'cascade_model.pkl')
+    save_cascade(model, path)
+    logger.info(f"Saved {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
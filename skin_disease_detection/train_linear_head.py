@@ -0,0 +1,131 @@
+import argparse
+import json
+import logging
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+
+from benchmark import time_calls
+from disease_catalog import load_catalog
+from feature_reduction import save_reducer
+from linear_head import LinearHead
+from model_selection import evaluate_model, stratified_split
+from retrain_svm import add_dataset_arguments, load_dataset
+from svm_scorer import FastSVMScorer, calibrate_holdout
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BATCH_SIZES = (1, 32)
+
+
+def scoring_latency(scorer, features, batch_sizes=LATENCY_BATCH_SIZES, repeats=200):
+    """p50/p95 milliseconds of scorer.predict on float16 batches, as the app calls it"""
+    latency = {}
+    for batch_size in batch_sizes:
+        calls = [(features[(i * batch_size) % len(features):][:batch_size],) for i in range(repeats)]
+        ms = np.asarray(time_calls(scorer.predict, calls, warmup=5)) * 1000
+        latency[f'batch_{batch_size}'] = {'p50_ms': round(float(np.percentile(ms, 50)), 4),
+                                         'p95_ms': round(float(np.percentile(ms, 95)), 4)}
+    return latency
+
+
+def report_entry(name, model, scorer, features, labels, class_names, fit_seconds, size):
+    entry = {'head': name, 'fit_seconds': round(fit_seconds, 3), 'size': size}
+    entry.update(evaluate_model(model, features, labels, class_names))
+    entry['latency'] = scoring_latency(scorer, features)
+    return entry
+
+
+def _format_row(entry):
+    latency = entry['latency']
+    return (f"{entry['head']:<12} acc {entry['accuracy']:.4f}  bal {entry['balanced_accuracy']:.4f}  "
+            f"logloss {entry['log_loss']:.4f}  batch1 p50 {latency['batch_1']['p50_ms']:.3f}ms  "
+            f"batch32 p50 {latency['batch_32']['p50_ms']:.3f}ms  ({entry['size']})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train linear/approximate-kernel heads and compare them with the SVM")
+    add_dataset_arguments(parser)
+    parser.add_argument('--maps', nargs='+', choices=['linear', 'rff', 'nystroem'], default=['linear', 'rff', 'nystroem'])
+    parser.add_argument('--map-components', type=int, default=1024, help="Dimension of the RFF/Nyström map")
+    parser.add_argument('--gamma', type=float, default=None, help="RBF gamma for the kernel maps (default: 1 / dim)")
+    parser.add_argument('--head-C', type=float, default=1.0)
+    parser.add_argument('--svm-C', type=float, default=1.0, help="C of the reference SVM fitted on the same split")
+    parser.add_argument('--compare-model', help="Also report an existing SVM pickle (only if it used the same reducer)")
+    parser.add_argument('--calibration-fraction', type=float, default=0.15)
+    parser.add_argument('--test-fraction', type=float, default=0.15)
+    parser.add_argument('--export', choices=['linear', 'rff', 'nystroem'], help="Head to save for the app")
+    parser.add_argument('--output-dir', default=os.path.join('models', 'linear_head'))
+    args = parser.parse_args(argv)
+    if args.export and args.export not in args.maps:
+        parser.error(f"--export {args.export} must be one of the trained --maps")
+
+    from sklearn.svm import SVC
+
+    catalog = load_catalog()
+    reducer, pooled, labels = load_dataset(args)
+    calibration_idx, test_idx, train_idx = stratified_split(labels, [args.calibration_fraction, args.test_fraction])
+    if min(len(calibration_idx), len(test_idx), len(train_idx)) == 0:
+        logger.error("Need images in the training, calibration and test splits")
+        return 1
+
+    reducer.fit(pooled[train_idx])
+    features = reducer.transform(pooled).astype(np.float16)
+    train_features, train_labels = features[train_idx], labels[train_idx]
+    test_features, test_labels = features[test_idx], labels[test_idx]
+    entries, heads = [], {}
+
+    # Reference: the kernel SVM as the app serves it, fitted and calibrated on the same splits
+    started = time.perf_counter()
+    svm = SVC(kernel='rbf', C=args.svm_C, gamma='scale', random_state=42).fit(train_features, train_labels)
+    calibrate_holdout(svm, features[calibration_idx], labels[calibration_idx])
+    class_names = [catalog.label_for(idx) for idx in svm.classes_]
+    entries.append(report_entry('svm', svm, FastSVMScorer.from_model(svm), test_features, test_labels, class_names,
+                                time.perf_counter() - started, f"{len(svm.support_)} support vectors"))
+
+    if args.compare_model:
+        with open(args.compare_model, 'rb') as f:
+            existing = pickle.load(f)
+        if getattr(existing, 'feature_reducer_version_', None) != reducer.version:
+            logger.warning(f"{args.compare_model} was trained on a different feature reducer; not compared")
+        else:
+            logger.warning(f"{args.compare_model} may have been trained on some of the test images")
+            scorer = existing.scorer() if hasattr(existing, 'scorer') else FastSVMScorer.from_model(existing)
+            entries.append(report_entry('existing', existing, scorer, test_features, test_labels, class_names, 0.0,
+                                        f"{len(getattr(existing, 'support_', []))} support vectors"))
+
+    for name in args.maps:
+        started = time.perf_counter()
+        head = LinearHead(kernel_map=None if name == 'linear' else name, n_components=args.map_components,
+                          gamma=args.gamma, C=args.head_C).fit(train_features, train_labels)
+        head.feature_reducer_version_ = reducer.version
+        heads[name] = head
+        entries.append(report_entry(name, head, head.scorer(), test_features, test_labels, class_names,
+                                    time.perf_counter() - started, f"{head.n_parameters} parameters"))
+
+    for entry in entries:
+        logger.info(_format_row(entry))
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    report = {'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'feature_dim': int(features.shape[1]),
+              'splits': {'train': int(len(train_idx)), 'calibration': int(len(calibration_idx)),
+                         'test': int(len(test_idx))},
+              'heads': entries}
+    with open(os.path.join(args.output_dir, 'head_report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Wrote {os.path.join(args.output_dir, 'head_report.json')}")
+
+    if args.export:
+        with open(os.path.join(args.output_dir, 'classifier.pkl'), 'wb') as f:
+            pickle.dump(heads[args.export], f)
+        save_reducer(reducer, os.path.join(args.output_dir, 'feature_reducer.pkl'))
+        logger.info(f"Saved the {args.export} head as classifier.pkl (with feature_reducer.pkl) to {args.output_dir}")
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,67 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Views in the order they are added: cheap exact transforms first, then resampled ones
+VIEW_ORDER = ('hflip', 'vflip', 'zoom', 'rotate+10', 'rotate-10', 'hvflip')
+MAX_VIEWS = len(VIEW_ORDER)
+
+ZOOM_FRACTION = 0.9
+
+
+def _warp(img, angle=0.0, scale=1.0):
+    """Rotate/zoom one (H, W, 3) float32 view about its centre, reflecting at the borders"""
+    import cv2
+
+    height, width = img.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, scale)
+    return cv2.warpAffine(img, matrix, (width, height), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REFLECT_101)
+
+
+def make_view(img, name):
+    if name == 'hflip':
+        return img[:, ::-1]
+    if name == 'vflip':
+        return img[::-1]
+    if name == 'hvflip':
+        return img[::-1, ::-1]
+    if name == 'zoom':
+        return _warp(img, scale=1 / ZOOM_FRACTION)
+    if name.startswith('rotate'):
+        return _warp(img, angle=float(name[len('rotate'):]))
+    raise ValueError(f"Unknown view: {name}")
+
+
+def make_views(processed_img, count):
+    """Return up to ``count`` augmented copies of one preprocessed (1, H, W, 3) image as (count, H, W, 3).
+
+    The views are built from the already-normalized tensor, so they need no
+    second decode/CLAHE pass and can be stacked straight into one model batch.
+    """
+    img = processed_img[0]
+    names = VIEW_ORDER[:max(0, min(count, MAX_VIEWS))]
+    views = np.empty((len(names),) + img.shape, dtype=np.float32)
+    for i, name in enumerate(names):
+        views[i] = make_view(img, name)
+    return views
+
+
+def average_probabilities(rows):
+    """Mean of the per-view probability rows, ignoring views that produced none; None if all did"""
+    rows = [np.asarray(row, dtype=np.float64) for row in rows if row is not None]
+    if not rows:
+        return None
+    mean = np.mean(rows, axis=0)
+    return mean / mean.sum()
+
+
+def needs_tta(mode, confidence, probabilities, threshold):
+    """'always' augments every prediction, 'adaptive' only those below the confidence threshold"""
+    if mode == 'off' or probabilities is None:
+        return False
+    if not np.isclose(np.sum(probabilities), 1.0, atol=0.01):
+        # Invalid probability rows give the fixed fallback confidence; averaging them would not help
+        return False
+    return mode == 'always' or confidence < threshold
@@ -0,0 +1,75 @@
+import io
+import logging
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+def stream_size(stream):
+    """Size in bytes of a seekable stream, leaving it rewound"""
+    try:
+        stream.seek(0, io.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
+        return size
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+@contextmanager
+def upload_source(file, spill_threshold, spill_dir=None):
+    """Yield an image source for an uploaded FileStorage without saving it under its client name.
+
+    Uploads up to ``spill_threshold`` bytes are decoded straight from the
+    request's in-memory stream (no copy when the worker pool runs inline).
+    Larger ones are spilled to a uniquely named temp file in ``spill_dir``
+    (the system temp dir if None) so pool workers can open them by path;
+    the file is removed on exit.
+    """
+    stream = file.stream
+    size = stream_size(stream)
+
+    if size is not None and size <= spill_threshold:
+        yield stream
+        return
+
+    if spill_dir:
+        os.makedirs(spill_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix='upload-', suffix='.img', dir=spill_dir)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if size is not None:
+                stream.seek(0)
+            shutil.copyfileobj(stream, f)
+        logger.info(f"Spilled {size if size is not None else 'unknown'}-byte upload to {path}")
+        yield path
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def spool_uploads(files, spill_threshold):
+    """Copy uploaded files out of the request as [(filename, file-like)].
+
+    The request's streams are closed once the view returns, so a streamed
+    response has to read from copies. Each copy stays in memory up to
+    ``spill_threshold`` bytes and rolls over to an anonymous temp file
+    beyond that; close them when the response is done.
+    """
+    spooled = []
+    try:
+        for file in files:
+            copy = tempfile.SpooledTemporaryFile(max_size=spill_threshold)
+            spooled.append((file.filename, copy))
+            shutil.copyfileobj(file.stream, copy)
+            copy.seek(0)
+    except Exception:
+        for _, copy in spooled:
+            copy.close()
+        raise
+    return spooled
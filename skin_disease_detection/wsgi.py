@@ -0,0 +1,10 @@
+"""WSGI entry point, e.g. ``gunicorn --chdir skin_disease_detection wsgi:app``.
+
+Importing app.py is cheap (TensorFlow, OpenCV and scikit-learn are only
+imported when the models load); the models are loaded and warmed up on a
+background thread, and /readyz reports 503 until they are ready.
+"""
+from app import app, start_background_warmup, start_job_workers
+
+start_background_warmup()
+start_job_workers()